@@ -1,12 +1,327 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+# Time the app imports (Gemini client, pandas, pymongo, ...) for the startup report
+_imports_started = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-from query_generator import generate_query
-from query_executor import execute_sql_query, execute_mongodb_query, detect_database
+import pyarrow as pa
+from arrow_results import concat_batches, documents_to_record_batch, to_csv_bytes
+from query_generator import generate_query, remember_validated_query
+from query_executor import (
+    MongoStream,
+    SQLStream,
+    stream_sql_query,
+    execute_mongodb_query,
+    detect_database,
+)
 from schemas import schemas
+from connections import mysql_pool_metrics
+from embedded_sql import SQL_BACKEND, embedded_pool_metrics
+from generation_cache import get_generation_cache
+from similarity_index import get_question_index
+from prompt_selector import prompt_token_stats
+from query_guard import guard_stats
+from result_cache import get_result_cache, result_cache_stats
+from query_control import cancel_query, new_query_token
+from dual_execution import DUAL_EXECUTION, DualRun, dual_stats, faster_backend
+from warmup import run_warmup
+from tracing import TRACE_DEBUG, resume_trace, span, start_trace
 import json
 
+_imports_seconds = time.perf_counter() - _imports_started
+
 st.set_page_config(page_title="Natural Language to Query")
 
+
+@st.cache_resource(show_spinner="Warming up connections and caches...")
+def startup_timings() -> dict:
+    """Warm up once per process; later sessions and reruns reuse the result."""
+    return run_warmup(imports=_imports_seconds)
+
+
+startup_timings()
+
+
+def render_sql_stream(stream: SQLStream):
+    """Render a streamed SELECT page by page, appending each Arrow batch to one table."""
+    table = None
+    batches = []
+    with stream:
+        for batch in stream.record_batches():
+            batches.append(batch)
+            page = pa.Table.from_batches([batch])
+            if table is None:
+                st.write("Results:")
+                table = st.dataframe(page, use_container_width=True, height=400)
+            else:
+                table.add_rows(page)
+    if table is None and not stream.interrupted:
+        st.write("Results (No data):")
+        st.dataframe(pa.table({column: [] for column in stream.columns}), use_container_width=True)
+        st.info("No results returned.")
+    elif stream.interrupted:
+        st.warning(f"Showing the first {stream.rows_fetched} rows. {stream.interrupted}")
+    elif stream.truncated:
+        st.warning(
+            f"Showing the first {stream.rows_fetched} rows; the result was truncated."
+        )
+    else:
+        st.caption(f"{stream.rows_fetched} rows")
+    if batches:
+        st.download_button(
+            "Download CSV",
+            to_csv_bytes(concat_batches(batches)),
+            file_name="results.csv",
+            mime="text/csv",
+            key="sql_download",
+        )
+
+
+def run_cancellable(execute, *args, **kwargs):
+    """Run a query on a worker thread while this script run polls it.
+
+    Clicking "Cancel query" (or any other widget) reruns the script, which
+    interrupts the polling; the statement is then killed on the server.
+    """
+    token = new_query_token()
+    cancel_area = st.empty()
+    cancel_area.button("Cancel query", key=f"cancel_{token}")
+    status = st.empty()
+    worker = ThreadPoolExecutor(max_workers=1)
+    # The copied context keeps the worker's spans in this request's trace
+    future = worker.submit(contextvars.copy_context().run, execute, *args, token=token, **kwargs)
+    started = time.monotonic()
+    try:
+        while True:
+            try:
+                return future.result(timeout=0.25)
+            except FuturesTimeout:
+                status.caption(f"Running for {time.monotonic() - started:.0f}s")
+    finally:
+        if not future.done():
+            cancel_query(token)
+        worker.shutdown(wait=False)
+        cancel_area.empty()
+        status.empty()
+
+
+def is_interrupted(results) -> bool:
+    return isinstance(results, str) and results.startswith(("Timeout:", "Cancelled:"))
+
+
+def close_mongo_stream():
+    state = st.session_state.pop("mongo_stream", None)
+    if state:
+        state["stream"].close()
+
+
+def load_more_documents():
+    state = st.session_state.get("mongo_stream")
+    if state:
+        stream = state["stream"]
+        batch = stream.next_batch()
+        if batch:
+            state["pages"].append(
+                ",\n".join(json.dumps(doc, indent=4, default=str) for doc in batch)
+            )
+            state["batches"].append(documents_to_record_batch(batch, stream.schema))
+            stream.schema = state["batches"][-1].schema
+
+
+def start_mongo_stream(stream: MongoStream, query: str, trace=None):
+    """Keep a MongoDB cursor in the session so later reruns can load more documents."""
+    close_mongo_stream()
+    st.session_state.mongo_stream = {
+        "stream": stream,
+        "query": query,
+        "pages": [],  # formatted documents, one string per batch
+        "batches": [],  # the same documents as Arrow record batches
+        "fresh": True,  # the query is already shown by the run that started it
+        "trace": trace,  # request trace the first render is added to
+    }
+    load_more_documents()
+
+
+def render_mongo_stream():
+    state = st.session_state.mongo_stream
+    stream = state["stream"]
+    if not state["fresh"]:
+        st.code(state["query"], language="javascript")
+    state["fresh"] = False
+
+    if not state["pages"]:
+        st.info("No results returned.")
+        return
+
+    st.write("Results:")
+    # Add custom CSS for scrollable container
+    st.markdown(
+        """
+        <style>
+        .scrollable-json {
+            max-height: 400px;
+            overflow-y: auto;
+        }
+        </style>
+        """,
+        unsafe_allow_html=True,
+    )
+    results = concat_batches(state["batches"])
+    if st.toggle("Show as table", key="mongo_table_view"):
+        st.dataframe(results, use_container_width=True, height=400)
+    else:
+        formatted_json = "[\n" + ",\n".join(state["pages"]) + "\n]"
+        st.markdown(
+            f'<div class="scrollable-json"><pre><code>{formatted_json}</code></pre></div>',
+            unsafe_allow_html=True,
+        )
+    st.caption(f"{stream.docs_fetched} documents loaded")
+    st.download_button(
+        "Download CSV",
+        to_csv_bytes(results),
+        file_name="results.csv",
+        mime="text/csv",
+        key="mongo_download",
+    )
+    if not stream.exhausted:
+        st.button("Load more", key="mongo_load_more", on_click=load_more_documents)
+    elif stream.truncated:
+        st.warning(
+            f"Stopped at the limit of {stream.limit} documents; "
+            "add .limit() to the query to change it."
+        )
+
+def show_sql_results(results):
+    """Render what stream_sql_query returned."""
+    if is_interrupted(results):
+        st.warning(results)
+    elif isinstance(results, SQLStream):
+        with span("render") as stage:
+            render_sql_stream(results)
+            stage.set(
+                rows=results.rows_fetched,
+                fetch_ms=round(results.fetch_seconds * 1000, 2),
+            )
+    elif isinstance(results, int):
+        st.info(f"Query affected {results} rows.")
+    else:
+        st.error(f"Unexpected result format: {results}")
+
+
+def show_mongo_results(results, query: str, trace=None, inline: bool = False):
+    """Render what execute_mongodb_query returned.
+
+    A MongoStream is kept in the session and rendered at the end of the
+    script, or here with ``inline`` (when more results follow below it).
+    """
+    with span("render"):
+        if is_interrupted(results):
+            st.warning(results)
+        elif isinstance(results, MongoStream):
+            start_mongo_stream(results, query, None if inline else trace)
+            if inline:
+                render_mongo_stream()
+                st.session_state.mongo_stream["rendered"] = True
+        elif isinstance(results, list) and results:
+            st.write("Results:")
+            # Add custom CSS for scrollable container
+            st.markdown(
+                """
+                <style>
+                .scrollable-json {
+                    max-height: 400px;
+                    overflow-y: auto;
+                }
+                </style>
+                """,
+                unsafe_allow_html=True,
+            )
+            # Format JSON and display in scrollable container
+            formatted_json = json.dumps(
+                results, indent=4, default=str
+            )
+            st.markdown(
+                f'<div class="scrollable-json"><pre><code>{formatted_json}</code></pre></div>',
+                unsafe_allow_html=True,
+            )
+        elif isinstance(results, dict):
+            st.write("Operation Result:")
+            st.markdown(
+                """
+                <style>
+                .scrollable-json {
+                    max-height: 400px;
+                    overflow-y: auto;
+                }
+                </style>
+                """,
+                unsafe_allow_html=True,
+            )
+            # Format JSON and display in scrollable container
+            formatted_json = json.dumps(results, indent=4)
+            st.markdown(
+                f'<div class="scrollable-json"><pre><code>{formatted_json}</code></pre></div>',
+                unsafe_allow_html=True,
+            )
+        elif not results:
+            st.info("No results returned.")
+        else:
+            st.error(f"Unexpected result format: {results}")
+
+
+LABELS = {"sql": "SQL", "mongodb": "MongoDB"}
+
+
+def run_dual(question: str, database: str):
+    """Race the SQL and MongoDB pipelines, rendering each result as it arrives.
+
+    As with run_cancellable, any widget interaction reruns the script; the
+    pipeline still running is then cancelled.
+    """
+    run = DualRun(question, database)
+    cancel_area = st.empty()
+    cancel_area.button("Cancel", key=f"cancel_{run.tokens['sql']}")
+    status = st.empty()
+    started = time.monotonic()
+    first = None
+    try:
+        while run.pending:
+            result = run.next_result(timeout=0.25)
+            if result is None:
+                waiting = " and ".join(LABELS[query_type] for query_type in run.pending)
+                status.caption(f"Waiting for {waiting}: {time.monotonic() - started:.0f}s")
+                continue
+            label = LABELS[result.query_type]
+            with st.container(border=True):
+                if result.valid and first is None:
+                    first = result
+                    st.markdown(f"**{label}** answered first in {result.seconds:.2f}s")
+                elif result.valid:
+                    st.markdown(f"**{label}** answered {result.seconds - first.seconds:.2f}s after {LABELS[first.query_type]}")
+                else:
+                    st.markdown(f"**{label}** after {result.seconds:.2f}s")
+                if result.query:
+                    st.code(result.query, language="sql" if result.query_type == "sql" else "javascript")
+                if isinstance(result.results, str) and not is_interrupted(result.results):
+                    (st.info if result.results.startswith("Skipped") else st.error)(result.results)
+                    continue
+                if result.valid:
+                    remember_validated_query(question, result.query_type, database, result.query)
+                if result.query_type == "sql":
+                    show_sql_results(result.results)
+                else:
+                    show_mongo_results(result.results, result.query, inline=True)
+    finally:
+        run.cancel()
+        cancel_area.empty()
+        status.empty()
+    faster = faster_backend(database, run.question_type)
+    if faster:
+        st.caption(f"{LABELS[faster]} has run {run.question_type} queries on {database} faster on average.")
+
+
 if "query_complete" not in st.session_state:
     st.session_state.query_complete = False
 if "query_input_value" not in st.session_state:
@@ -15,8 +330,37 @@ if "query_input_value" not in st.session_state:
 st.title("🧠 Natural Language to SQL and MongoDB Query")
 st.write("Enter your question and select the database type if needed:")
 
+debug_timings = st.sidebar.toggle("Show request timings", value=TRACE_DEBUG, key="debug_timings")
+dual_mode = st.sidebar.toggle("Run SQL and MongoDB together", value=DUAL_EXECUTION, key="dual_mode")
+
+with st.sidebar.expander("Startup timings"):
+    st.json(startup_timings())
+
+with st.sidebar.expander("Connection pool stats"):
+    st.json(embedded_pool_metrics() if SQL_BACKEND == "sqlite" else mysql_pool_metrics())
+
+with st.sidebar.expander("Generation cache stats"):
+    st.json(get_generation_cache().stats())
+
+with st.sidebar.expander("Similar question stats"):
+    st.json(get_question_index().stats())
+
+with st.sidebar.expander("Prompt token stats"):
+    st.json(prompt_token_stats())
+
+with st.sidebar.expander("Query guard stats"):
+    st.json(guard_stats())
+
+with st.sidebar.expander("Result cache stats"):
+    st.json(result_cache_stats())
+
+with st.sidebar.expander("Dual execution stats"):
+    st.json(dual_stats())
+
 if st.button("Clear Cache"):
     st.cache_data.clear()
+    get_generation_cache().clear()
+    get_result_cache().clear()
     st.session_state.query_complete = False
     st.rerun()
 
@@ -37,7 +381,9 @@ databases = ["Bike Store", "AdventureWorks", "FIFA"]
 selected_db = None
 
 if user_query:
+    detect_started = time.perf_counter()
     detected_db = detect_database(user_query)
+    detect_seconds = time.perf_counter() - detect_started
     if not detected_db:
         st.warning(
             "Please select a database: 'Bike Store', 'AdventureWorks', or 'FIFA'."
@@ -49,116 +395,101 @@ if user_query:
     else:
         final_db = detected_db
 
-    if final_db and not st.session_state.query_complete:
+    if final_db and not st.session_state.query_complete and dual_mode:
+        if st.button("Generate SQL and MongoDB Queries", key="dual_button"):
+            with start_trace("request", query_type="dual", database=final_db) as trace:
+                st.session_state.last_trace = trace
+                if trace is not None:
+                    trace.record("detect_database", detect_seconds, detected=detected_db or "")
+                try:
+                    run_dual(user_query, final_db)
+                except Exception as run_error:
+                    st.error(f"Dual execution error: {str(run_error)}")
+            st.session_state.query_complete = True
+    elif final_db and not st.session_state.query_complete:
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Generate SQL Query", key="sql_button"):
-                with st.spinner("Generating SQL query..."):
-                    try:
-                        query = generate_query(
-                            user_query, query_type="sql", schemas=schemas, database = final_db
-                        )
-                        if query:
-                            st.code(query, language="sql")
-                            with st.spinner("Executing SQL query..."):
-                                try:
-                                    results = execute_sql_query(query, final_db)
-                                    if isinstance(results, tuple) and len(results) == 2:
-                                        data, columns = results
-                                        if data and columns:
-                                            df = pd.DataFrame(data, columns=columns)
-                                            st.write("Results:")
-                                            st.dataframe(
-                                                df, use_container_width=True, height=400
+                with start_trace("request", query_type="sql", database=final_db) as trace:
+                    st.session_state.last_trace = trace
+                    if trace is not None:
+                        trace.record("detect_database", detect_seconds, detected=detected_db or "")
+                    with st.spinner("Generating SQL query..."):
+                        try:
+                            query = generate_query(
+                                user_query, query_type="sql", schemas=schemas, database = final_db
+                            )
+                            if query:
+                                st.code(query, language="sql")
+                                with st.spinner("Executing SQL query..."):
+                                    try:
+                                        results = run_cancellable(stream_sql_query, query, final_db)
+                                        if isinstance(results, SQLStream):
+                                            remember_validated_query(
+                                                user_query, "sql", final_db, query
                                             )
-                                        else:
-                                            df = pd.DataFrame(columns=columns)
-                                            st.write("Results (No data):")
-                                            st.dataframe(df, use_container_width=True)
-                                            st.info("No results returned.")
-                                    elif isinstance(results, int):
-                                        st.info(f"Query affected {results} rows.")
-                                    else:
-                                        st.error(f"Unexpected result format: {results}")
-                                except Exception as db_error:
-                                    st.error(
-                                        f"Database execution error: {str(db_error)}"
-                                    )
-                                finally:
-                                    st.cache_data.clear()
-                        else:
-                            st.error("No SQL query generated.")
-                    except Exception as gen_error:
-                        st.error(f"Query generation error: {str(gen_error)}")
+                                        show_sql_results(results)
+                                    except Exception as db_error:
+                                        st.error(
+                                            f"Database execution error: {str(db_error)}"
+                                        )
+                            else:
+                                st.error("No SQL query generated.")
+                        except Exception as gen_error:
+                            st.error(f"Query generation error: {str(gen_error)}")
                 st.session_state.query_complete = True
 
         with col2:
             if st.button("Generate MongoDB Query", key="mongodb_button"):
-                with st.spinner("Generating MongoDB query..."):
-                    try:
-                        query = generate_query(
-                            user_query, query_type="mongodb", schemas=schemas, database = final_db
-                        )
-                        if query:
-                            st.code(query, language="javascript")
-                            with st.spinner("Executing MongoDB query..."):
-                                try:
-                                    results = execute_mongodb_query(query, final_db)
-                                    if isinstance(results, list) and results:
-                                        st.write("Results:")
-                                        # Add custom CSS for scrollable container
-                                        st.markdown(
-                                            """
-                                            <style>
-                                            .scrollable-json {
-                                                max-height: 400px;
-                                                overflow-y: auto;
-                                            }
-                                            </style>
-                                            """,
-                                            unsafe_allow_html=True,
+                with start_trace("request", query_type="mongodb", database=final_db) as trace:
+                    st.session_state.last_trace = trace
+                    if trace is not None:
+                        trace.record("detect_database", detect_seconds, detected=detected_db or "")
+                    with st.spinner("Generating MongoDB query..."):
+                        try:
+                            query = generate_query(
+                                user_query, query_type="mongodb", schemas=schemas, database = final_db
+                            )
+                            if query:
+                                st.code(query, language="javascript")
+                                with st.spinner("Executing MongoDB query..."):
+                                    try:
+                                        results = run_cancellable(
+                                            execute_mongodb_query, query, final_db, stream=True
                                         )
-                                        # Format JSON and display in scrollable container
-                                        formatted_json = json.dumps(
-                                            results, indent=4, default=str
-                                        )
-                                        st.markdown(
-                                            f'<div class="scrollable-json"><pre><code>{formatted_json}</code></pre></div>',
-                                            unsafe_allow_html=True,
-                                        )
-                                    elif isinstance(results, dict):
-                                        st.write("Operation Result:")
-                                        st.markdown(
-                                            """
-                                            <style>
-                                            .scrollable-json {
-                                                max-height: 400px;
-                                                overflow-y: auto;
-                                            }
-                                            </style>
-                                            """,
-                                            unsafe_allow_html=True,
-                                        )
-                                        # Format JSON and display in scrollable container
-                                        formatted_json = json.dumps(results, indent=4)
-                                        st.markdown(
-                                            f'<div class="scrollable-json"><pre><code>{formatted_json}</code></pre></div>',
-                                            unsafe_allow_html=True,
+                                        if isinstance(results, (list, MongoStream)):
+                                            # only read results are offered to similar questions
+                                            remember_validated_query(
+                                                user_query, "mongodb", final_db, query
+                                            )
+                                        show_mongo_results(results, query, trace)
+                                    except Exception as db_error:
+                                        st.error(
+                                            f"Database execution error: {str(db_error)}"
                                         )
-                                    elif not results:
-                                        st.info("No results returned.")
-                                    else:
-                                        st.error(f"Unexpected result format: {results}")
-                                except Exception as db_error:
-                                    st.error(
-                                        f"Database execution error: {str(db_error)}"
-                                    )
-                    except Exception as gen_error:
-                        st.error(f"Query generation error: {str(gen_error)}")
+                        except Exception as gen_error:
+                            st.error(f"Query generation error: {str(gen_error)}")
                 st.session_state.query_complete = True
 
+if "mongo_stream" in st.session_state and not st.session_state.mongo_stream.pop("rendered", False):
+    # The first render of a new stream is part of the request that started it
+    mongo_state = st.session_state.mongo_stream
+    with resume_trace(mongo_state.pop("trace", None)), span("render_documents") as stage:
+        render_mongo_stream()
+        stage.set(
+            documents=mongo_state["stream"].docs_fetched,
+            fetch_ms=round(mongo_state["stream"].fetch_seconds * 1000, 2),
+        )
+
+if debug_timings and st.session_state.get("last_trace"):
+    trace = st.session_state.last_trace
+    with st.expander("Request timings", expanded=True):
+        st.dataframe(trace.timings(), use_container_width=True, hide_index=True)
+        st.caption(f"Trace {trace.trace_id}")
+
 if st.session_state.query_complete:
     if st.button("Enter New Query", key="new_query_button"):
+        close_mongo_stream()
         # Reset query_complete state
         st.session_state.query_complete = False
         # Reset the query input value
@@ -0,0 +1,140 @@
+import datetime
+import decimal
+import io
+import json
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from bson import Decimal128, ObjectId
+from pymysql.constants import FIELD_TYPE
+
+# Arrow type of each MySQL column type; columns not listed are inferred from their values
+_MYSQL_TYPES = {
+    FIELD_TYPE.TINY: pa.int64(),
+    FIELD_TYPE.SHORT: pa.int64(),
+    FIELD_TYPE.LONG: pa.int64(),
+    FIELD_TYPE.INT24: pa.int64(),
+    FIELD_TYPE.LONGLONG: pa.int64(),
+    FIELD_TYPE.YEAR: pa.int64(),
+    FIELD_TYPE.FLOAT: pa.float64(),
+    FIELD_TYPE.DOUBLE: pa.float64(),
+    FIELD_TYPE.DATE: pa.date32(),
+    FIELD_TYPE.DATETIME: pa.timestamp("us"),
+    FIELD_TYPE.TIMESTAMP: pa.timestamp("us"),
+    FIELD_TYPE.TIME: pa.duration("us"),
+    FIELD_TYPE.VARCHAR: pa.string(),
+    FIELD_TYPE.VAR_STRING: pa.string(),
+    FIELD_TYPE.STRING: pa.string(),
+    FIELD_TYPE.ENUM: pa.string(),
+    FIELD_TYPE.SET: pa.string(),
+    FIELD_TYPE.JSON: pa.string(),
+}
+_ARROW_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError, TypeError, ValueError)
+
+
+def description_types(description) -> list:
+    """Arrow type of each column of a DB-API cursor description (None where it depends on the values)."""
+    types = []
+    for column in description or ():
+        type_code, length, scale = column[1], column[3], column[5]
+        if type_code in (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL) and length:
+            # The column length counts the sign and decimal point, so it bounds the precision
+            types.append(pa.decimal128(min(length, 38), min(scale or 0, 38)))
+        else:
+            types.append(_MYSQL_TYPES.get(type_code))
+    return types
+
+
+def _as_text(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def column_array(values: list, type: pa.DataType = None) -> pa.Array:
+    """Arrow array of ``values``: typed if possible, else inferred, else as text."""
+    if type is not None:
+        try:
+            return pa.array(values, type=type)
+        except _ARROW_ERRORS:
+            pass
+    try:
+        return pa.array(values)
+    except _ARROW_ERRORS:
+        return pa.array([_as_text(value) for value in values], type=pa.string())
+
+
+def rows_to_record_batch(rows: list, columns: list, types: list = None) -> pa.RecordBatch:
+    """Transpose DB-API row tuples into a RecordBatch, one Arrow array per column."""
+    types = types or [None] * len(columns)
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    arrays = [column_array(list(column), type) for column, type in zip(values, types)]
+    return pa.RecordBatch.from_arrays(arrays, names=list(columns))
+
+
+def _plain(value):
+    """BSON values Arrow cannot hold, as plain Python values."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if value is None or isinstance(
+        value, (str, int, float, bool, bytes, decimal.Decimal, datetime.datetime, datetime.date)
+    ):
+        return value
+    return str(value)
+
+
+def documents_to_record_batch(documents: list, schema: pa.Schema = None) -> pa.RecordBatch:
+    """Build a RecordBatch from MongoDB documents.
+
+    Columns are the fields in order of first appearance (``schema``'s fields
+    first, using its types where the values fit). Missing fields are null;
+    fields whose values have no common type become text (JSON for nested values). Values that
+    are not documents go into a single ``value`` column.
+    """
+    documents = [doc if isinstance(doc, dict) else {"value": doc} for doc in documents]
+    names = list(schema.names) if schema is not None else []
+    seen = set(names)
+    for doc in documents:
+        for key in doc:
+            if key not in seen:
+                seen.add(key)
+                names.append(key)
+    arrays = []
+    for name in names:
+        type = schema.field(name).type if schema is not None and name in schema.names else None
+        arrays.append(column_array([_plain(doc.get(name)) for doc in documents], type))
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def concat_batches(batches: list, schema: pa.Schema = None) -> pa.Table:
+    """One table from record batches whose schemas may differ (added fields, widened types)."""
+    if not batches:
+        return (schema or pa.schema([])).empty_table()
+    tables = [pa.Table.from_batches([batch]) for batch in batches]
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except _ARROW_ERRORS:
+        # Conflicting types: rebuild the columns from the rows, as text where needed
+        rows = [row for table in tables for row in table.to_pylist()]
+        return pa.Table.from_batches([documents_to_record_batch(rows)])
+
+
+def to_csv_bytes(table: pa.Table) -> bytes:
+    """CSV of a table; nested columns are written as JSON text."""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_nested(column.type) or pa.types.is_binary(column.type):
+            column = pa.array([_as_text(value) for value in column.to_pylist()], type=pa.string())
+        columns.append(column)
+    buffer = io.BytesIO()
+    pa_csv.write_csv(pa.Table.from_arrays(columns, names=table.column_names), buffer)
+    return buffer.getvalue()
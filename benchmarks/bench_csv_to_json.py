@@ -0,0 +1,104 @@
+"""Compare CSV-to-JSON conversion time: column-wise converter vs. the old per-cell infer_type loop.
+
+Each CSV in data/ is repeated to ``rows`` rows in a temporary folder, converted
+both ways, and the outputs are checked to be identical. Repeated rows favour the
+column-wise converter, which converts each distinct value once; run with the
+original row count (e.g. 500) for the worst case. Run from the repository root:
+
+    python benchmarks/bench_csv_to_json.py [rows]
+"""
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "create_clean_database"))
+from csv_to_json import CSVtoJSONConverter
+
+
+def legacy_infer_type(value: str):
+    """infer_type of the previous converter, applied to every cell."""
+    if value is None or value.strip() == "" or value.lower() == "null":
+        return None
+    value = value.strip()
+    try:
+        if value.isdigit() or (value[0] == '-' and value[1:].isdigit()):
+            return int(value)
+    except ValueError:
+        pass
+    try:
+        if '.' in value:
+            return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+def legacy_convert(csv_path: str, json_path: str) -> list:
+    result = []
+    with open(csv_path, "r", encoding="utf-8") as csv_file:
+        reader = csv.DictReader(csv_file)
+        reader.fieldnames = [field.strip() for field in reader.fieldnames]
+        for row in reader:
+            cleaned_row = {}
+            for key, value in row.items():
+                inferred = legacy_infer_type(value)
+                if inferred is not None:
+                    cleaned_row[key.strip()] = inferred
+            if cleaned_row:
+                result.append(cleaned_row)
+    with open(json_path, "w", encoding="utf-8") as json_file:
+        json.dump(result, json_file, indent=2)
+    return result
+
+
+def scaled_copy(csv_path: str, folder: str, rows: int) -> str:
+    with open(csv_path, "r", encoding="utf-8") as f:
+        header, *lines = f.read().splitlines()
+    path = os.path.join(folder, os.path.basename(csv_path))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(header + "\n")
+        for i in range(rows):
+            f.write(lines[i % len(lines)] + "\n")
+    return path
+
+
+def main(rows: int = 20000):
+    print(f"{'file':<34} {'rows':>7} {'legacy s':>9} {'column s':>9} {'speed-up':>9}")
+    total_old = total_new = 0.0
+    with tempfile.TemporaryDirectory() as folder:
+        for csv_path in sorted(glob.glob(os.path.join("data", "*_csv", "*.csv"))):
+            path = scaled_copy(csv_path, folder, rows)
+
+            started = time.perf_counter()
+            expected = legacy_convert(path, path + ".legacy.json")
+            old = time.perf_counter() - started
+
+            converter = CSVtoJSONConverter(path)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.convert()
+            new = time.perf_counter() - started
+
+            with open(converter.json_file_path, "r", encoding="utf-8") as f:
+                if json.load(f) != expected:
+                    raise AssertionError(f"{csv_path}: converted documents differ from the legacy output")
+            total_old, total_new = total_old + old, total_new + new
+            name = os.path.relpath(csv_path, "data")
+            print(f"{name:<34} {rows:>7} {old:>9.2f} {new:>9.2f} {old / new:>8.1f}x")
+    print(f"{'total':<34} {'':>7} {total_old:>9.2f} {total_new:>9.2f} {total_old / total_new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,99 @@
+"""Compare MongoDB query parse time: single-pass parser vs. the old split/eval code.
+
+Run from the repository root:
+
+    python benchmarks/bench_mongo_parser.py
+"""
+import ast
+import os
+import re
+import sys
+import timeit
+
+import json5
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mongo_parser import parse_mongo_query
+
+QUERIES = [
+    'db.getCollectionNames()',
+    'db.products.find({}, { "product_name": 1, "list_price": 1, "_id": 0 })',
+    'db.products.find({ "list_price": { "$gt": 500 } }).sort({ "list_price": -1 }).limit(10)',
+    'db.customers.find({ "state": "NY", "city": "Buffalo" }, { "first_name": 1, "last_name": 1 }).skip(5).limit(5)',
+    'db.orders.aggregate([{ "$match": { "order_date": { "$gte": "2016-01-01T00:00:00", "$lt": "2017-01-01T00:00:00" } } }, '
+    '{ "$group": { "_id": "$customer_id", "orders": { "$sum": 1 } } }, { "$sort": { "orders": -1 } }, { "$limit": 5 }])',
+    'db.customers.insertOne({ "first_name": "John", "last_name": "Doe", "state": "CA", "phone": null })',
+    'db.customers.updateOne({ "first_name": "John" }, { "$set": { "city": "Los Angeles" } })',
+    'db.customers.deleteMany({ "state": "CA" })',
+    'db.products.distinct("model_year", { "list_price": { "$lt": 1000 } })',
+    'db.players.countDocuments({ "count_tournaments": { "$gte": 3 } })',
+]
+
+
+def legacy_parse(query: str):
+    """Argument extraction of the previous execute_mongodb_query, without executing."""
+    query = query.strip().replace("\n", " ")
+    if query == "db.getCollectionNames()":
+        return ("getCollectionNames",)
+    collection_name = query.split(".")[1]
+    if ".insertOne(" in query:
+        doc_str = query.split(".insertOne(", 1)[1].rsplit(")", 1)[0]
+        return ("insertOne", collection_name, ast.literal_eval(doc_str.replace("null", "None")))
+    if ".updateOne(" in query:
+        args_str = query.split(".updateOne(", 1)[1].rsplit(")", 1)[0].replace("null", "None")
+        parts = args_str.split("},", 1)
+        return ("updateOne", collection_name, ast.literal_eval(parts[0] + "}"), ast.literal_eval(parts[1].strip()))
+    if ".deleteMany(" in query:
+        filter_str = query.split(".deleteMany(", 1)[1].rsplit(")", 1)[0].replace("null", "None")
+        return ("deleteMany", collection_name, ast.literal_eval(filter_str))
+    if ".countDocuments(" in query:
+        args_str = query.split(".countDocuments(", 1)[1].rsplit(")", 1)[0].replace("null", "None")
+        return ("countDocuments", collection_name, ast.literal_eval(args_str))
+    if ".distinct(" in query:
+        args_str = query.split(".distinct(", 1)[1].rsplit(")", 1)[0].replace("null", "None")
+        parts = args_str.split(",", 1)
+        field = ast.literal_eval(parts[0].strip())
+        filter_dict = ast.literal_eval(parts[1].strip()) if len(parts) > 1 else {}
+        return ("distinct", collection_name, field, filter_dict)
+    if ".find(" in query:
+        segments = query.split(".")
+        find_call = segments[2]
+        find_args = find_call[len("find(") : -1]
+        args_list = eval(f"[{find_args}]") if find_args else []
+        chain = []
+        for part in segments[3:]:
+            if part.startswith("sort("):
+                chain.append(("sort", eval(part[len("sort(") : -1])))
+            elif part.startswith("skip("):
+                chain.append(("skip", int(part[len("skip(") : -1])))
+            elif part.startswith("limit("):
+                chain.append(("limit", int(part[len("limit(") : -1])))
+        return ("find", collection_name, args_list, chain)
+    if ".aggregate(" in query:
+        collection_name = re.match(r"db\.(\w+)\.aggregate", query).group(1)
+        agg_match = re.search(r"\.aggregate\(\s*(\[[\s\S]*\])\s*\)", query)
+        return ("aggregate", collection_name, json5.loads(agg_match.group(1).strip()))
+    raise ValueError(f"Unsupported query: {query}")
+
+
+def bench(parse, number: int) -> dict:
+    timings = {}
+    for query in QUERIES:
+        seconds = timeit.timeit(lambda: parse(query), number=number)
+        timings[query] = seconds / number * 1e6
+    return timings
+
+
+def main(number: int = 2000):
+    new = bench(parse_mongo_query, number)
+    old = bench(legacy_parse, number)
+    print(f"{'operation':<20} {'legacy µs':>10} {'parser µs':>10} {'speed-up':>9}")
+    for query in QUERIES:
+        operation = parse_mongo_query(query).method
+        print(f"{operation:<20} {old[query]:>10.1f} {new[query]:>10.1f} {old[query] / new[query]:>8.1f}x")
+    total_old, total_new = sum(old.values()), sum(new.values())
+    print(f"{'total':<20} {total_old:>10.1f} {total_new:>10.1f} {total_old / total_new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
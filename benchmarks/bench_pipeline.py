@@ -0,0 +1,234 @@
+"""Offline latency benchmark of question -> generate_query -> execute, per stage and dataset.
+
+A stub model answers each prompt with the query recorded for its question in
+recorded_queries.json, so no Gemini key or network is needed. SQL runs
+through execute_sql_query on the embedded SQLite backend (embedded_sql.py,
+loaded from data/*_csv) and MongoDB queries through execute_mongodb_query
+on mongomock loaded from data/*_json, on a real server with --mongo-uri, or
+on the in-memory columnar engine with --mongo-backend columnar.
+Every request is traced (see tracing.py) and the span durations are
+aggregated into p50/p95/p99 and throughput per dataset, query type and stage. Caches are cleared before each
+request unless --warm is given. Run from the repository root:
+
+    python benchmarks/bench_pipeline.py [--iterations N] [--warm] [--output FILE] [--compare BASELINE]
+
+Results are written as JSON (by default to benchmarks/results/); --compare
+prints the change against an earlier result file and exits with status 1 if
+a stage got slower than --threshold percent at p50 or p95.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "create_clean_database"))
+
+import connections
+from columnar_mongo import get_columnar_store
+from embedded_sql import get_embedded_pool
+from generation_cache import get_generation_cache
+from query_executor import SQL_SCHEMAS, execute_mongodb_query, execute_sql_query
+from query_generator import generate_query
+from result_cache import get_result_cache
+from schemas import schemas
+from similarity_index import get_question_index
+from tracing import start_trace
+
+RECORDED_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded_queries.json")
+_QUESTION_PATTERN = re.compile(r"\nQuery: (.*)\n")
+
+
+class RecordedModel:
+    """Stand-in for the Gemini model that answers with recorded queries."""
+
+    def __init__(self, recorded: list, latency: float = 0.0):
+        self.latency = latency
+        self.answers = {}
+        for item in recorded:
+            for query_type in ("sql", "mongodb"):
+                self.answers[(item["question"], query_type)] = item[query_type]
+
+    def generate_content(self, prompt: str):
+        question = _QUESTION_PATTERN.search(prompt).group(1)
+        query_type = "sql" if "to SQL queries" in prompt else "mongodb"
+        if self.latency:
+            time.sleep(self.latency)
+        return type("Response", (), {"text": self.answers[(question, query_type)]})()
+
+
+def run_request(item: dict, query_type: str, model: RecordedModel, mongo_backend: str = "server") -> dict:
+    """Run one question end to end; returns {stage: seconds}."""
+    with start_trace("request", query_type=query_type, database=item["database"]) as trace:
+        query = generate_query(item["question"], query_type, schemas, item["database"], model=model)
+        if query_type == "sql":
+            result = execute_sql_query(query, item["database"], arrow=True, backend="sqlite")
+        else:
+            result = execute_mongodb_query(query, item["database"], arrow=True, backend=mongo_backend)
+        if isinstance(result, str):
+            raise RuntimeError(f"{item['question']}: {result}")
+    durations = defaultdict(float)
+    for recorded in trace.spans:
+        durations[recorded.name] += recorded.duration_ms / 1000
+    return durations
+
+
+def summarize(samples: list, wall: float) -> dict:
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(np.percentile(values, 50)), 4),
+        "p95_ms": round(float(np.percentile(values, 95)), 4),
+        "p99_ms": round(float(np.percentile(values, 99)), 4),
+        "throughput_per_s": round(len(samples) / wall, 2) if wall else None,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(
+    iterations: int, warm: bool, mongo_uri: str = None, latency: float = 0.0, mongo_backend: str = "server"
+) -> dict:
+    with open(RECORDED_QUERIES, "r", encoding="utf-8") as f:
+        recorded = json.load(f)
+    model = RecordedModel(recorded, latency)
+
+    started = time.perf_counter()
+    for schema_name in SQL_SCHEMAS.values():
+        get_embedded_pool(schema_name)
+    if mongo_uri:
+        connections.get_mongo_client(host=mongo_uri)
+    else:
+        import mongomock
+
+        connections._mongo_client = mongomock.MongoClient()
+    import write_mongodb
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        write_mongodb.load_all(os.path.join(ROOT, "data"))
+    if mongo_backend == "columnar":
+        get_columnar_store().preload(SQL_SCHEMAS.values())
+    load_seconds = time.perf_counter() - started
+
+    samples = defaultdict(list)  # (database, query_type, stage) -> seconds
+    walls = defaultdict(float)  # (database, query_type) -> seconds spent in requests
+    for _ in range(iterations):
+        for item in recorded:
+            for query_type in ("sql", "mongodb"):
+                if not warm:
+                    get_generation_cache().clear()
+                    get_result_cache().clear()
+                    get_question_index().clear()
+                request_started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    durations = run_request(item, query_type, model, mongo_backend)
+                walls[(item["database"], query_type)] += time.perf_counter() - request_started
+                for stage, seconds in durations.items():
+                    samples[(item["database"], query_type, stage)].append(seconds)
+
+    results = []
+    for (database, query_type, stage), values in sorted(samples.items()):
+        row = {"dataset": database, "query_type": query_type, "stage": stage}
+        row.update(summarize(values, sum(values)))
+        if stage == "request":
+            # Requests per second of wall time, the pipeline's serial throughput
+            row["throughput_per_s"] = round(len(values) / walls[(database, query_type)], 2)
+        results.append(row)
+    return {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "iterations": iterations,
+        "warm": warm,
+        "mongo": mongo_uri or "mongomock",
+        "mongo_backend": mongo_backend,
+        "llm_latency_ms": latency * 1000,
+        "load_seconds": round(load_seconds, 3),
+        "results": results,
+    }
+
+
+def print_results(report: dict):
+    print(f"{'dataset':<15} {'type':<8} {'stage':<18} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for row in report["results"]:
+        print(
+            f"{row['dataset']:<15} {row['query_type']:<8} {row['stage']:<18} {row['count']:>5} "
+            f"{row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['throughput_per_s'] or 0:>9.1f}"
+        )
+
+
+def compare(report: dict, baseline_path: str, threshold: float) -> int:
+    """Print p50/p95 changes against a baseline report; returns the number of regressions."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {
+            (row["dataset"], row["query_type"], row["stage"]): row for row in json.load(f)["results"]
+        }
+    regressions = 0
+    print(f"\nChange against {baseline_path} (regression above {threshold:.0f}%):")
+    for row in report["results"]:
+        old = baseline.get((row["dataset"], row["query_type"], row["stage"]))
+        if old is None:
+            continue
+        changes = {
+            key: (row[key] - old[key]) / old[key] * 100 if old[key] else 0.0 for key in ("p50_ms", "p95_ms")
+        }
+        slower = any(change > threshold for change in changes.values())
+        regressions += slower
+        print(
+            f"{'❌' if slower else '✅'} {row['dataset']:<15} {row['query_type']:<8} {row['stage']:<18} "
+            f"p50 {changes['p50_ms']:+7.1f}%  p95 {changes['p95_ms']:+7.1f}%"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20, help="passes over the recorded questions")
+    parser.add_argument("--warm", action="store_true", help="keep the generation and result caches between requests")
+    parser.add_argument("--mongo-uri", help="run MongoDB queries on this server instead of mongomock")
+    parser.add_argument(
+        "--mongo-backend", choices=("server", "columnar"), default="server", help="where MongoDB reads run"
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated model latency")
+    parser.add_argument("--output", help="result file (default benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="slow-down in percent counted as a regression")
+    args = parser.parse_args()
+
+    report = run(args.iterations, args.warm, args.mongo_uri, args.llm_latency_ms / 1000, args.mongo_backend)
+    print_results(report)
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare and compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare SQL latency: the embedded SQLite backend vs. MySQL, on the recorded queries.
+
+Each SQL query in recorded_queries.json runs through execute_sql_query on
+both backends with the result cache cleared, so every run reaches the
+database. MySQL is skipped with a warning when it cannot be reached. Run from
+the repository root:
+
+    python benchmarks/bench_sql_backends.py [iterations]
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connections import get_mysql_pool
+from embedded_sql import get_embedded_pool
+from query_executor import SQL_SCHEMAS, execute_sql_query
+from result_cache import get_result_cache
+
+RECORDED_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded_queries.json")
+
+
+def available_backends() -> list:
+    backends = []
+    for backend, get_pool in (("sqlite", get_embedded_pool), ("mysql", get_mysql_pool)):
+        started = time.perf_counter()
+        try:
+            for schema_name in SQL_SCHEMAS.values():
+                with get_pool(schema_name).connection():
+                    pass
+        except Exception as e:
+            print(f"⚠️ Skipping {backend}: {e}")
+            continue
+        print(f"✅ {backend} ready in {time.perf_counter() - started:.2f}s")
+        backends.append(backend)
+    return backends
+
+
+def time_query(query: str, database: str, backend: str, iterations: int):
+    """Latencies in ms and the row count of one query on one backend."""
+    samples = []
+    rows = None
+    for _ in range(iterations):
+        get_result_cache().clear()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = execute_sql_query(query, database, backend=backend)
+        samples.append((time.perf_counter() - started) * 1000)
+        if isinstance(result, str):
+            return None, result
+        rows = len(result[0])
+    return samples, rows
+
+
+def main(iterations: int = 50):
+    with open(RECORDED_QUERIES, "r", encoding="utf-8") as f:
+        recorded = json.load(f)
+    backends = available_backends()
+
+    print(f"\n{'dataset':<15} {'backend':<7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rows':>6}  question")
+    totals = {backend: [] for backend in backends}
+    for item in recorded:
+        for backend in backends:
+            samples, rows = time_query(item["sql"], item["database"], backend, iterations)
+            if samples is None:
+                print(f"{item['database']:<15} {backend:<7} ❌ {rows}")
+                continue
+            totals[backend].extend(samples)
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            print(
+                f"{item['database']:<15} {backend:<7} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f} {rows:>6}  {item['question']}"
+            )
+
+    print()
+    for backend, samples in totals.items():
+        if samples:
+            p50, p95 = np.percentile(samples, [50, 95])
+            print(f"{backend:<7} all queries: p50 {p50:.3f} ms, p95 {p95:.3f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,106 @@
+"""Compare per-statement latency: sql_rewriter vs. the old regex clean-up.
+
+Run from the repository root:
+
+    python benchmarks/bench_sql_rewriter.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sql_rewriter import RewriteContext, _FENCE_PATTERN, _flat_rewrite, clear_rewrite_cache, rewrite_sql
+
+QUERIES = [
+    "SELECT product_name, list_price FROM products WHERE list_price > 500 ORDER BY list_price DESC",
+    "```sql\nSELECT first_name || ' ' || last_name AS customer_name, email FROM customers WHERE state = 'NY';\n```",
+    "SELECT c.first_name, COUNT(o.order_id) AS orders FROM BikeStore.customers c "
+    "JOIN BikeStore.orders o ON o.customer_id = c.customer_id GROUP BY c.customer_id, c.first_name "
+    "HAVING COUNT(o.order_id) > 2 ORDER BY orders DESC LIMIT 10",
+    "SELECT p.ProductName, SUM(s.SalesAmount) AS total FROM sales s JOIN Product p ON p.ProductKey = s.ProductKey "
+    "WHERE s.OrderDate >= '2017-01-01' GROUP BY p.ProductName ORDER BY total DESC",
+    "INSERT INTO customers (first_name, last_name, state) VALUES ('John', 'Doe', 'CA')",
+    "UPDATE products SET list_price = list_price * 1.1 WHERE model_year = 2018",
+]
+SCHEMA = "bike_store"
+TABLES = ["customers", "orders", "products"]
+
+
+def legacy_sanitize(query: str) -> str:
+    """The regex clean-up execute_sql_query used before sql_rewriter, without prints."""
+    sanitized_query = re.sub(r"```(?:sql|javascript)?\s*|\s*```", "", query).strip()
+    sanitized_query = re.sub(r"\s+", " ", sanitized_query).strip()
+
+    if "||" in sanitized_query:
+        select_part = sanitized_query.lower().split("from")[0]
+        if "||" in select_part:
+            def replace_concat(match):
+                # Split the matched expression into the concatenation part and the alias (if any)
+                full_expression = match.group(0)
+
+                alias_match = re.search(
+                    r"\s+AS\s+\w+\b", full_expression, re.IGNORECASE
+                )
+                if alias_match:
+                    # Extract the alias and the expression before it
+                    alias = alias_match.group(0)  # e.g., " AS customer_name"
+                    concat_expression = full_expression[: alias_match.start()]
+                else:
+                    # No alias present
+                    alias = ""
+                    concat_expression = full_expression
+
+                parts = [part.strip() for part in concat_expression.split("||")]
+                # Wrap in CONCAT and reattach the alias
+                return f"CONCAT({', '.join(parts)}){alias}"
+
+            updated_select = re.sub(
+                r"\b\w+\s*\|\|.*?(?=\s*(?:AS\s+\w+|,|FROM|WHERE|GROUP|HAVING|ORDER|\Z))",
+                replace_concat,
+                select_part,
+                flags=re.IGNORECASE,
+            )
+
+            sanitized_query = (
+                updated_select + " FROM" + sanitized_query.split("FROM", 1)[1]
+            )
+
+    return sanitized_query
+
+
+def bench(rewrite, number: int) -> dict:
+    return {
+        query: timeit.timeit(lambda: rewrite(query), number=number) / number * 1e6
+        for query in QUERIES
+    }
+
+
+def uncached(query):
+    return rewrite_sql(query, SCHEMA, TABLES, limit=10001, use_cache=False)
+
+
+def cached(query):
+    return rewrite_sql(query, SCHEMA, TABLES, limit=10001)
+
+
+def main(number: int = 2000):
+    old = bench(legacy_sanitize, number)
+    clear_rewrite_cache()
+    parsed = bench(uncached, number)
+    hit = bench(cached, number)
+    context = RewriteContext(SCHEMA, frozenset(TABLES), 10001, None)
+    print(f"{'statement':<40} {'path':>5} {'legacy µs':>10} {'rewrite µs':>11} {'cached µs':>10}")
+    for query in QUERIES:
+        label = " ".join(query.split())[:40]
+        path = "tree" if _flat_rewrite(_FENCE_PATTERN.sub("", query), context) is None else "flat"
+        print(f"{label:<40} {path:>5} {old[query]:>10.1f} {parsed[query]:>11.1f} {hit[query]:>10.1f}")
+    count = len(QUERIES)
+    print(
+        f"{'mean':<46} {sum(old.values()) / count:>10.1f} "
+        f"{sum(parsed.values()) / count:>11.1f} {sum(hit.values()) / count:>10.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
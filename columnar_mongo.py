@@ -0,0 +1,523 @@
+import json
+import operator
+import os
+import re
+import threading
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from bson.regex import Regex
+
+from embedded_sql import EMBEDDED_DATA_PATH
+
+# Columnar MongoDB engine settings (override with environment variables)
+MONGO_BACKEND = os.getenv("MONGO_BACKEND", "server")  # "server", or "columnar" to answer simple reads from the bundled JSON first
+
+_COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+_FIND_CHAIN = {"sort", "skip", "limit", "pretty", "toArray", "count", "size"}
+
+
+class Unsupported(Exception):
+    """A query the columnar engine cannot answer exactly; it runs on the server instead."""
+
+
+class Column(NamedTuple):
+    """One field of a collection: ``kind`` is "number", "string", "bool", "null" or "other" (mixed types).
+
+    ``present`` is False where the field is missing or null; ``values`` holds a filler there.
+    """
+
+    kind: str
+    values: np.ndarray
+    present: np.ndarray
+
+    def take(self, index) -> "Column":
+        return Column(self.kind, self.values[index], self.present[index])
+
+
+def _kind(value) -> str:
+    """MongoDB comparison bracket of a value."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    return "other"
+
+
+def make_column(values: list) -> Column:
+    present = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+    kinds = {_kind(value) for value in values} - {"null"}
+    if not kinds:
+        return Column("null", np.full(len(values), None, dtype=object), present)
+    kind = kinds.pop() if len(kinds) == 1 else "other"
+    if kind == "bool":
+        return Column(kind, np.array([bool(value) for value in values], dtype=bool), present)
+    if kind == "string":
+        return Column(kind, np.array(["" if value is None else value for value in values], dtype=str), present)
+    if kind == "number":
+        filled = [0 if value is None else value for value in values]
+        if all(isinstance(value, int) for value in filled) and all(abs(value) < 2**63 for value in filled):
+            return Column(kind, np.array(filled, dtype=np.int64), present)
+        return Column(kind, np.array(filled, dtype=np.float64), present)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return Column("other", array, present)
+
+
+def _missing(length: int) -> Column:
+    return Column("null", np.full(length, None, dtype=object), np.zeros(length, dtype=bool))
+
+
+class Frame:
+    """Columns of equal length, in document field order; nested fields under their dotted path."""
+
+    def __init__(self, columns: dict, length: int):
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_documents(cls, documents: list) -> "Frame":
+        rows = [_flatten(document) for document in documents]
+        fields = list(dict.fromkeys(field for row in rows for field in row))
+        return cls({field: make_column([row.get(field) for row in rows]) for field in fields}, len(rows))
+
+    def take(self, index) -> "Frame":
+        """Rows selected by a boolean mask, an index array or a slice."""
+        columns = {name: column.take(index) for name, column in self.columns.items()}
+        length = len(next(iter(columns.values())).values) if columns else len(np.arange(self.length)[index])
+        return Frame(columns, length)
+
+    def paths(self, path: str) -> list:
+        """Columns of a field: the field itself or, for an embedded document, its dotted sub-fields."""
+        return [name for name in self.columns if name == path or name.startswith(path + ".")]
+
+    def field(self, path: str) -> Column:
+        column = self.columns.get(path)
+        if column is not None:
+            return column
+        if self.paths(path):
+            raise Unsupported(f"condition on embedded document '{path}'")
+        return _missing(self.length)
+
+    def documents(self) -> list:
+        """Rows as documents, leaving out missing fields (``_id`` stays, as null)."""
+        names = list(self.columns)
+        values = [column.values.tolist() for column in self.columns.values()]
+        present = [column.present for column in self.columns.values()]
+        if all(mask.all() for mask in present) and not any("." in name for name in names):
+            return [dict(zip(names, row)) for row in zip(*values)] if names else [{} for _ in range(self.length)]
+        present = [mask.tolist() for mask in present]
+        documents = []
+        for i in range(self.length):
+            document = {}
+            for name, column, mask in zip(names, values, present):
+                if not mask[i] and name != "_id":
+                    continue
+                target = document
+                *parents, leaf = name.split(".")
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = column[i] if mask[i] else None
+            documents.append(document)
+        return documents
+
+
+def _flatten(document: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in document.items():
+        if isinstance(value, dict) and value:
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def _equals(column: Column, value) -> np.ndarray:
+    if value is None:
+        return ~column.present
+    if column.kind == "other":
+        raise Unsupported("comparison on a field of mixed types")
+    if _kind(value) != column.kind:
+        return np.zeros(len(column.present), dtype=bool)  # values of different types never match
+    return (column.values == value) & column.present
+
+
+def _compare(column: Column, op: str, value) -> np.ndarray:
+    if value is None or column.kind == "other":
+        raise Unsupported(f"{op} on a null value or a field of mixed types")
+    if _kind(value) != column.kind:
+        return np.zeros(len(column.present), dtype=bool)
+    return _COMPARISONS[op](column.values, value) & column.present
+
+
+def _regex(column: Column, pattern) -> np.ndarray:
+    if isinstance(pattern, Regex):
+        pattern = pattern.try_compile()
+    if column.kind not in ("string", "null"):
+        raise Unsupported("regex on a field that is not text")
+    found = np.fromiter((bool(pattern.search(value)) for value in column.values.tolist()), dtype=bool, count=len(column.values))
+    return found & column.present
+
+
+def _operators(column: Column, condition: dict) -> np.ndarray:
+    mask = np.ones(len(column.present), dtype=bool)
+    for op, value in condition.items():
+        if op == "$eq":
+            mask &= _equals(column, value)
+        elif op == "$ne":
+            mask &= ~_equals(column, value)
+        elif op in _COMPARISONS:
+            mask &= _compare(column, op, value)
+        elif op in ("$in", "$nin"):
+            if not isinstance(value, list) or any(isinstance(item, (Regex, re.Pattern)) for item in value):
+                raise Unsupported(f"{op} argument")
+            found = np.zeros(len(column.present), dtype=bool)
+            for item in value:
+                found |= _equals(column, item)
+            mask &= found if op == "$in" else ~found
+        elif op == "$exists":
+            mask &= column.present if value else ~column.present
+        elif op == "$regex":
+            if isinstance(value, (Regex, re.Pattern)):
+                mask &= _regex(column, value)
+            else:
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                mask &= _regex(column, re.compile(value, flags))
+        elif op == "$options":
+            continue
+        elif op == "$not":
+            mask &= ~(_regex(column, value) if isinstance(value, (Regex, re.Pattern)) else _operators(column, value))
+        else:
+            raise Unsupported(f"query operator {op}")
+    return mask
+
+
+def match(frame: Frame, query: dict) -> np.ndarray:
+    """Boolean mask of the rows matching a find/$match filter."""
+    if not isinstance(query, dict):
+        raise Unsupported("filter is not a document")
+    mask = np.ones(frame.length, dtype=bool)
+    for key, condition in query.items():
+        if key in ("$and", "$or", "$nor"):
+            masks = [match(frame, clause) for clause in condition]
+            if key == "$and":
+                for clause in masks:
+                    mask &= clause
+            else:
+                found = np.logical_or.reduce(masks) if masks else np.zeros(frame.length, dtype=bool)
+                mask &= found if key == "$or" else ~found
+        elif key.startswith("$"):
+            raise Unsupported(f"query operator {key}")
+        elif isinstance(condition, (Regex, re.Pattern)):
+            mask &= _regex(frame.field(key), condition)
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            mask &= _operators(frame.field(key), condition)
+        elif isinstance(condition, (dict, list)):
+            raise Unsupported(f"match on a document or array value of {key}")
+        else:
+            mask &= _equals(frame.field(key), condition)
+    return mask
+
+
+def project(frame: Frame, projection: dict, computed: bool = False) -> Frame:
+    """Inclusion or exclusion projection; ``computed`` also allows ``{"new": "$field"}`` ($project)."""
+    if not projection:
+        return frame
+    renamed = {}
+    included, excluded = [], []
+    for path, value in projection.items():
+        if computed and isinstance(value, str) and value.startswith("$"):
+            renamed[path] = value[1:]
+        elif isinstance(value, (bool, int, float)):
+            (included if value else excluded).append(path)
+        else:
+            raise Unsupported(f"projection of {path}")
+    if excluded and (included or renamed) and excluded != ["_id"]:
+        raise Unsupported("projection mixing inclusion and exclusion")
+
+    if not (included or renamed):
+        dropped = {name for path in excluded for name in frame.paths(path)}
+        return Frame({name: column for name, column in frame.columns.items() if name not in dropped}, frame.length)
+    keep = {name for path in included + ([] if "_id" in excluded else ["_id"]) for name in frame.paths(path)}
+    columns = {name: column for name, column in frame.columns.items() if name in keep}
+    for path, source in renamed.items():
+        if frame.paths(source) not in ([], [source]):
+            raise Unsupported(f"projection of embedded document '{source}'")
+        columns[path] = frame.field(source)
+    return Frame(columns, frame.length)
+
+
+def _argsort(values: np.ndarray, ascending: bool) -> np.ndarray:
+    """Stable argsort; descending keeps equal values in their original order."""
+    if ascending:
+        return np.argsort(values, kind="stable")
+    last = len(values) - 1
+    return last - np.argsort(values[::-1], kind="stable")[::-1]
+
+
+def sort(frame: Frame, spec: dict) -> Frame:
+    """Stable sort with missing values lowest, like MongoDB."""
+    if not isinstance(spec, dict):
+        raise Unsupported("sort specification")
+    keys = []
+    for path, direction in spec.items():
+        if direction not in (1, -1):
+            raise Unsupported(f"sort direction {direction!r}")
+        for name in frame.paths(path):
+            if frame.columns[name].kind == "other":
+                raise Unsupported(f"sort on a field of mixed types ({name})")
+            keys.append((frame.columns[name], direction == 1))
+    # Stable passes from the last key to the first; each key sorts by value, then by presence
+    order = np.arange(frame.length)
+    for column, ascending in reversed(keys):
+        if column.kind != "null":
+            order = order[_argsort(column.values[order], ascending)]
+        order = order[_argsort(column.present[order], ascending)]
+    return frame.take(order)
+
+
+def _group_codes(keys: list, length: int):
+    """Group number of each row, numbered in order of first appearance, and the number of groups."""
+    codes = np.zeros(length, dtype=np.int64)
+    for column in keys:
+        values = column.values if column.kind != "null" else np.zeros(length, dtype=np.int64)
+        key_codes, uniques = pd.factorize(values)
+        key_codes = np.where(column.present, key_codes + 1, 0)
+        codes = codes * (len(uniques) + 1) + key_codes
+    codes, uniques = pd.factorize(codes)
+    return codes, len(uniques)
+
+
+def _extreme(column: Column, codes: np.ndarray, groups: int, lowest: bool) -> Column:
+    """Smallest or largest present value per group (missing when a group has none)."""
+    rows = np.flatnonzero(column.present)
+    order = rows[np.lexsort((column.values[rows], codes[rows]))]
+    ordered_codes = codes[order]
+    if not lowest:
+        order, ordered_codes = order[::-1], ordered_codes[::-1]
+    found, first = np.unique(ordered_codes, return_index=True)
+    index = np.zeros(groups, dtype=np.int64)
+    index[found] = order[first]
+    present = np.zeros(groups, dtype=bool)
+    present[found] = True
+    return Column(column.kind, column.values[index], present)
+
+
+def _accumulate(frame: Frame, codes: np.ndarray, groups: int, first: np.ndarray, last: np.ndarray, name: str, spec) -> Column:
+    if not (isinstance(spec, dict) and len(spec) == 1):
+        raise Unsupported(f"accumulator of {name}")
+    (op, argument), = spec.items()
+    sizes = np.bincount(codes, minlength=groups)
+    everywhere = np.ones(groups, dtype=bool)
+    if op == "$count" and argument == {}:
+        return Column("number", sizes, everywhere)
+    if op == "$sum" and _kind(argument) == "number":
+        return Column("number", sizes * argument, everywhere)
+    if not (isinstance(argument, str) and argument.startswith("$")):
+        raise Unsupported(f"{op} expression of {name}")
+    column = frame.field(argument[1:])
+    if op in ("$first", "$last"):
+        return column.take(first if op == "$first" else last)
+    if column.kind == "other":
+        raise Unsupported(f"{op} of a field of mixed types ({argument})")
+    if op in ("$min", "$max"):
+        return _extreme(column, codes, groups, op == "$min") if column.kind != "null" else _missing(groups)
+    if op not in ("$sum", "$avg"):
+        raise Unsupported(f"accumulator {op}")
+    if column.kind != "number":  # non-numeric values are ignored
+        if op == "$sum":
+            return Column("number", np.zeros(groups, dtype=np.int64), everywhere)
+        return _missing(groups)
+    values = np.where(column.present, column.values, 0)
+    if op == "$sum" and values.dtype == np.int64:
+        totals = np.zeros(groups, dtype=np.int64)
+        np.add.at(totals, codes, values)
+        return Column("number", totals, everywhere)
+    totals = np.bincount(codes, weights=values, minlength=groups)
+    if op == "$sum":
+        return Column("number", totals, everywhere)
+    counts = np.bincount(codes, weights=column.present, minlength=groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return Column("number", np.where(counts > 0, totals / counts, 0.0), counts > 0)
+
+
+def group(frame: Frame, spec: dict) -> Frame:
+    key = spec.get("_id")
+    if isinstance(key, str) and key.startswith("$"):
+        keys = {"_id": frame.field(key[1:])}
+    elif isinstance(key, dict) and all(isinstance(path, str) and path.startswith("$") for path in key.values()):
+        keys = {f"_id.{name}": frame.field(path[1:]) for name, path in key.items()}
+    elif isinstance(key, (dict, list)) or isinstance(key, str) and key.startswith("$"):
+        raise Unsupported("$group _id expression")
+    else:
+        keys = {"_id": make_column([key] * frame.length)}  # a constant: one group
+    if any(column.kind == "other" for column in keys.values()):
+        raise Unsupported("$group on a field of mixed types")
+
+    codes, groups = _group_codes(list(keys.values()), frame.length)
+    first = np.unique(codes, return_index=True)[1]
+    last = frame.length - 1 - np.unique(codes[::-1], return_index=True)[1]
+    columns = {name: column.take(first) for name, column in keys.items()}
+    for name, accumulator in spec.items():
+        if name != "_id":
+            columns[name] = _accumulate(frame, codes, groups, first, last, name, accumulator)
+    return Frame(columns, groups)
+
+
+def _stage(frame: Frame, stage) -> Frame:
+    if not (isinstance(stage, dict) and len(stage) == 1):
+        raise Unsupported("pipeline stage")
+    (name, argument), = stage.items()
+    if name == "$match":
+        return frame.take(match(frame, argument))
+    if name == "$group":
+        return group(frame, argument)
+    if name == "$sort":
+        return sort(frame, argument)
+    if name == "$limit":
+        return frame.take(slice(None, int(argument)))
+    if name == "$skip":
+        return frame.take(slice(int(argument), None))
+    if name == "$project":
+        return project(frame, argument, computed=True)
+    if name == "$count":
+        if not frame.length:
+            return Frame({}, 0)
+        return Frame({argument: make_column([frame.length])}, 1)
+    raise Unsupported(f"pipeline stage {name}")
+
+
+class ColumnarStore:
+    """The bundled ``data/<database>_json`` collections as NumPy columns, loaded on first use.
+
+    Answers find, findOne, aggregate ($match, $group, $sort, $limit, $skip,
+    $project, $count), countDocuments, distinct and getCollectionNames with
+    vectorized operations, and raises Unsupported for anything else. The
+    documents have no server-generated ``_id``, and null and missing fields
+    are not told apart. A collection written on the server is marked stale
+    and answered by the server from then on.
+    """
+
+    def __init__(self, data_path: str = None):
+        self.data_path = data_path or EMBEDDED_DATA_PATH
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._stale = set()
+
+    def _path(self, db_name: str, collection: str) -> Optional[str]:
+        for extension in (".json", ".ndjson"):
+            path = os.path.join(self.data_path, f"{db_name}_json", collection + extension)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def collection_names(self, db_name: str) -> list:
+        folder = os.path.join(self.data_path, f"{db_name}_json")
+        if not os.path.isdir(folder):
+            return []
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(folder) if name.endswith((".json", ".ndjson")))
+
+    def frame(self, db_name: str, collection: str) -> Frame:
+        with self._lock:
+            if (db_name, collection) in self._stale:
+                raise Unsupported(f"{collection} was changed on the server")
+            frame = self._frames.get((db_name, collection))
+            if frame is not None:
+                return frame
+            path = self._path(db_name, collection)
+            if path is None:
+                raise Unsupported(f"no bundled data for {db_name}.{collection}")
+            with open(path, "r", encoding="utf-8") as f:
+                if path.endswith(".ndjson"):
+                    documents = [json.loads(line) for line in f if line.strip()]
+                else:
+                    documents = json.load(f)
+            frame = Frame.from_documents(documents if isinstance(documents, list) else [documents])
+            self._frames[(db_name, collection)] = frame
+            return frame
+
+    def preload(self, db_names) -> int:
+        """Load every bundled collection of ``db_names``; returns how many were loaded."""
+        loaded = 0
+        for db_name in db_names:
+            for collection in self.collection_names(db_name):
+                self.frame(db_name, collection)
+                loaded += 1
+        return loaded
+
+    def mark_stale(self, db_name: str, collections):
+        with self._lock:
+            for collection in collections:
+                self._stale.add((db_name, collection))
+                self._frames.pop((db_name, collection), None)
+
+    def run(self, db_name: str, command):
+        """Result of a parsed read (see mongo_parser) in the shape execute_mongodb_query returns."""
+        if command.collection is None:
+            if command.method != "getCollectionNames" or any(db == db_name for db, _ in self._stale):
+                raise Unsupported(f"db.{command.method}()")
+            names = self.collection_names(db_name)
+            if not names:
+                raise Unsupported(f"no bundled data for {db_name}")
+            return names
+
+        frame = self.frame(db_name, command.collection)
+        args = command.args
+        if command.method == "find":
+            return self._find(frame, args, command.chain)
+        if command.method == "findOne":
+            found = frame.take(np.flatnonzero(match(frame, args[0] if args else {}))[:1])
+            documents = project(found, args[1] if len(args) > 1 else None).documents()
+            return documents[0] if documents else None
+        if command.method == "aggregate":
+            if not args or not isinstance(args[0], list):
+                raise Unsupported("aggregate without a pipeline")
+            for stage in args[0]:
+                frame = _stage(frame, stage)
+            return frame.documents()
+        if command.method in ("countDocuments", "count"):
+            return {"count": int(match(frame, args[0] if args else {}).sum())}
+        if command.method == "distinct":
+            if not args:
+                raise Unsupported("distinct without a field")
+            column = frame.field(args[0]).take(match(frame, args[1] if len(args) > 1 else {}))
+            if column.kind == "other":
+                raise Unsupported(f"distinct of a field of mixed types ({args[0]})")
+            return sorted(set(column.values[column.present].tolist()))
+        raise Unsupported(f".{command.method}()")
+
+    @staticmethod
+    def _find(frame: Frame, args: list, chain: list):
+        frame = frame.take(match(frame, args[0] if args else {}))
+        calls = {}
+        for call in chain:
+            if call.name not in _FIND_CHAIN:
+                raise Unsupported(f".{call.name}()")
+            if call.name in ("count", "size"):
+                return {"count": frame.length}
+            calls[call.name] = call.args
+        # The server applies sort, then skip, then limit, whatever the chain order
+        if calls.get("sort"):
+            frame = sort(frame, calls["sort"][0])
+        if calls.get("skip"):
+            frame = frame.take(slice(int(calls["skip"][0]), None))
+        if calls.get("limit") and int(calls["limit"][0]):
+            frame = frame.take(slice(None, abs(int(calls["limit"][0]))))
+        return project(frame, args[1] if len(args) > 1 else None).documents()
+
+
+_columnar_store = None
+_columnar_store_lock = threading.Lock()
+
+
+def get_columnar_store() -> ColumnarStore:
+    global _columnar_store
+    with _columnar_store_lock:
+        if _columnar_store is None:
+            _columnar_store = ColumnarStore()
+        return _columnar_store
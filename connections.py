@@ -0,0 +1,247 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pymysql
+from pymongo import MongoClient
+
+# MySQL connection parameters (override with environment variables)
+MYSQL_CONFIG = {
+    "host": os.getenv("MYSQL_HOST", "localhost"),
+    "user": os.getenv("MYSQL_USER", "sql_user"),
+    "password": os.getenv("MYSQL_PASSWORD", "SafePass@123"),
+}
+
+# Pool limits
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "5"))  # max connections per schema
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))  # seconds to wait for a free slot
+MYSQL_POOL_MAX_IDLE = float(os.getenv("MYSQL_POOL_MAX_IDLE", "300"))  # recycle idle connections after this
+MYSQL_POOL_MAX_LIFETIME = float(os.getenv("MYSQL_POOL_MAX_LIFETIME", "3600"))  # recycle old connections
+MYSQL_POOL_PING_AFTER = float(os.getenv("MYSQL_POOL_PING_AFTER", "30"))  # health check if idle longer
+
+# Socket timeouts in seconds, 0 = wait forever. Keep them above QUERY_TIMEOUT_MS
+# so the server-side statement timeout fires first.
+MYSQL_READ_TIMEOUT = int(os.getenv("MYSQL_READ_TIMEOUT", "60"))
+MYSQL_WRITE_TIMEOUT = int(os.getenv("MYSQL_WRITE_TIMEOUT", "60"))
+
+# MongoDB client options (override with environment variables)
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None  # 0 = no timeout
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class MySQLPool:
+    """Bounded pool of long-lived pymysql connections for one schema."""
+
+    def __init__(
+        self,
+        database: str,
+        max_size: int = MYSQL_POOL_SIZE,
+        timeout: float = MYSQL_POOL_TIMEOUT,
+        max_idle: float = MYSQL_POOL_MAX_IDLE,
+        max_lifetime: float = MYSQL_POOL_MAX_LIFETIME,
+        ping_after: float = MYSQL_POOL_PING_AFTER,
+    ):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._created_at = {}  # id(conn) -> created_at, for checked out connections
+        self._metrics = {
+            "checkouts": 0,  # successful acquisitions
+            "waits": 0,  # acquisitions that had to wait for a free slot
+            "misses": 0,  # acquisitions that had to open a new connection
+            "recycled": 0,  # connections closed for being idle or too old
+            "broken": 0,  # connections dropped after a failed health check or error
+            "timeouts": 0,  # acquisitions that gave up waiting
+        }
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._metrics[name] += n
+
+    def _connect(self):
+        return pymysql.connect(
+            database=self.database,
+            autocommit=True,
+            read_timeout=MYSQL_READ_TIMEOUT or None,
+            write_timeout=MYSQL_WRITE_TIMEOUT or None,
+            **MYSQL_CONFIG,
+        )
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count("timeouts")
+                raise PoolTimeout(
+                    f"No free connection for {self.database} after {self.timeout}s"
+                )
+
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+
+                if entry is None:
+                    self._count("misses")
+                    conn = self._connect()
+                    created_at = time.monotonic()
+                    break
+
+                conn, created_at, last_used = entry
+                now = time.monotonic()
+                if now - created_at > self.max_lifetime or now - last_used > self.max_idle:
+                    self._count("recycled")
+                    self._close(conn)
+                    continue
+                if now - last_used > self.ping_after:
+                    try:
+                        conn.ping(reconnect=False)
+                    except Exception:
+                        self._count("broken")
+                        self._close(conn)
+                        continue
+                break
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._created_at[id(conn)] = created_at
+            self._metrics["checkouts"] += 1
+        return conn
+
+    def release(self, conn, discard: bool = False):
+        with self._lock:
+            created_at = self._created_at.pop(id(conn), time.monotonic())
+            if discard or not conn.open:
+                self._close(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self._count("broken")
+            discard = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self._metrics,
+                "idle": len(self._idle),
+                "in_use": len(self._created_at),
+                "max_size": self.max_size,
+            }
+
+
+# Pools are shared by every Streamlit session in the process
+_mysql_pools = {}
+_mysql_pools_lock = threading.Lock()
+
+
+def get_mysql_pool(schema_name: str) -> MySQLPool:
+    with _mysql_pools_lock:
+        pool = _mysql_pools.get(schema_name)
+        if pool is None:
+            pool = MySQLPool(schema_name)
+            _mysql_pools[schema_name] = pool
+        return pool
+
+
+def mysql_pool_metrics() -> dict:
+    with _mysql_pools_lock:
+        pools = dict(_mysql_pools)
+    return {name: pool.metrics() for name, pool in pools.items()}
+
+
+def close_mysql_pools():
+    with _mysql_pools_lock:
+        pools = list(_mysql_pools.values())
+        _mysql_pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+# One MongoClient per process: it owns its own connection pool and monitor threads
+_mongo_client = None
+_mongo_client_lock = threading.Lock()
+
+
+def get_mongo_client(**options) -> MongoClient:
+    """Return the process-wide MongoClient, creating it on first use.
+
+    Keyword options override the MONGO_* defaults but only take effect on the
+    call that creates the client.
+    """
+    global _mongo_client
+    with _mongo_client_lock:
+        if _mongo_client is None:
+            settings = {
+                "maxPoolSize": MONGO_MAX_POOL_SIZE,
+                "minPoolSize": MONGO_MIN_POOL_SIZE,
+                "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+                "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+                "readPreference": MONGO_READ_PREFERENCE,
+            }
+            host = options.pop("host", MONGO_URI)
+            settings.update(options)
+            _mongo_client = MongoClient(host, **settings)
+        return _mongo_client
+
+
+def close_mongo_client():
+    global _mongo_client
+    with _mongo_client_lock:
+        client, _mongo_client = _mongo_client, None
+    if client is not None:
+        client.close()
+
+
+atexit.register(close_mongo_client)
+atexit.register(close_mysql_pools)
@@ -1,14 +1,36 @@
-import csv
 import json
 import os
-from typing import List, Dict
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
+
+# Converter settings (override with environment variables)
+CSV_JSON_FORMAT = os.getenv("CSV_JSON_FORMAT", "json")  # "json" (array) or "ndjson" (one document per line)
+CSV_JSON_CHUNK_ROWS = int(os.getenv("CSV_JSON_CHUNK_ROWS", "50000"))  # CSV rows converted per pass
+CSV_JSON_SAMPLE_ROWS = int(os.getenv("CSV_JSON_SAMPLE_ROWS", "100"))  # values sampled to type a column
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%Y-%m-%dT%H:%M:%S")
+
+# Shapes of the values infer_type converts, checked column-wise before parsing
+_INT = r"-?\d+"
+_FLOAT = r"[-+]?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_DATE_SHAPES = {
+    "%Y-%m-%d": r"\d{1,4}-\d{1,2}-\d{1,2}",
+    "%m/%d/%Y": r"\d{1,2}/\d{1,2}/\d{1,4}",
+    "%Y-%m-%dT%H:%M:%S": r"\d{1,4}-\d{1,2}-\d{1,2}T\d{1,2}:\d{1,2}:\d{1,2}",
+}
+# Anything infer_type could turn into something other than a string
+_CANDIDATE = r"(?s)-?\d+|.*\..*|\d+[-/]\d+[-/]\d+.*"
+
 
 class CSVtoJSONConverter:
-    def __init__(self, csv_file_path: str):
+    def __init__(self, csv_file_path: str, output_format: str = CSV_JSON_FORMAT):
         self.csv_file_path = csv_file_path
-        self.json_file_path = os.path.splitext(csv_file_path)[0] + ".json"
+        self.output_format = output_format
+        extension = ".ndjson" if output_format == "ndjson" else ".json"
+        self.json_file_path = os.path.splitext(csv_file_path)[0] + extension
+        self.column_types = {}
 
     def infer_type(self, value: str):
         """Convert value to appropriate data type for MongoDB-style JSON"""
@@ -32,7 +54,7 @@ class CSVtoJSONConverter:
             pass
 
         # Try ISO date
-        for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%Y-%m-%dT%H:%M:%S"):
+        for fmt in DATE_FORMATS:
             try:
                 dt = datetime.strptime(value, fmt)
                 return dt.isoformat()
@@ -42,51 +64,142 @@ class CSVtoJSONConverter:
         # Return as string
         return value
 
-    def convert(self) -> List[Dict]:
-        result = []
-
+    def cell_type(self, value: str) -> str:
+        """"int", "float", one of DATE_FORMATS or "str": what infer_type makes of ``value``."""
+        inferred = self.infer_type(value)
+        if isinstance(inferred, int):
+            return "int"
+        if isinstance(inferred, float):
+            return "float"
+        for fmt in DATE_FORMATS:
+            try:
+                datetime.strptime(value.strip(), fmt)
+                return fmt
+            except ValueError:
+                continue
+        return "str"
+
+    def column_type(self, values: pd.Series) -> str:
+        """Type of a column, decided once from its first non-null values."""
+        counts = {}
+        for value in values.head(CSV_JSON_SAMPLE_ROWS):
+            kind = self.cell_type(value)
+            counts[kind] = counts.get(kind, 0) + 1
+        if not counts:
+            return "str"
+        # Integers mixed with decimals are a float column
+        if set(counts) == {"int", "float"}:
+            return "float"
+        return max(counts, key=counts.get)
+
+    def convert_column(self, raw: pd.Series, kind: str) -> np.ndarray:
+        """Convert a whole column of raw CSV strings to JSON values (None for nulls).
+
+        Each distinct value is converted once, the column's type in one
+        vectorized pass; the few values that do not fit it fall back to
+        infer_type, so every cell gets exactly the value infer_type would give it.
+        """
+        codes, distinct = pd.factorize(raw)
+        return self._convert_values(pd.Series(distinct, dtype=object), kind)[codes]
+
+    def _convert_values(self, raw: pd.Series, kind: str) -> np.ndarray:
+        stripped = raw.str.strip()
+        null = (stripped == "") | (raw.str.lower() == "null")
+        values = stripped.to_numpy(dtype=object, copy=True)
+        values[null.to_numpy()] = None
+        pending = ~null
+
+        if kind in ("int", "float"):
+            integer = pending & stripped.str.fullmatch(_INT)
+            try:
+                values[integer.to_numpy()] = stripped[integer].astype("int64").to_numpy().astype(object)
+                pending &= ~integer
+            except (OverflowError, ValueError):
+                pass
+            if kind == "float":
+                # infer_type only reads a value as a float when it has a decimal point
+                decimal = pending & stripped.str.fullmatch(_FLOAT)
+                values[decimal.to_numpy()] = stripped[decimal].astype(float).to_numpy().astype(object)
+                pending &= ~decimal
+        elif kind in DATE_FORMATS:
+            shaped = pending & stripped.str.fullmatch(_DATE_SHAPES[kind])
+            dates = pd.to_datetime(stripped[shaped], format=kind, errors="coerce")
+            parsed = dates.notna().reindex(shaped.index, fill_value=False)
+            values[parsed.to_numpy()] = np.datetime_as_string(dates[dates.notna()].to_numpy(), unit="s")
+            pending &= ~parsed
+
+        # Whatever is left stays a string unless it could be a number or a date
+        leftover = pending & stripped.str.fullmatch(_CANDIDATE)
+        for position in np.flatnonzero(leftover.to_numpy()):
+            values[position] = self.infer_type(raw.iat[position])
+        return values
+
+    def iter_documents(self):
+        """Yield one document per CSV row, converted column by column in chunks."""
+        chunks = pd.read_csv(
+            self.csv_file_path,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=CSV_JSON_CHUNK_ROWS,
+        )
+        for chunk in chunks:
+            chunk.columns = [str(column).strip() for column in chunk.columns]
+            chunk.index = range(len(chunk))
+            columns = []
+            for name in chunk.columns:
+                raw = chunk[name]
+                if name not in self.column_types:
+                    sample = raw[(raw.str.strip() != "") & (raw.str.lower() != "null")]
+                    self.column_types[name] = self.column_type(sample)
+                columns.append((name, self.convert_column(raw, self.column_types[name])))
+            names = [name for name, _ in columns]
+            for row in zip(*(values for _, values in columns)):
+                document = {name: value for name, value in zip(names, row) if value is not None}
+                if document:
+                    yield document
+
+    def convert(self) -> int:
+        """Write the CSV file as JSON next to it; returns the number of documents written."""
+        written = 0
         try:
-            with open(self.csv_file_path, "r", encoding="utf-8") as csv_file:
-                csv_reader = csv.DictReader(csv_file)
-
-                if not csv_reader.fieldnames:
-                    raise ValueError("CSV file is empty or has no headers")
-
-                csv_reader.fieldnames = [field.strip() for field in csv_reader.fieldnames]
-                print(f"Using headers as keys: {csv_reader.fieldnames}")
-
-                for row in csv_reader:
-                    cleaned_row = {}
-                    for key, value in row.items():
-                        inferred = self.infer_type(value)
-                        if inferred is not None:
-                            cleaned_row[key.strip()] = inferred
-                    if cleaned_row:
-                        result.append(cleaned_row)
-
             with open(self.json_file_path, "w", encoding="utf-8") as json_file:
-                json.dump(result, json_file, indent=2)
-
-            print(f"Successfully converted '{self.csv_file_path}' to '{self.json_file_path}'")
-            return result
+                if self.output_format != "ndjson":
+                    json_file.write("[")
+                for document in self.iter_documents():
+                    if self.output_format == "ndjson":
+                        json_file.write(json.dumps(document) + "\n")
+                    else:
+                        json_file.write(("\n  " if written == 0 else ",\n  ") + json.dumps(document))
+                    written += 1
+                if self.output_format != "ndjson":
+                    json_file.write("\n]\n")
+
+            print(f"Column types: {self.column_types}")
+            print(f"Successfully converted '{self.csv_file_path}' to '{self.json_file_path}' ({written} documents)")
+            return written
 
         except FileNotFoundError:
             print(f"Error: File '{self.csv_file_path}' not found")
-            return []
+            return 0
+        except pd.errors.EmptyDataError:
+            print("Error during conversion: CSV file is empty or has no headers")
+            return 0
         except Exception as e:
             print(f"Error during conversion: {str(e)}")
-            return []
+            return 0
 
 
 # Example usage
 def main():
     your_csv_path = "data/adventure_works_csv/Sales.csv"
     converter = CSVtoJSONConverter(your_csv_path)
-    result = converter.convert()
+    written = converter.convert()
 
-    if result:
-        print("\nConverted data:")
-        print(json.dumps(result, indent=2))
+    if written:
+        with open(converter.json_file_path, "r", encoding="utf-8") as json_file:
+            print("\nFirst documents:")
+            for line in json_file.readlines()[:6]:
+                print(line.rstrip())
 
 
 if __name__ == "__main__":
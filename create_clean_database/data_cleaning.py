@@ -1,54 +1,82 @@
-import pymysql
-import re
 import os
-import json
-from functools import lru_cache
+import sys
+import time
 from typing import Optional
 
-# Database connection parameters
-db_config = {
-    "host": "localhost",
-    "user": "root",
-    "password": "wela1104",
-    "database": "adventure_works",
-}
+import pymysql
 
-# Limits and batch size
-BATCH_SIZE = 1000  # Batch processing size for updates
-MAX_OPERATIONS_PER_SESSION = 50  # Query limit: max database operations
-operation_counter_file = "operation_counter.json"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connections import MYSQL_CONFIG
+
+# Database to clean
+DATABASE = os.getenv("CLEAN_DATABASE", "adventure_works")
+
+# Cleaning settings (override with environment variables)
+CLEAN_BATCH_ROWS = int(os.getenv("CLEAN_BATCH_ROWS", "1000"))  # rows per keyset batch, 0 = one set-based UPDATE
+MAX_OPERATIONS_PER_SESSION = int(os.getenv("CLEAN_MAX_OPERATIONS", "50"))  # no new column is started past this
+
+# Number formats MySQL can CAST once "$", "," and blanks are removed
+_NUMBER_REGEXP = "^-?[0-9]+(\\\\.[0-9]+)?$"
+
+# Cleaner -> (column type after cleaning or None to clean in place, expression over {col})
+CLEANERS = {
+    "currency": (
+        "DECIMAL(12,2)",
+        "IF(REPLACE(REPLACE(TRIM({col}), '$', ''), ',', '') REGEXP '" + _NUMBER_REGEXP + "', "
+        "CAST(REPLACE(REPLACE(TRIM({col}), '$', ''), ',', '') AS DECIMAL(12,2)), NULL)",
+    ),
+    "date": (
+        "DATETIME",
+        "CASE "
+        "WHEN TRIM({col}) REGEXP '^[0-9]{{4}}-[0-9]{{1,2}}-[0-9]{{1,2}}[ T][0-9:]+$' "
+        "THEN STR_TO_DATE(REPLACE(TRIM({col}), 'T', ' '), '%Y-%m-%d %H:%i:%s') "
+        "WHEN TRIM({col}) REGEXP '^[0-9]{{4}}-[0-9]{{1,2}}-[0-9]{{1,2}}$' THEN STR_TO_DATE(TRIM({col}), '%Y-%m-%d') "
+        "WHEN TRIM({col}) REGEXP '^[0-9]{{1,2}}/[0-9]{{1,2}}/[0-9]{{4}}$' THEN STR_TO_DATE(TRIM({col}), '%m/%d/%Y') "
+        "END",
+    ),
+    "trim": (None, "NULLIF(TRIM({col}), '')"),
+}
+# Column types that a cleaner has nothing left to do on
+_CLEAN_TYPES = {
+    "currency": ("decimal", "double", "float", "int", "bigint", "smallint", "tinyint", "mediumint"),
+    "date": ("datetime", "date", "timestamp"),
+}
 
+# Columns cleaned by main(): table -> {column: cleaner}. Table names are the
+# lower-cased CSV file names write_sql.py creates them under (see
+# csv_loading.table_name); the price and cost columns are already loaded as DOUBLE.
+CLEANING_PLAN = {
+    "product": {"Product": "trim"},
+    "sales": {"OrderDate": "date"},
+}
 
-def initialize_operation_counter():
-    if not os.path.exists(operation_counter_file):
-        with open(operation_counter_file, "w") as f:
-            json.dump({"operations": 0}, f)
+_operations = 0
+# (database, table, column) -> dict(cleaner, last_key, rows, warnings, done); lets a failed run resume
+_checkpoints = {}
 
 
 def get_operation_count() -> int:
-    initialize_operation_counter()
-    with open(operation_counter_file, "r") as f:
-        data = json.load(f)
-    return data.get("operations", 0)
+    return _operations
 
 
 def increment_operation_count(count: int = 1):
-    initialize_operation_counter()
-    with open(operation_counter_file, "r") as f:
-        data = json.load(f)
-    data["operations"] = data.get("operations", 0) + count
-    with open(operation_counter_file, "w") as f:
-        json.dump(data, f)
+    global _operations
+    _operations += count
 
 
 def reset_operation_counter():
-    with open(operation_counter_file, "w") as f:
-        json.dump({"operations": 0}, f)
+    global _operations
+    _operations = 0
+
+
+def get_checkpoint(table_name: str, column_name: str, database: str = DATABASE) -> Optional[dict]:
+    checkpoint = _checkpoints.get((database, table_name, column_name))
+    return dict(checkpoint) if checkpoint else None
 
 
-def connect_to_database():
+def connect_to_database(database: str = DATABASE):
     try:
-        conn = pymysql.connect(**db_config)
+        conn = pymysql.connect(database=database, **MYSQL_CONFIG)
         print("Successfully connected to the database.")
         return conn
     except pymysql.Error as e:
@@ -56,118 +84,164 @@ def connect_to_database():
         return None
 
 
-@lru_cache(maxsize=128)
-def get_column_info(table_name: str, column_name: str) -> Optional[tuple]:
-    conn = connect_to_database()
-    if not conn:
-        return None
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            f"SHOW COLUMNS FROM {table_name} WHERE Field = %s", (column_name,)
-        )
-        column_info = cursor.fetchone()
-        return column_info
-    finally:
-        cursor.close()
-        conn.close()
-
-
-def clean_column_dollar_signs(conn, table_name: str, column_name: str):
-    # Check operation limit (token usage proxy)
-    operation_count = get_operation_count()
-    if operation_count >= MAX_OPERATIONS_PER_SESSION:
-        print(
-            f"Error: Maximum number of database operations ({MAX_OPERATIONS_PER_SESSION}) reached."
-        )
+def _quote(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def get_column_info(cursor, table_name: str, column_name: str) -> Optional[tuple]:
+    """(DATA_TYPE, COLUMN_TYPE) of a column, read fresh since cleaning changes it."""
+    cursor.execute(
+        "SELECT DATA_TYPE, COLUMN_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table_name, column_name),
+    )
+    return cursor.fetchone()
+
+
+def get_primary_key(cursor, table_name: str) -> Optional[str]:
+    """The table's primary key column, or None when it has none or a composite one."""
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'",
+        (table_name,),
+    )
+    keys = cursor.fetchall()
+    return keys[0][0] if len(keys) == 1 else None
+
+
+def _update(conn, cursor, sql: str) -> tuple:
+    """Run one UPDATE IGNORE and commit; returns (rows changed, values that could not be converted)."""
+    cursor.execute(sql)
+    rows = cursor.rowcount
+    cursor.execute("SHOW COUNT(*) WARNINGS")
+    warnings = cursor.fetchone()[0]
+    conn.commit()
+    increment_operation_count()
+    return rows, warnings
+
+
+def _run_update(conn, cursor, table_name: str, assignment: str, where: str, checkpoint: dict):
+    """Apply ``assignment`` to the table, in keyset batches over the primary key when there is one.
+
+    Each batch is a range of the primary key index, so it costs the same
+    wherever it is in the table; the last key done is kept in ``checkpoint``.
+    """
+    table = _quote(table_name)
+    primary_key = get_primary_key(cursor, table_name) if CLEAN_BATCH_ROWS else None
+    if primary_key is None:
+        rows, warnings = _update(conn, cursor, f"UPDATE IGNORE {table} SET {assignment} WHERE {where}")
+        checkpoint["rows"] += rows
+        checkpoint["warnings"] += warnings
+        print(f"Updated {rows} rows in one statement.")
         return
 
+    key = _quote(primary_key)
+    while True:
+        after = "" if checkpoint["last_key"] is None else f"WHERE {key} > {conn.literal(checkpoint['last_key'])}"
+        cursor.execute(f"SELECT MAX(k) FROM (SELECT {key} AS k FROM {table} {after} ORDER BY {key} LIMIT {CLEAN_BATCH_ROWS}) batch")
+        upper = cursor.fetchone()[0]
+        if upper is None:
+            return
+        batch = f"{key} <= {conn.literal(upper)}"
+        if checkpoint["last_key"] is not None:
+            batch = f"{key} > {conn.literal(checkpoint['last_key'])} AND {batch}"
+        rows, warnings = _update(conn, cursor, f"UPDATE IGNORE {table} SET {assignment} WHERE {batch} AND ({where})")
+        checkpoint.update(last_key=upper, rows=checkpoint["rows"] + rows, warnings=checkpoint["warnings"] + warnings)
+        print(f"Updated {rows} rows in batch ({primary_key} <= {upper}).")
+
+
+def clean_column(conn, table_name: str, column_name: str, cleaner: str) -> int:
+    """Clean one column with a cleaner from CLEANERS; returns the number of rows changed.
+
+    Typed cleaners write the converted values to a temporary column that
+    then replaces the original. A run that fails part-way resumes from its
+    checkpoint when called again in the same session.
+    """
+    if get_operation_count() >= MAX_OPERATIONS_PER_SESSION:
+        print(f"Error: Maximum number of database operations ({MAX_OPERATIONS_PER_SESSION}) reached.")
+        return 0
+    target_type, expression = CLEANERS[cleaner]
+    started = time.perf_counter()
+
     cursor = conn.cursor()
     try:
-        # Step 1: Check the current data type of the column (cached)
-        column_info = get_column_info(table_name, column_name)
+        cursor.execute("SELECT DATABASE()")
+        checkpoint_key = (cursor.fetchone()[0], table_name, column_name)
+        column_info = get_column_info(cursor, table_name, column_name)
         if not column_info:
             print(f"Column {column_name} not found in table {table_name}.")
-            return
-
-        current_type = column_info[1]
-        print(f"Current data type of {table_name}.{column_name}: {current_type}")
-
-        # Step 2: If the column is already DECIMAL, check for dollar signs
-        if "decimal" in current_type.lower():
-            print(
-                f"{column_name} is already a DECIMAL type. Checking for dollar signs..."
-            )
-            cursor.execute(
-                f"SELECT {column_name} FROM {table_name} WHERE {column_name} LIKE '%$%' LIMIT 1"
-            )
-            if cursor.fetchone():
-                print(
-                    f"Dollar signs found in {table_name}.{column_name}, but column is already DECIMAL. This shouldn't happen."
-                )
-            else:
-                print(
-                    f"No dollar signs found in {table_name}.{column_name}. No changes needed."
-                )
-            return
+            return 0
+        print(f"Current data type of {table_name}.{column_name}: {column_info[1]}")
+        if column_info[0].lower() in _CLEAN_TYPES.get(cleaner, ()):
+            print(f"{table_name}.{column_name} is already {column_info[1]}. No changes needed.")
+            return 0
+
+        checkpoint = _checkpoints.get(checkpoint_key)
+        if checkpoint is None or checkpoint["cleaner"] != cleaner or checkpoint["done"]:
+            checkpoint = {"cleaner": cleaner, "last_key": None, "rows": 0, "warnings": 0, "done": False}
+            _checkpoints[checkpoint_key] = checkpoint
+        else:
+            print(f"Resuming {table_name}.{column_name} after key {checkpoint['last_key']}.")
+
+        table, column = _quote(table_name), _quote(column_name)
+        if target_type is None:
+            cleaned = expression.format(col=column)
+            _run_update(conn, cursor, table_name, f"{column} = {cleaned}", f"NOT ({column} <=> {cleaned})", checkpoint)
+        else:
+            temp_column = f"{column_name}_clean"
+            if checkpoint["last_key"] is None or not get_column_info(cursor, table_name, temp_column):
+                # Fresh start: a temporary column left by an earlier session is rebuilt
+                checkpoint.update(last_key=None, rows=0, warnings=0)
+                if get_column_info(cursor, table_name, temp_column):
+                    cursor.execute(f"ALTER TABLE {table} DROP COLUMN {_quote(temp_column)}")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(temp_column)} {target_type}")
+                increment_operation_count()
+                print(f"Added temporary column {temp_column} to {table_name}.")
+            assignment = f"{_quote(temp_column)} = {expression.format(col=column)}"
+            _run_update(conn, cursor, table_name, assignment, f"{column} IS NOT NULL", checkpoint)
 
-        # Step 3: Add a temporary column to hold numeric values
-        temp_column = f"{column_name}_numeric"
-        cursor.execute(
-            f"ALTER TABLE {table_name} ADD COLUMN {temp_column} DECIMAL(10,2)"
-        )
-        print(f"Added temporary column {temp_column} to {table_name}.")
-        increment_operation_count()
-
-        # Step 4: Count total rows to process
-        cursor.execute(
-            f"SELECT COUNT(*) FROM {table_name} WHERE {column_name} IS NOT NULL"
-        )
-        total_rows = cursor.fetchone()[0]
-        print(f"Total rows to process in {table_name}.{column_name}: {total_rows}")
-
-        # Step 5: Update rows in batches
-        for offset in range(0, total_rows, BATCH_SIZE):
             cursor.execute(
-                f"""
-                UPDATE {table_name}
-                SET {temp_column} = CAST(REPLACE({column_name}, '$', '') AS DECIMAL(10,2))
-                WHERE {column_name} IS NOT NULL
-                LIMIT {BATCH_SIZE} OFFSET {offset}
-            """
+                f"ALTER TABLE {table} DROP COLUMN {column}, "
+                f"CHANGE COLUMN {_quote(temp_column)} {column} {target_type}"
             )
             conn.commit()
-            rows_updated = cursor.rowcount
-            print(f"Updated {rows_updated} rows in batch (offset {offset}).")
             increment_operation_count()
+            print(f"Replaced {column_name} with {target_type} values.")
 
-        # Step 6: Drop the old column and rename the new column
-        cursor.execute(f"ALTER TABLE {table_name} DROP COLUMN {column_name}")
-        cursor.execute(
-            f"ALTER TABLE {table_name} CHANGE COLUMN {temp_column} {column_name} DECIMAL(10,2)"
+        checkpoint["done"] = True
+        elapsed = time.perf_counter() - started
+        print(
+            f"✅ {table_name}.{column_name} ({cleaner}): {checkpoint['rows']} rows in {elapsed:.2f}s"
+            + (f", {checkpoint['warnings']} values not convertible (set to NULL)" if checkpoint["warnings"] else "")
         )
-        conn.commit()
-        print(f"Replaced {column_name} with numeric values (DECIMAL(10,2)).")
-        increment_operation_count()
+        return checkpoint["rows"]
 
     except pymysql.Error as e:
         print(f"Error processing {table_name}.{column_name}: {e}")
         conn.rollback()
+        return 0
     finally:
         cursor.close()
 
 
+def clean_column_dollar_signs(conn, table_name: str, column_name: str) -> int:
+    return clean_column(conn, table_name, column_name, "currency")
+
+
+def clean_table(conn, table_name: str, columns: dict) -> int:
+    """Clean several columns of a table; ``columns`` maps column -> cleaner."""
+    return sum(clean_column(conn, table_name, column, cleaner) for column, cleaner in columns.items())
+
+
 def main():
     conn = connect_to_database()
     if not conn:
         return
 
     try:
-        print("\nProcessing product.StandardCost...")
-        clean_column_dollar_signs(conn, "product", "StandardCost")
-
-        print("\nProcessing sales.Sales...")
-        clean_column_dollar_signs(conn, "sales", "Sales")
+        for table_name, columns in CLEANING_PLAN.items():
+            print(f"\nProcessing {table_name}: {', '.join(columns)}...")
+            clean_table(conn, table_name, columns)
 
     finally:
         conn.close()
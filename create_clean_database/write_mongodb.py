@@ -1,44 +1,183 @@
 import os
+import re
+import sys
 import json
-from pymongo import MongoClient
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Connect to MongoDB
-client = MongoClient("mongodb://localhost:27017")
+from pymongo import InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connections import get_mongo_client
+from schemas import schemas
+
+# Loader settings (override with environment variables)
+MONGO_LOAD_MODE = os.getenv("MONGO_LOAD_MODE", "upsert")  # "upsert", "replace" (drop and reload) or "insert"
+MONGO_LOAD_BATCH = int(os.getenv("MONGO_LOAD_BATCH", "1000"))  # documents per bulk write
+MONGO_LOAD_WORKERS = int(os.getenv("MONGO_LOAD_WORKERS", "4"))  # collections loaded in parallel
+_READ_SIZE = 1 << 20  # bytes read from a JSON file at a time
 
 # Base folder where all your datasets live
 base_folder = "data"
 
-# Loop through each dataset folder under 'data/'
-for folder_name in os.listdir(base_folder):
-    dataset_path = os.path.join(base_folder, folder_name)
-    # print(dataset_path)
+_PRIMARY_KEY_PATTERN = re.compile(r"(?ms)^Primary Keys:\n(.*?)(?:\n\n|\nForeign Keys:|\Z)")
+
+
+def primary_keys(dataset: str) -> dict:
+    """Collection (lower-cased) -> primary key field, from the MongoDB part of schemas.py."""
+    if dataset not in schemas:
+        return {}
+    keys = _PRIMARY_KEY_PATTERN.search(schemas[dataset]["mongodb"])
+    if not keys:
+        return {}
+    return {table.lower(): field for table, field in re.findall(r"(?m)^- (\w+)\.(\w+)", keys.group(1))}
+
+
+def iter_json_documents(file_path: str):
+    """Yield the documents of a JSON array one at a time without loading the whole file.
+
+    A file of documents that are not in an array (one object, or NDJSON) yields each of them.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer = ""
+        while not buffer:
+            block = f.read(_READ_SIZE)
+            buffer, eof = block.lstrip(), not block
+            if eof:
+                break
+        array = buffer.startswith("[")
+        position = 1 if array else 0
+        while True:
+            # Skip whitespace and the comma between elements
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                buffer, position = f.read(_READ_SIZE), 0
+                eof = not buffer
+            if position >= len(buffer):
+                if array:
+                    raise ValueError("unterminated JSON array")
+                return
+            if array and buffer[position] == "]":
+                return
+            try:
+                document, end = decoder.raw_decode(buffer, position)
+                # A number ending the block may continue in the next one
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # The element continues in the next block
+                more = f.read(_READ_SIZE)
+                eof = not more
+                buffer, position = buffer[position:] + more, 0
+                continue
+            if not (array or isinstance(document, dict)):
+                raise ValueError("expected a JSON array or objects")
+            yield document
+            position = end
+
+
+def _batches(documents, size: int):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _key_is_unique(file_path: str, key: str) -> bool:
+    seen = set()
+    for document in iter_json_documents(file_path):
+        value = document.get(key)
+        if value is None or value in seen:
+            return False
+        seen.add(value)
+    return True
+
+
+def load_collection(db, file_path: str, collection_name: str, key, mode: str = MONGO_LOAD_MODE) -> int:
+    """Load one JSON file into a collection in unordered bulk writes; returns documents written.
+
+    ``upsert`` replaces documents by ``key`` so reloading is idempotent. When
+    the file has no usable key (missing or not unique) it falls back to
+    ``replace``, which drops the collection before inserting.
+    """
+    collection = db[collection_name]
+    if mode == "upsert" and not (key and _key_is_unique(file_path, key)):
+        print(f"⚠️ {db.name}.{collection_name}: no unique key, reloading with 'replace'")
+        mode = "replace"
+    if mode == "replace":
+        collection.drop()
+    elif mode == "upsert":
+        collection.create_index(key)
+
+    started = time.perf_counter()
+    written = 0
+    for batch in _batches(iter_json_documents(file_path), MONGO_LOAD_BATCH):
+        if mode == "upsert":
+            requests = [ReplaceOne({key: doc[key]}, doc, upsert=True) for doc in batch]
+        else:
+            requests = [InsertOne(doc) for doc in batch]
+        try:
+            result = collection.bulk_write(requests, ordered=False)
+            written += result.inserted_count + result.upserted_count + result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            written += details.get("nInserted", 0) + details.get("nUpserted", 0) + details.get("nMatched", 0)
+            print(f"⚠️ {db.name}.{collection_name}: {len(details.get('writeErrors', []))} documents failed")
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ {db.name}.{collection_name}: {written} documents ({mode}) in {elapsed:.2f}s "
+        f"({written / elapsed if elapsed else 0:,.0f} docs/s)"
+    )
+    return written
 
-    if os.path.isdir(dataset_path):
-        if dataset_path.endswith("_json"):
-            db = client[folder_name.replace("_json", "")]  # DB name: adventure_works, bike_store, etc.
-            # print(db)
-            print(f"\n Using database: {db.name}")
 
-            # Loop through JSON files in this dataset folder
-            for file_name in os.listdir(dataset_path):
-                if file_name.endswith(".json"):
-                    collection_name = file_name.replace('.json', '')
-                    file_path = os.path.join(dataset_path, file_name)
+def load_all(base_folder: str = base_folder, mode: str = MONGO_LOAD_MODE, workers: int = MONGO_LOAD_WORKERS) -> int:
+    """Load every ``<dataset>_json`` folder into the ``<dataset>`` database, one collection per thread."""
+    # Shared client (closed automatically at exit); pymongo clients are thread-safe
+    client = get_mongo_client()
+    jobs = []
+    for folder_name in sorted(os.listdir(base_folder)):
+        dataset_path = os.path.join(base_folder, folder_name)
+        if not (os.path.isdir(dataset_path) and folder_name.endswith("_json")):
+            continue
+        dataset = folder_name.replace("_json", "")  # DB name: adventure_works, bike_store, etc.
+        keys = primary_keys(dataset)
+        for file_name in sorted(os.listdir(dataset_path)):
+            if file_name.endswith((".json", ".ndjson")):
+                collection_name = os.path.splitext(file_name)[0]
+                file_path = os.path.join(dataset_path, file_name)
+                jobs.append((client[dataset], file_path, collection_name, keys.get(collection_name.lower())))
 
-                    try:
-                        with open(file_path, "r") as f:
-                            data = json.load(f)
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(load_collection, *job, mode): job[1] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                total += future.result()
+            except Exception as e:
+                print(f"Error loading {futures[future]}: {e}")
+    return total
 
-                            if isinstance(data, list):
-                                db[collection_name].insert_many(data)
-                            elif isinstance(data, dict):
-                                db[collection_name].insert_one(data)
-                            else:
-                                print(f"Skipped {file_name}: invalid format")
 
-                            print(f"Inserted into collection: {collection_name}")
+def main():
+    started = time.perf_counter()
+    total = load_all()
+    elapsed = time.perf_counter() - started
+    print(f"\n🎉 Loaded {total} documents in {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} docs/s)")
 
-                    except Exception as e:
-                        print(f"Error loading {file_path}: {e}")
 
-print("\n🎉 All JSON files loaded into their respective MongoDB databases!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import re
+
+import pandas as pd
+
+from schemas import schemas
+
+_COLLECTION_PATTERN = re.compile(r"(?ms)^- (\w+): \{(.*?)^\}")
+_FIELD_PATTERN = re.compile(r'"([^"]+)":\s*"(\w+)"')
+_PRIMARY_KEY_PATTERN = re.compile(r"(?ms)^Primary Keys:\n(.*?)(?:\n\n|\nForeign Keys:|\Z)")
+_FOREIGN_KEY_PATTERN = re.compile(r"(?m)^- (\w+)\.(\w+) →")
+_NUMBER_JUNK = re.compile(r"[$,\s]")
+
+# How ISODate values are written: MySQL DATETIME literals
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def table_name(file_name: str) -> str:
+    """Table a CSV file is loaded into: its name without extension, lower-cased like SQL_TABLES."""
+    return os.path.splitext(os.path.basename(file_name))[0].lower()
+
+
+def table_specs(dataset: str) -> dict:
+    """Column types, primary key and indexed columns of each table of ``dataset``.
+
+    Read from the MongoDB section of schemas.py, keyed by lower-cased table
+    name; empty for a dataset schemas.py does not describe.
+    """
+    if dataset not in schemas:
+        return {}
+    schema_text = schemas[dataset]["mongodb"]
+    specs = {}
+    for match in _COLLECTION_PATTERN.finditer(schema_text):
+        specs[match.group(1).lower()] = {
+            "types": dict(_FIELD_PATTERN.findall(match.group(2))),
+            "primary_key": None,
+            "indexes": [],
+        }
+
+    keys = _PRIMARY_KEY_PATTERN.search(schema_text)
+    for table, column in re.findall(r"(?m)^- (\w+)\.(\w+)", keys.group(1) if keys else ""):
+        if table.lower() in specs:
+            specs[table.lower()]["primary_key"] = column
+    for table, column in _FOREIGN_KEY_PATTERN.findall(schema_text):
+        spec = specs.get(table.lower())
+        if spec and column != spec["primary_key"] and column not in spec["indexes"]:
+            spec["indexes"].append(column)
+    return specs
+
+
+def infer_type(values: pd.Series) -> str:
+    """"int", "float" or "string" for a column missing from schemas.py, from its values read as text."""
+    values = values.dropna()
+    numbers = pd.to_numeric(values.str.replace(_NUMBER_JUNK, "", regex=True), errors="coerce")
+    if len(values) and numbers.notna().all():
+        return "int" if (numbers % 1 == 0).all() else "float"
+    return "string"
+
+
+def column_types(sample: pd.DataFrame, spec: dict) -> dict:
+    """Type of every column of a CSV sample read as text; schemas.py types win over inferred ones."""
+    types = spec.get("types", {})
+    return {column: types.get(column) or infer_type(sample[column]) for column in sample.columns}
+
+
+def convert_chunk(chunk: pd.DataFrame, types: dict, date_format: str = DATETIME_FORMAT):
+    """Typed rows of a chunk read as strings, plus how many values became NULL.
+
+    "$" and thousands separators are dropped from numbers; values that are
+    not valid numbers or dates (e.g. "not available") are stored as NULL.
+    With ``date_format=None`` a date column without times of day is written
+    as plain dates.
+    """
+    converted = {}
+    nulled = 0
+    for column, field_type in types.items():
+        values = chunk[column]
+        if field_type in ("int", "float"):
+            typed = pd.to_numeric(values.str.replace(_NUMBER_JUNK, "", regex=True), errors="coerce")
+            if field_type == "int":
+                typed = typed.where(typed % 1 == 0).astype("Int64")
+        elif field_type == "ISODate":
+            typed = pd.to_datetime(values, errors="coerce", format="mixed")
+            dates = typed.dropna()
+            plain = date_format is None and (dates == dates.dt.normalize()).all()
+            typed = typed.dt.strftime(DATE_FORMAT if plain else date_format or DATETIME_FORMAT)
+        else:
+            typed = values
+        nulled += int((values.notna() & typed.isna()).sum())
+        converted[column] = typed.astype(object).where(typed.notna(), None)
+    rows = list(zip(*(converted[column] for column in types)))
+    return rows, nulled
@@ -0,0 +1,261 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple, Optional
+
+from query_control import cancel_query, new_query_token
+from query_executor import MongoStream, SQLStream, execute_mongodb_query, is_write_query, stream_sql_query
+from query_generator import generate_query
+from schemas import schemas
+from tracing import span
+
+# Dual execution settings (override with environment variables)
+DUAL_EXECUTION = os.getenv("DUAL_EXECUTION", "0") != "0"  # initial state of the UI toggle
+DUAL_WORKERS = int(os.getenv("DUAL_WORKERS", "8"))  # threads shared by all racing pipelines
+DUAL_LOG_PATH = os.getenv("DUAL_LOG_PATH", "")  # JSONL file of finished races, reloaded at startup; empty = none
+
+QUERY_TYPES = ("sql", "mongodb")
+
+# First match wins; anything else is a "lookup"
+_QUESTION_TYPES = [
+    ("write", re.compile(r"\b(insert|add|create|update|change|set|delete|remove|drop)\b", re.IGNORECASE)),
+    ("aggregate", re.compile(
+        r"\b(how many|count|number of|total|sum|average|avg|mean|per|each|group|most|least|top|max|"
+        r"min|maximum|minimum|highest|lowest)\b",
+        re.IGNORECASE,
+    )),
+]
+
+
+def question_type(question: str) -> str:
+    """Coarse kind of a question ("write", "aggregate" or "lookup"), the key races are recorded under."""
+    for name, pattern in _QUESTION_TYPES:
+        if pattern.search(question):
+            return name
+    return "lookup"
+
+
+class PipelineResult(NamedTuple):
+    """What one pipeline (generation, then execution) produced."""
+
+    query_type: str
+    query: Optional[str]
+    results: object  # the executor's result, or a string starting with "Error", "Skipped", "Timeout" or "Cancelled"
+    generate_seconds: float
+    execute_seconds: float
+    finished_at: float  # time.perf_counter() when the pipeline ended
+
+    @property
+    def seconds(self) -> float:
+        return self.generate_seconds + self.execute_seconds
+
+    @property
+    def valid(self) -> bool:
+        return not isinstance(self.results, str)
+
+
+def run_pipeline(query_type: str, question: str, database: str, token: str, cancelled: threading.Event) -> PipelineResult:
+    """Generate and run one query type; writes are generated but never run."""
+    started = time.perf_counter()
+    with span("pipeline", query_type=query_type) as stage:
+        try:
+            query = generate_query(question, query_type=query_type, schemas=schemas, database=database)
+        except Exception as e:
+            query, results = None, f"Error: Query generation error: {e}"
+        generated = time.perf_counter()
+        label = "SQL" if query_type == "sql" else "MongoDB"
+        try:
+            if query is None:
+                pass
+            elif not query:
+                results = f"Error: No {label} query generated."
+            elif is_write_query(query, query_type):
+                results = "Skipped: queries that change data are not run in dual mode."
+            elif cancelled.is_set():
+                results = "Cancelled: the other query answered first."
+            elif query_type == "sql":
+                results = stream_sql_query(query, database, token=token)
+            else:
+                results = execute_mongodb_query(query, database, stream=True, token=token)
+        except Exception as e:
+            results = f"Error executing {label} query: {e}"
+        stage.set(result=results[:200] if isinstance(results, str) else type(results).__name__)
+    finished = time.perf_counter()
+    return PipelineResult(query_type, query, results, generated - started, finished - generated, finished)
+
+
+def _close(result: PipelineResult):
+    if isinstance(result.results, (SQLStream, MongoStream)):
+        result.results.close()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DUAL_WORKERS, thread_name_prefix="dual")
+        return _executor
+
+
+class DualRun:
+    """The SQL and MongoDB pipelines of one question, started together on the shared pool.
+
+    ``next_result`` hands out results in the order they finish. ``cancel``
+    stops whatever is still running (a pipeline still generating skips its
+    execution) and closes streams nobody will read; it also records the race.
+    """
+
+    def __init__(self, question: str, database: str):
+        self.question = question
+        self.database = database
+        self.question_type = question_type(question)
+        self.tokens = {query_type: new_query_token() for query_type in QUERY_TYPES}
+        self._cancelled = threading.Event()
+        self._futures = {}
+        self._finished = {}  # query_type -> PipelineResult
+        self._recorded = False
+        executor = _get_executor()
+        for query_type in QUERY_TYPES:
+            # The copied context keeps both pipelines' spans in the caller's trace
+            self._futures[executor.submit(
+                contextvars.copy_context().run,
+                run_pipeline, query_type, question, database, self.tokens[query_type], self._cancelled,
+            )] = query_type
+
+    @property
+    def pending(self) -> list:
+        return [query_type for query_type in QUERY_TYPES if query_type not in self._finished]
+
+    def next_result(self, timeout: float = None) -> Optional[PipelineResult]:
+        """The next pipeline to finish, or None if none finished within ``timeout`` seconds."""
+        waiting = [future for future, query_type in self._futures.items() if query_type not in self._finished]
+        if not waiting:
+            return None
+        done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            return None
+        future = next(iter(done))
+        result = future.result()
+        self._finished[self._futures[future]] = result
+        return result
+
+    def cancel(self):
+        """Stop the pipelines still running and record the race."""
+        self._cancelled.set()
+        for future, query_type in self._futures.items():
+            if query_type in self._finished:
+                continue
+            if future.done():
+                # Finished but never handed out: it still counts for the race
+                self._finished[query_type] = future.result()
+                _close(self._finished[query_type])
+                continue
+            cancel_query(self.tokens[query_type])
+            if not future.cancel():
+                # Close the stream of a pipeline that finishes after nobody is waiting for it
+                future.add_done_callback(lambda done: not done.cancelled() and _close(done.result()))
+        self.record()
+
+    def record(self) -> Optional[str]:
+        """Record the race once; returns the backend whose valid result came first.
+
+        Nothing is recorded when neither pipeline finished.
+        """
+        if self._recorded or not self._finished:
+            return None
+        self._recorded = True
+        finished = sorted(self._finished.values(), key=lambda result: result.finished_at)
+        return record_race(self.database, self.question_type, finished)
+
+
+_stats_lock = threading.Lock()
+_stats = {}  # (database, question_type) -> counters
+_log_loaded = False
+
+
+def _add_race(database: str, kind: str, winner: Optional[str], seconds: dict):
+    entry = _stats.setdefault((database, kind), {
+        "races": 0,
+        "no_winner": 0,
+        **{f"{query_type}_wins": 0 for query_type in QUERY_TYPES},
+        **{f"{query_type}_seconds": 0.0 for query_type in QUERY_TYPES},
+        **{f"{query_type}_finished": 0 for query_type in QUERY_TYPES},
+    })
+    entry["races"] += 1
+    if winner:
+        entry[f"{winner}_wins"] += 1
+    else:
+        entry["no_winner"] += 1
+    for query_type, value in seconds.items():
+        entry[f"{query_type}_seconds"] += value
+        entry[f"{query_type}_finished"] += 1
+
+
+def _load_log():
+    global _log_loaded
+    if _log_loaded:
+        return
+    _log_loaded = True
+    if not (DUAL_LOG_PATH and os.path.exists(DUAL_LOG_PATH)):
+        return
+    with open(DUAL_LOG_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                race = json.loads(line)
+                _add_race(race["database"], race["question_type"], race["winner"], race["seconds"])
+            except (ValueError, KeyError, TypeError):
+                print(f"⚠️ Skipping a malformed line of {DUAL_LOG_PATH}")
+
+
+def record_race(database: str, kind: str, finished: list) -> Optional[str]:
+    """Count the first valid result of ``finished`` (PipelineResults in finishing order) as the winner.
+
+    The time recorded per backend is its execution only; Gemini's generation
+    time says nothing about the database.
+    """
+    winner = next((result.query_type for result in finished if result.valid), None)
+    # Only valid results say how long a backend takes to answer
+    seconds = {result.query_type: round(result.execute_seconds, 4) for result in finished if result.valid}
+    with _stats_lock:
+        _load_log()
+        _add_race(database, kind, winner, seconds)
+        if DUAL_LOG_PATH:
+            race = {"time": time.time(), "database": database, "question_type": kind, "winner": winner, "seconds": seconds}
+            with open(DUAL_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(race) + "\n")
+    return winner
+
+
+def faster_backend(database: str, kind: str) -> Optional[str]:
+    """The backend with the lower mean execution time for this dataset and question type, once both have one."""
+    with _stats_lock:
+        _load_log()
+        entry = _stats.get((database, kind))
+    if not entry or not all(entry[f"{query_type}_finished"] for query_type in QUERY_TYPES):
+        return None
+    means = {query_type: entry[f"{query_type}_seconds"] / entry[f"{query_type}_finished"] for query_type in QUERY_TYPES}
+    best = min(means, key=means.get)
+    return best if list(means.values()).count(means[best]) == 1 else None
+
+
+def dual_stats() -> dict:
+    """Races per "dataset / question type", with wins and mean execution seconds of a valid result per backend."""
+    with _stats_lock:
+        _load_log()
+        stats = {}
+        for (database, kind), entry in sorted(_stats.items()):
+            row = {"races": entry["races"], "no_winner": entry["no_winner"]}
+            for query_type in QUERY_TYPES:
+                finished = entry[f"{query_type}_finished"]
+                row[f"{query_type}_wins"] = entry[f"{query_type}_wins"]
+                row[f"{query_type}_mean_execute_s"] = round(entry[f"{query_type}_seconds"] / finished, 3) if finished else None
+            stats[f"{database} / {kind}"] = row
+    return stats
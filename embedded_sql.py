@@ -0,0 +1,395 @@
+import calendar
+import datetime
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import pandas as pd
+
+from connections import PoolTimeout
+from csv_loading import column_types, convert_chunk, table_name, table_specs
+
+# Embedded SQL backend settings (override with environment variables)
+SQL_BACKEND = os.getenv("SQL_BACKEND", "mysql")  # "mysql", or "sqlite" to answer SQL from the bundled CSVs
+EMBEDDED_DATA_PATH = os.getenv("EMBEDDED_DATA_PATH", "data")  # folder holding the <schema>_csv (and _json) folders
+EMBEDDED_DB_DIR = os.getenv("EMBEDDED_DB_DIR", "")  # keep <schema>.sqlite files here, empty = in memory
+EMBEDDED_POOL_SIZE = int(os.getenv("EMBEDDED_POOL_SIZE", "4"))  # connections per schema
+EMBEDDED_POOL_TIMEOUT = float(os.getenv("EMBEDDED_POOL_TIMEOUT", "10"))  # seconds to wait for a free slot
+
+# Bumped when load_csvs stores the CSVs differently, so EMBEDDED_DB_DIR files are rebuilt
+_DB_FORMAT_VERSION = 2
+# Column types for the field types of csv_loading; text compares case-insensitively like MySQL
+_SQLITE_TYPES = {"int": "INTEGER", "float": "REAL", "ISODate": "TEXT", "string": "TEXT COLLATE NOCASE"}
+_SHOW_TABLES_PATTERN = re.compile(r"^\s*SHOW\s+(?:FULL\s+)?TABLES\s*;?\s*$", re.IGNORECASE)
+_DESCRIBE_PATTERN = re.compile(r"^\s*(?:DESCRIBE|DESC|SHOW\s+COLUMNS\s+FROM)\s+`?(\w+)`?\s*;?\s*$", re.IGNORECASE)
+_DATE_ARITHMETIC_PATTERN = re.compile(r"\b(DATE_ADD|DATE_SUB|ADDDATE|SUBDATE)\s*\(", re.IGNORECASE)
+_INTERVAL_ARGUMENT_PATTERN = re.compile(r"^\s*INTERVAL\s+(.+?)\s+(\w+)\s*$", re.IGNORECASE | re.DOTALL)
+# "<operand> + INTERVAL n unit" with a column, string or argument-less call as the operand
+_INTERVAL_OPERATOR_PATTERN = re.compile(
+    r"(\w+\(\s*\)|'[^']*'|[\w.]+)\s*([-+])\s*INTERVAL\s+([-+]?\d+(?:\.\d+)?|'[^']*')\s+(\w+)\b",
+    re.IGNORECASE,
+)
+_INTERVAL_UNITS = {
+    "SECOND": ("seconds", 1), "MINUTE": ("minutes", 1), "HOUR": ("hours", 1), "DAY": ("days", 1),
+    "WEEK": ("days", 7), "MONTH": ("months", 1), "QUARTER": ("months", 3), "YEAR": ("months", 12),
+}
+# strftime equivalents of MySQL DATE_FORMAT specifiers
+_DATE_FORMAT_CODES = {
+    "Y": "%Y", "y": "%y", "m": "%m", "c": "{month}", "d": "%d", "e": "{day}", "H": "%H", "k": "{hour}",
+    "i": "%M", "s": "%S", "S": "%S", "p": "%p", "M": "%B", "b": "%b", "W": "%A", "a": "%a", "j": "%j",
+    "T": "%H:%M:%S", "%": "%%",
+}
+
+
+def _to_datetime(value) -> Optional[datetime.datetime]:
+    """A DATE/DATETIME value as stored in the CSVs (ISO text), or None like MySQL for anything else."""
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def _date_part(part):
+    def extract(value):
+        moment = _to_datetime(value)
+        return None if moment is None else part(moment)
+    return extract
+
+
+def _concat(*values):
+    # MySQL: NULL if any argument is NULL
+    if any(value is None for value in values):
+        return None
+    return "".join(_text(value) for value in values)
+
+
+def _concat_ws(separator, *values):
+    if separator is None:
+        return None
+    return separator.join(_text(value) for value in values if value is not None)
+
+
+def _text(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else str(value)
+    return str(value)
+
+
+def _date_format(value, fmt):
+    moment = _to_datetime(value)
+    if moment is None or fmt is None:
+        return None
+    pattern = re.sub(r"%(.)", lambda m: _DATE_FORMAT_CODES.get(m.group(1), m.group(1)), fmt)
+    return moment.strftime(pattern).format(month=moment.month, day=moment.day, hour=moment.hour)
+
+
+def _datediff(first, second):
+    a, b = _to_datetime(first), _to_datetime(second)
+    return None if a is None or b is None else (a.date() - b.date()).days
+
+
+def _date_add(value, amount, unit="DAY", sign=1):
+    """MySQL DATE_ADD: a date stays a date for whole days, months clamp to their last day."""
+    moment = _to_datetime(value)
+    if moment is None or amount is None or unit is None or str(unit).upper() not in _INTERVAL_UNITS:
+        return None
+    field, factor = _INTERVAL_UNITS[str(unit).upper()]
+    amount = sign * float(amount) * factor
+    if field == "months":
+        months = moment.year * 12 + moment.month - 1 + int(amount)
+        year, month = divmod(months, 12)
+        moment = moment.replace(year=year, month=month + 1, day=min(moment.day, calendar.monthrange(year, month + 1)[1]))
+    else:
+        moment += datetime.timedelta(**{field: amount})
+    if field in ("days", "months") and len(str(value).strip()) == 10:
+        return moment.date().isoformat()
+    return moment.isoformat(sep=" ")
+
+
+def _truncate(number, digits):
+    if number is None or digits is None:
+        return None
+    factor = 10 ** int(digits)
+    return int(number * factor) / factor
+
+
+# MySQL functions missing from SQLite: name -> (argument count, -1 = any, implementation)
+MYSQL_FUNCTIONS = {
+    "YEAR": (1, _date_part(lambda d: d.year)),
+    "MONTH": (1, _date_part(lambda d: d.month)),
+    "DAY": (1, _date_part(lambda d: d.day)),
+    "DAYOFMONTH": (1, _date_part(lambda d: d.day)),
+    "QUARTER": (1, _date_part(lambda d: (d.month - 1) // 3 + 1)),
+    "HOUR": (1, _date_part(lambda d: d.hour)),
+    "MINUTE": (1, _date_part(lambda d: d.minute)),
+    "DAYOFWEEK": (1, _date_part(lambda d: d.isoweekday() % 7 + 1)),
+    "MONTHNAME": (1, _date_part(lambda d: d.strftime("%B"))),
+    "DAYNAME": (1, _date_part(lambda d: d.strftime("%A"))),
+    "NOW": (0, lambda: datetime.datetime.now().isoformat(sep=" ", timespec="seconds")),
+    "CURDATE": (0, lambda: datetime.date.today().isoformat()),
+    "DATE_FORMAT": (2, _date_format),
+    "DATEDIFF": (2, _datediff),
+    "DATE_ADD": (-1, _date_add),
+    "ADDDATE": (-1, _date_add),
+    "DATE_SUB": (-1, lambda value, amount, unit="DAY": _date_add(value, amount, unit, sign=-1)),
+    "SUBDATE": (-1, lambda value, amount, unit="DAY": _date_add(value, amount, unit, sign=-1)),
+    "CONCAT": (-1, _concat),
+    "CONCAT_WS": (-1, _concat_ws),
+    "IF": (3, lambda condition, then, otherwise: then if condition else otherwise),
+    "LCASE": (1, lambda value: None if value is None else str(value).lower()),
+    "UCASE": (1, lambda value: None if value is None else str(value).upper()),
+    "TRUNCATE": (2, _truncate),
+}
+
+
+def register_mysql_functions(conn: sqlite3.Connection):
+    for name, (arguments, function) in MYSQL_FUNCTIONS.items():
+        conn.create_function(name, arguments, function, deterministic=name not in ("NOW", "CURDATE"))
+
+
+def _arguments(sql: str, start: int) -> tuple:
+    """Top-level arguments of the call whose "(" is at ``start``, and the index of its ")"."""
+    arguments, depth, quote, begin = [], 0, None, start + 1
+    for i in range(start, len(sql)):
+        char = sql[i]
+        if quote:
+            quote = None if char == quote else quote
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                arguments.append(sql[begin:i])
+                return arguments, i
+        elif char == "," and depth == 1:
+            arguments.append(sql[begin:i])
+            begin = i + 1
+    raise ValueError("unbalanced parentheses")
+
+
+def translate_intervals(sql: str) -> str:
+    """Turn MySQL's INTERVAL syntax into calls of the DATE_ADD / DATE_SUB shims.
+
+    ``DATE_ADD(x, INTERVAL n unit)`` becomes ``DATE_ADD(x, n, 'unit')`` and
+    ``x - INTERVAL n unit`` becomes ``DATE_SUB(x, n, 'unit')``; any other use
+    of INTERVAL is refused.
+    """
+    if "interval" not in sql.lower():
+        return sql
+    # Right to left, so nested calls are rewritten before the call around them
+    for match in reversed(list(_DATE_ARITHMETIC_PATTERN.finditer(sql))):
+        arguments, end = _arguments(sql, match.end() - 1)
+        interval = _INTERVAL_ARGUMENT_PATTERN.match(arguments[-1]) if len(arguments) == 2 else None
+        if interval:
+            sql = f"{sql[:match.end()]}{arguments[0]}, {interval.group(1)}, '{interval.group(2).upper()}'{sql[end:]}"
+    sql = _INTERVAL_OPERATOR_PATTERN.sub(
+        lambda m: f"{'DATE_ADD' if m.group(2) == '+' else 'DATE_SUB'}({m.group(1)}, {m.group(3)}, '{m.group(4).upper()}')",
+        sql,
+    )
+    if re.search(r"\bINTERVAL\b", re.sub(r"'[^']*'", "''", sql), re.IGNORECASE):
+        raise ValueError("this use of INTERVAL is not supported on the embedded SQL backend")
+    return sql
+
+
+def translate(sql: str, schema_name: str) -> str:
+    """MySQL syntax SQLite lacks (SHOW TABLES, DESCRIBE, INTERVAL arithmetic) as SQLite queries."""
+    if _SHOW_TABLES_PATTERN.match(sql):
+        return f"SELECT name AS Tables_in_{schema_name} FROM {schema_name}.sqlite_master WHERE type = 'table' ORDER BY name"
+    match = _DESCRIBE_PATTERN.match(sql)
+    if match:
+        return (
+            'SELECT name AS Field, type AS Type, CASE WHEN "notnull" THEN \'NO\' ELSE \'YES\' END AS "Null", '
+            f"CASE WHEN pk THEN 'PRI' ELSE '' END AS \"Key\" FROM pragma_table_info('{match.group(1).lower()}', '{schema_name}')"
+        )
+    return translate_intervals(sql)
+
+
+def csv_folder(schema_name: str, data_path: str = None) -> str:
+    return os.path.join(data_path or EMBEDDED_DATA_PATH, f"{schema_name}_csv")
+
+
+def load_csvs(conn: sqlite3.Connection, folder: str, schema: str = "main") -> list:
+    """Create one table per CSV in ``folder`` (named after the file, lower case); returns the table names.
+
+    Columns are typed and converted like write_sql.py loads them into MySQL
+    (types from schemas.py, "$" and thousands separators stripped from
+    numbers); text columns compare case-insensitively, like MySQL's default
+    collation.
+    """
+    specs = table_specs(os.path.basename(os.path.normpath(folder)).replace("_csv", ""))
+    tables = []
+    for file_name in sorted(os.listdir(folder)):
+        if not file_name.endswith(".csv"):
+            continue
+        frame = pd.read_csv(os.path.join(folder, file_name), dtype=str)
+        frame.columns = [column.strip() for column in frame.columns]
+        table = table_name(file_name)
+        types = column_types(frame, specs.get(table, {}))
+        columns = ", ".join(f'"{column}" {_SQLITE_TYPES.get(field_type, "TEXT")}' for column, field_type in types.items())
+        conn.execute(f'CREATE TABLE {schema}."{table}" ({columns})')
+        rows, _ = convert_chunk(frame, types, date_format=None)
+        conn.executemany(f'INSERT INTO {schema}."{table}" VALUES ({", ".join("?" * len(types))})', rows)
+        tables.append(table)
+    conn.execute(f"PRAGMA {schema}.user_version = {_DB_FORMAT_VERSION}")
+    conn.commit()
+    return tables
+
+
+def _format_version(path: str) -> int:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+# In-memory databases live as long as one connection to them stays open
+_memory_databases = {}
+_build_lock = threading.Lock()
+
+
+def database_uri(schema_name: str, data_path: str = None, db_dir: str = None) -> str:
+    """SQLite URI of a schema's database, building it from the CSVs on first use.
+
+    With ``db_dir`` (EMBEDDED_DB_DIR) the database is a file there, rebuilt
+    when a CSV is newer than it; otherwise it is a shared in-memory database.
+    """
+    folder = csv_folder(schema_name, data_path)
+    db_dir = EMBEDDED_DB_DIR if db_dir is None else db_dir
+    with _build_lock:
+        if not db_dir:
+            uri = f"file:embedded_{schema_name}?mode=memory&cache=shared"
+            if uri not in _memory_databases:
+                keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                load_csvs(keeper, folder)
+                _memory_databases[uri] = keeper
+            return uri
+
+        path = os.path.join(db_dir, f"{schema_name}.sqlite")
+        newest_csv = max(
+            (os.path.getmtime(os.path.join(folder, name)) for name in os.listdir(folder) if name.endswith(".csv")),
+            default=0,
+        )
+        if not os.path.exists(path) or os.path.getmtime(path) < newest_csv or _format_version(path) != _DB_FORMAT_VERSION:
+            os.makedirs(db_dir, exist_ok=True)
+            # Build next to the target and swap it in, so readers never see a partial file
+            fd, temp_path = tempfile.mkstemp(suffix=".sqlite", dir=db_dir)
+            os.close(fd)
+            conn = sqlite3.connect(temp_path)
+            try:
+                load_csvs(conn, folder)
+            finally:
+                conn.close()
+            os.replace(temp_path, path)
+            print(f"✅ Built {path} from {folder}")
+        return f"file:{path}?mode=ro"
+
+
+class EmbeddedPool:
+    """Read-only SQLite connections to one schema, with the interface of connections.MySQLPool.
+
+    Each connection attaches the schema's database under the schema name, so
+    both ``customers`` and ``bike_store.customers`` resolve, and has the
+    MySQL function shims registered.
+    """
+
+    def __init__(self, schema_name: str, max_size: int = EMBEDDED_POOL_SIZE, timeout: float = EMBEDDED_POOL_TIMEOUT):
+        self.database = schema_name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.uri = database_uri(schema_name)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []
+        self._in_use = 0
+        self._metrics = {"checkouts": 0, "created": 0, "timeouts": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(":memory:", uri=True, check_same_thread=False)
+        conn.execute("ATTACH DATABASE ? AS " + self.database, (self.uri,))
+        conn.execute("PRAGMA query_only = ON")
+        register_mysql_functions(conn)
+        with self._lock:
+            self._metrics["created"] += 1
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._metrics["timeouts"] += 1
+            raise PoolTimeout(f"No free connection for {self.database} after {self.timeout}s")
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            conn = conn or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+            self._metrics["checkouts"] += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        conn.set_progress_handler(None, 0)  # drop the time budget of the last statement
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                conn.close()
+            else:
+                self._idle.append(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self._metrics,
+                "backend": "sqlite",
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_size": self.max_size,
+            }
+
+
+_embedded_pools = {}
+_embedded_pools_lock = threading.Lock()
+
+
+def get_embedded_pool(schema_name: str) -> EmbeddedPool:
+    with _embedded_pools_lock:
+        pool = _embedded_pools.get(schema_name)
+        if pool is None:
+            pool = EmbeddedPool(schema_name)
+            _embedded_pools[schema_name] = pool
+        return pool
+
+
+def embedded_pool_metrics() -> dict:
+    with _embedded_pools_lock:
+        pools = dict(_embedded_pools)
+    return {name: pool.metrics() for name, pool in pools.items()}
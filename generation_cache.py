@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Cache limits (override with environment variables)
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "512"))  # entries kept in memory
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "86400"))  # seconds, 0 = never expire
+GENERATION_CACHE_PATH = os.getenv("GENERATION_CACHE_PATH", "")  # SQLite file, empty = memory only
+GENERATION_CACHE_DISK_SIZE = int(os.getenv("GENERATION_CACHE_DISK_SIZE", "10000"))  # rows kept on disk
+
+# Dataset mentions, with an optional leading preposition ("from Bike Store", "in the FIFA db")
+_DATASET_PATTERN = re.compile(
+    r"\b(?:(?:in|from|of|for|on|using)\s+)?(?:the\s+)?"
+    r"(?:bike\s*store|adventure\s*works|fifa)"
+    r"(?:\s+(?:database|dataset|data|db))?\b",
+    re.IGNORECASE,
+)
+# Punctuation that never changes the meaning of a question. Comparison and
+# arithmetic symbols are kept so "price > 500" and "price < 500" stay distinct.
+_PUNCTUATION_PATTERN = re.compile(r"[?!,;:\"'`()\[\]{}]|\.(?!\d)")
+
+
+def normalize_question(question: str) -> str:
+    text = question.lower()
+    text = _DATASET_PATTERN.sub(" ", text)
+    text = _PUNCTUATION_PATTERN.sub(" ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(question: str, database: str, query_type: str, template_hash: str) -> str:
+    raw = json.dumps([database, query_type, template_hash, normalize_question(question)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """LRU/TTL cache of generated queries with an optional SQLite backing file."""
+
+    def __init__(
+        self,
+        max_entries: int = GENERATION_CACHE_SIZE,
+        ttl: float = GENERATION_CACHE_TTL,
+        path: Optional[str] = None,
+        max_disk_entries: int = GENERATION_CACHE_DISK_SIZE,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (query, stored_at)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "disk_hits": 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generation_cache ("
+                "key TEXT PRIMARY KEY, query TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def _remember(self, key: str, query: str, stored_at: float):
+        self._entries[key] = (query, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                query, stored_at = entry
+                if not self._expired(stored_at, now):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return query
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT query, stored_at FROM generation_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and not self._expired(row[1], now):
+                    self._db.execute(
+                        "UPDATE generation_cache SET last_used = ? WHERE key = ?", (now, key)
+                    )
+                    self._db.commit()
+                    self._remember(key, row[0], row[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, query: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, query, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO generation_cache VALUES (?, ?, ?, ?)",
+                    (key, query, now, now),
+                )
+                if self.ttl > 0:
+                    self._db.execute(
+                        "DELETE FROM generation_cache WHERE stored_at < ?", (now - self.ttl,)
+                    )
+                self._db.execute(
+                    "DELETE FROM generation_cache WHERE key NOT IN ("
+                    "SELECT key FROM generation_cache ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_disk_entries,),
+                )
+                self._db.commit()
+
+    def preload(self, limit: Optional[int] = None) -> int:
+        """Load the most recently used rows of the backing file into memory; returns how many."""
+        if self._db is None:
+            return 0
+        limit = self.max_entries if limit is None else min(limit, self.max_entries)
+        cutoff = time.time() - self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, query, stored_at FROM generation_cache "
+                "WHERE stored_at >= ? ORDER BY last_used DESC LIMIT ?",
+                (cutoff, limit),
+            ).fetchall()
+            # Oldest first, so the most recently used rows end up last in the LRU
+            for key, query, stored_at in reversed(rows):
+                if key not in self._entries:
+                    self._remember(key, query, stored_at)
+            return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM generation_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+_generation_cache = None
+_generation_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    global _generation_cache
+    with _generation_cache_lock:
+        if _generation_cache is None:
+            _generation_cache = GenerationCache(path=GENERATION_CACHE_PATH or None)
+        return _generation_cache
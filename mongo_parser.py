@@ -0,0 +1,275 @@
+import json
+import re
+from typing import NamedTuple, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from bson.regex import Regex
+
+
+class MongoSyntaxError(ValueError):
+    pass
+
+
+class MongoCall(NamedTuple):
+    name: str
+    args: list
+
+
+class MongoCommand(NamedTuple):
+    """Parsed ``db.<collection>.<method>(args).<chain>(args)...`` query.
+
+    ``collection`` is None for database-level calls such as
+    ``db.getCollectionNames()``.
+    """
+
+    collection: Optional[str]
+    method: str
+    args: list
+    chain: list
+
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_IDENT = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+_NUMBER = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_STRINGS = {
+    '"': re.compile(r'"((?:[^"\\]|\\.)*)"', re.DOTALL),
+    "'": re.compile(r"'((?:[^'\\]|\\.)*)'", re.DOTALL),
+}
+_ESCAPE = re.compile(r"\\(u[0-9a-fA-F]{4}|.)", re.DOTALL)
+_IDENT_START = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_$")
+_NUMBER_START = set("0123456789+-.")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "v": "\v", "0": "\0"}
+_CONSTANTS = {"true": True, "false": False, "null": None, "undefined": None}
+_SPACES = set(" \t\r\n")
+_JSON_START = set('{["-0123456789')
+
+
+def _reject_constant(name: str):
+    raise ValueError(name)
+
+
+# Plain JSON values (the usual shape of generated queries) are read by the C scanner
+_JSON = json.JSONDecoder(parse_constant=_reject_constant)
+
+
+def _unescape(match) -> str:
+    escaped = match.group(1)
+    if len(escaped) == 5:
+        return chr(int(escaped[1:], 16))
+    return _ESCAPES.get(escaped, escaped)
+
+
+class _Parser:
+    """Single left-to-right pass over a shell query; values become Python objects."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.end = len(text)
+
+    def error(self, message: str):
+        raise MongoSyntaxError(f"{message} at position {self.pos}")
+
+    def skip_ws(self):
+        if self.pos < self.end and self.text[self.pos] in _SPACES:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+
+    def peek(self) -> str:
+        self.skip_ws()
+        return self.text[self.pos] if self.pos < self.end else ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            self.error(f"Expected '{char}'")
+        self.pos += 1
+
+    def ident(self) -> str:
+        self.skip_ws()
+        match = _IDENT.match(self.text, self.pos)
+        if match is None:
+            self.error("Expected a name")
+        self.pos = match.end()
+        return match.group(0)
+
+    def call_args(self) -> list:
+        self.expect("(")
+        args = []
+        if self.peek() == ")":
+            self.pos += 1
+            return args
+        while True:
+            args.append(self.value())
+            char = self.peek()
+            self.pos += 1
+            if char == ")":
+                return args
+            if char != ",":
+                self.pos -= 1
+                self.error("Expected ',' or ')'")
+
+    def command(self) -> MongoCommand:
+        if self.ident() != "db":
+            self.error("Query must start with 'db.'")
+        self.expect(".")
+        name = self.ident()
+
+        if self.peek() == "(":
+            args = self.call_args()
+            if name != "getCollection":
+                return MongoCommand(None, name, args, self.chain())
+            if len(args) != 1 or not isinstance(args[0], str):
+                self.error("getCollection() takes a collection name")
+            collection = args[0]
+        else:
+            collection = name
+
+        self.expect(".")
+        method = self.ident()
+        args = self.call_args()
+        return MongoCommand(collection, method, args, self.chain())
+
+    def chain(self) -> list:
+        calls = []
+        while self.peek() == ".":
+            self.pos += 1
+            name = self.ident()
+            calls.append(MongoCall(name, self.call_args()))
+        if self.peek() == ";":
+            self.pos += 1
+        if self.peek():
+            self.error("Unexpected trailing text")
+        return calls
+
+    def value(self):
+        char = self.peek()
+        if char in _JSON_START:
+            try:
+                value, self.pos = _JSON.raw_decode(self.text, self.pos)
+                return value
+            except ValueError:
+                pass  # shell syntax (unquoted keys, regexes, constructors, ...)
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char == '"' or char == "'":
+            return self.string()
+        if char == "/":
+            return self.regex()
+        if char in _NUMBER_START:
+            return self.number()
+        if char in _IDENT_START:
+            return self.constructor()
+        self.error("Expected a value")
+
+    def object(self) -> dict:
+        self.pos += 1
+        result = {}
+        if self.peek() == "}":
+            self.pos += 1
+            return result
+        while True:
+            char = self.peek()
+            key = self.string() if char == '"' or char == "'" else self.ident()
+            self.expect(":")
+            result[key] = self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ",":
+                if self.peek() == "}":  # trailing comma
+                    self.pos += 1
+                    return result
+                continue
+            if char == "}":
+                return result
+            self.pos -= 1
+            self.error("Expected ',' or '}'")
+
+    def array(self) -> list:
+        self.pos += 1
+        result = []
+        if self.peek() == "]":
+            self.pos += 1
+            return result
+        while True:
+            result.append(self.value())
+            char = self.peek()
+            self.pos += 1
+            if char == ",":
+                if self.peek() == "]":  # trailing comma
+                    self.pos += 1
+                    return result
+                continue
+            if char == "]":
+                return result
+            self.pos -= 1
+            self.error("Expected ',' or ']'")
+
+    def string(self) -> str:
+        match = _STRINGS[self.text[self.pos]].match(self.text, self.pos)
+        if match is None:
+            self.error("Unterminated string")
+        self.pos = match.end()
+        raw = match.group(1)
+        return _ESCAPE.sub(_unescape, raw) if "\\" in raw else raw
+
+    def regex(self) -> Regex:
+        text = self.text
+        pos = self.pos + 1
+        while pos < self.end and text[pos] != "/":
+            pos += 2 if text[pos] == "\\" else 1
+        if pos >= self.end:
+            self.error("Unterminated regular expression")
+        pattern = text[self.pos + 1 : pos]
+        pos += 1
+        flags_start = pos
+        while pos < self.end and text[pos].isalpha():
+            pos += 1
+        self.pos = pos
+        return Regex(pattern, text[flags_start:pos])
+
+    def number(self):
+        match = _NUMBER.match(self.text, self.pos)
+        if match is None:
+            self.error("Invalid number")
+        self.pos = match.end()
+        raw = match.group(0)
+        if "." in raw or "e" in raw or "E" in raw:
+            return float(raw)
+        return int(raw)
+
+    def constructor(self):
+        name = self.ident()
+        if name in _CONSTANTS:
+            return _CONSTANTS[name]
+        if name == "new":
+            name = self.ident()
+        args = self.call_args()
+        if name == "ObjectId":
+            if not args:
+                return ObjectId()
+            if len(args) != 1 or not isinstance(args[0], str):
+                self.error("ObjectId() takes a hex string")
+            try:
+                return ObjectId(args[0])
+            except InvalidId:
+                self.error(f"Invalid ObjectId '{args[0]}'")
+        if name in ("ISODate", "Date"):
+            # Dates are stored as ISO 8601 strings in these datasets
+            if len(args) != 1 or not isinstance(args[0], str):
+                self.error(f"{name}() takes a date string")
+            return args[0]
+        if name in ("NumberInt", "NumberLong", "NumberDecimal"):
+            if len(args) != 1 or isinstance(args[0], bool) or not isinstance(args[0], (int, float, str)):
+                self.error(f"{name}() takes a number")
+            try:
+                return float(args[0]) if name == "NumberDecimal" else int(args[0])
+            except ValueError:
+                self.error(f"{name}() takes a number")
+        self.error(f"Unsupported constructor '{name}'")
+
+
+def parse_mongo_query(query: str) -> MongoCommand:
+    """Parse a MongoDB shell query into a MongoCommand in one pass."""
+    return _Parser(query).command()
@@ -0,0 +1,195 @@
+import re
+import threading
+
+from generation_cache import normalize_question
+
+# Few-shot examples sent per prompt
+MAX_EXAMPLES = 3
+
+_WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+_SQL_TABLE_PATTERN = re.compile(r"(?m)^(?=Table: )")
+_MONGO_COLLECTION_PATTERN = re.compile(r"(?ms)^- (\w+): \{.*?^\}\n?")
+_KEY_LINE_PATTERN = re.compile(r"^- (\w+)\.\w+(?:\s*→\s*(\w+)\.\w+)?")
+_LINK_PATTERN = re.compile(r"(?m)^- (\w+)\.\w+\s*→\s*(\w+)\.\w+")
+_SQL_FK_PATTERN = re.compile(r"\(FK → (\w+)\.\w+\)")
+# Wording that asks for data from related tables ("with their ...")
+_JOIN_PATTERN = re.compile(r"\b(join|joined|along with|together with|with (?:their|its|the)|and (?:their|its))\b", re.IGNORECASE)
+_PROPER_NOUN_PATTERN = re.compile(r"(?<=\w )([A-Z][a-z]+)")
+_STOP_WORDS = {
+    "a", "all", "an", "and", "are", "by", "each", "find", "for", "from", "get",
+    "in", "is", "list", "me", "of", "on", "or", "per", "show", "that", "the",
+    "their", "to", "what", "which", "who", "with",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size: words and punctuation marks each count as one token."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("es") and word[:-2].endswith(("ch", "sh", "ss", "x")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> set:
+    words = {w for w in _WORD_PATTERN.findall(text.lower()) if w not in _STOP_WORDS}
+    return words | {_singular(w) for w in words}
+
+
+def schema_fields(schema_text: str, query_type: str) -> dict:
+    """Map each table / collection (lower-cased) to its lower-cased field names."""
+    fields = {}
+    if query_type == "sql":
+        for block in _SQL_TABLE_PATTERN.split(schema_text):
+            if block.startswith("Table: "):
+                name = block.split("\n", 1)[0][len("Table: ") :].strip().lower()
+                fields[name] = set(re.findall(r"(?m)^- (\w+)", block.lower()))
+    else:
+        for match in _MONGO_COLLECTION_PATTERN.finditer(schema_text):
+            fields[match.group(1).lower()] = set(re.findall(r'"([^"]+)":', match.group(0).lower()))
+    return fields
+
+
+def linked_tables(dataset: dict) -> set:
+    """Pairs of tables / collections (lower-cased) joined by a foreign key in either schema."""
+    links = set()
+    for a, b in _LINK_PATTERN.findall(dataset.get("mongodb", "") + "\n" + dataset.get("sql", "")):
+        links.add((a.lower(), b.lower()))
+    for block in _SQL_TABLE_PATTERN.split(dataset.get("sql", "")):
+        if block.startswith("Table: "):
+            name = block.split("\n", 1)[0][len("Table: ") :].strip().lower()
+            links.update((name, target.lower()) for target in _SQL_FK_PATTERN.findall(block))
+    return links
+
+
+def asks_for_join(question: str) -> bool:
+    """Whether the question wants data from related tables ("... with their orders")."""
+    return bool(_JOIN_PATTERN.search(question))
+
+
+def names_entity(question: str) -> bool:
+    """Whether the question names something ("goals of Messi") a referenced table may resolve."""
+    # Capitalized words other than the dataset's name, which normalize_question strips
+    normalized = normalize_question(question).split()
+    return any(noun.lower() in normalized for noun in _PROPER_NOUN_PATTERN.findall(question))
+
+
+def select_tables(question: str, dataset: dict, query_type: str) -> list:
+    """Pick the tables / collections a question is about.
+
+    A table matches on its own name (singular or plural), on one of its field
+    names, or on one of the keywords listed for it in ``schemas.py``; the
+    dataset's name is ignored. Tables one foreign key away from a match are
+    added when the question asks for a join naming a single table, and the
+    tables a match references when it names an entity, so names and ids can
+    be resolved.
+    When nothing matches, every table is returned so the prompt stays
+    complete.
+    """
+    words = _words(normalize_question(question))
+    keywords = {name.lower(): set(kw) for name, kw in dataset.get("keywords", {}).items()}
+    tables = schema_fields(dataset[query_type], query_type)
+
+    matched = set()
+    for name, fields in tables.items():
+        names = {name, _singular(name)} | keywords.get(name, set()) | fields
+        if words & names:
+            matched.add(name)
+    if not matched:
+        return list(tables)
+    wanted = set(matched)
+    # A join whose tables are all named needs nothing more
+    join, named = asks_for_join(question) and len(matched) == 1, names_entity(question)
+    for a, b in linked_tables(dataset) if join or named else ():
+        # a references b
+        if a in matched:
+            wanted.add(b)
+        if b in matched and join:
+            wanted.add(a)
+    return [name for name in tables if name in wanted]
+
+
+def slice_schema(schema_text: str, query_type: str, tables: list) -> str:
+    """Drop the tables / collections (and their key notes) that were not selected."""
+    wanted = {t.lower() for t in tables}
+    if query_type == "sql":
+        blocks = _SQL_TABLE_PATTERN.split(schema_text)
+        kept = [
+            block
+            for block in blocks
+            if not block.startswith("Table: ")
+            or block.split("\n", 1)[0][len("Table: ") :].strip().lower() in wanted
+        ]
+        return "".join(kept)
+
+    def keep_collection(match):
+        return match.group(0) if match.group(1).lower() in wanted else ""
+
+    sliced = _MONGO_COLLECTION_PATTERN.sub(keep_collection, schema_text)
+    lines = []
+    for line in sliced.split("\n"):
+        key = _KEY_LINE_PATTERN.match(line)
+        if key and not all(name.lower() in wanted for name in key.groups() if name):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def select_sections(question: str, cues: dict, tables: list) -> set:
+    """Names of the optional prompt sections whose cue pattern matches the question.
+
+    A cue of None marks a section needed only when several tables are selected.
+    """
+    return {
+        name for name, cue in cues.items()
+        if (cue is None and len(tables) > 1) or (cue is not None and cue.search(question))
+    }
+
+
+def select_examples(question: str, examples: list, database: str, tables: list, limit: int = MAX_EXAMPLES) -> list:
+    """Pick the few-shot examples of ``database`` closest to the question.
+
+    ``examples`` holds ``(database, question, query)`` tuples. Examples score
+    on shared words with the question and on the selected tables they use.
+    """
+    words = _words(question)
+    wanted = {t.lower() for t in tables}
+    scored = []
+    for position, example in enumerate(examples):
+        example_db, example_question, example_query = example
+        if example_db != database:
+            continue
+        used = _words(example_query) & wanted
+        score = len(words & _words(example_question)) + 2 * len(used)
+        if score:
+            scored.append((-score, position, example))
+    scored.sort()
+    return [example for _, _, example in scored[:limit]]
+
+
+_token_lock = threading.Lock()
+_token_stats = {"prompts": 0, "full_tokens": 0, "sent_tokens": 0, "last_full": 0, "last_sent": 0}
+
+
+def record_prompt_tokens(full_tokens: int, sent_tokens: int):
+    with _token_lock:
+        _token_stats["prompts"] += 1
+        _token_stats["full_tokens"] += full_tokens
+        _token_stats["sent_tokens"] += sent_tokens
+        _token_stats["last_full"] = full_tokens
+        _token_stats["last_sent"] = sent_tokens
+
+
+def prompt_token_stats() -> dict:
+    with _token_lock:
+        full = _token_stats["full_tokens"]
+        return {
+            **_token_stats,
+            "saved_pct": round(100.0 * (full - _token_stats["sent_tokens"]) / full, 1) if full else 0.0,
+        }
@@ -0,0 +1,544 @@
+import hashlib
+import re
+import textwrap
+import threading
+
+from prompt_selector import (
+    estimate_tokens,
+    record_prompt_tokens,
+    select_examples,
+    select_sections,
+    select_tables,
+    slice_schema,
+)
+from schemas import schemas as default_schemas
+
+db_map = {
+    "Bike Store": "bike_store",
+    "AdventureWorks": "adventure_works",
+    "FIFA": "fifa",
+}
+
+# Sliced prompt variants remembered per template
+MAX_SLICES = 256
+
+# Stands in for the user question while a template is compiled
+_QUESTION_MARKER = "\x00QUESTION\x00"
+
+SQL_INSTRUCTIONS_HEAD = """
+  - **SQL Queries**:
+  - Use unqualified table names (e.g., products, NOT adventure_works.products).
+  - Do NOT use `USE` or schema qualifiers (e.g., adventure_works, bike_store).
+  - Support SELECT, INSERT, UPDATE, DELETE, JOIN, GROUP BY, HAVING, etc.
+  - Use JOINs only for explicitly listed tables (e.g., customers, orders, products).
+  - Default to key fields (e.g., product_name, list_price for products).
+
+  - Bike Store uses MySQL. Handle date filters using MySQL functions and the 'YYYY-MM-DD' format (e.g., '2016-01-13').
+    - For year: 'in 2021' → YEAR(order_date) = 2021
+    - For month: 'in May' → MONTH(order_date) = 5
+    - For specific date: 'on 2016-01-13' → order_date = '2016-01-13'
+    - For date range: 'between 2016-01-01 and 2016-12-31' → order_date BETWEEN '2016-01-01' AND '2016-12-31'
+  - Use CONCAT(first_name, ' ', last_name) for name concatenation to ensure compatibility across SQL databases and not ||.
+  - Synonyms:
+"""
+
+# Synonym line for each dataset
+SQL_SYNONYMS = {
+    "Bike Store": "    - Bike Store: 'price' → list_price, 'name' → product_name, 'customer' → first_name + last_name",
+    "AdventureWorks": "    - AdventureWorks: 'cost' → StandardCost, 'name' → Product, 'sales amount' → Sales, 'products' → Product ",
+    "FIFA": "    - FIFA: 'name' → player_name, 'score' → minute",
+}
+
+SQL_INSTRUCTIONS_MID = """\
+  - Do NOT reference brands or categories in Bike Store (they don’t exist).
+  - If the query references a table or column not in the schema (e.g., 'reseller' in AdventureWorks), return "".
+  - Return "" for invalid requests.
+  - No code block markers (```sql, ```).
+  - For joins, explicity mention the table the column select belongs to, to remove ambiguity for eg: AdventureWorks: "List product sales" →
+      SELECT product.Product, sales.Sales
+      FROM product
+      JOIN sales ON product.ProductKey = sales.ProductKey
+  - Examples:
+"""
+
+# Few-shot examples: (database, question, expected query)
+SQL_EXAMPLES = [
+    (
+        "Bike Store",
+        "List products",
+        """\
+SELECT product_name, brand_id, category_id
+FROM products
+""",
+    ),
+    (
+        "Bike Store",
+        "List customers",
+        """\
+SELECT CONCAT(first_name, ' ', last_name) AS customer_name
+FROM customers
+""",
+    ),
+    (
+        "Bike Store",
+        "Add a new customer named John Doe in California",
+        """\
+INSERT INTO customers (first_name, last_name, state)
+VALUES ('John', 'Doe', 'California')
+""",
+    ),
+    (
+        "Bike Store",
+        "Update John Doe's city to Los Angeles",
+        """\
+UPDATE customers
+SET city = 'Los Angeles'
+WHERE first_name = 'John' AND last_name = 'Doe'
+""",
+    ),
+    (
+        "Bike Store",
+        "Delete the customer named John Doe",
+        """\
+DELETE FROM customers
+WHERE first_name = 'John' AND last_name = 'Doe'
+""",
+    ),
+    (
+        "Bike Store",
+        "Find customers in New York who placed orders in 2021",
+        """\
+SELECT CONCAT(first_name, ' ', last_name) AS customer_name, orders.order_date
+FROM customers
+JOIN orders ON customers.customer_id = orders.customer_id
+WHERE customers.state = 'New York'
+AND YEAR(orders.order_date) = 2021
+""",
+    ),
+    (
+        "Bike Store",
+        "List orders with their product names",
+        """\
+SELECT orders.order_id, products.product_name
+FROM orders
+JOIN products ON orders.product_id = products.product_id
+""",
+    ),
+    (
+        "Bike Store",
+        "Count orders per customer",
+        """\
+SELECT CONCAT(customers.first_name, ' ', customers.last_name) AS customer_name, COUNT(orders.order_id) AS order_count
+FROM customers
+JOIN orders ON customers.customer_id = orders.customer_id
+GROUP BY customers.customer_id, customers.first_name, customers.last_name
+""",
+    ),
+    (
+        "Bike Store",
+        "Find customers who placed orders in May 2016",
+        """\
+SELECT CONCAT(customers.first_name, ' ', customers.last_name) AS customer_name
+FROM customers
+JOIN orders ON customers.customer_id = orders.customer_id
+WHERE MONTH(orders.order_date) = 5
+AND YEAR(orders.order_date) = 2016
+""",
+    ),
+    (
+        "Bike Store",
+        "Find orders placed on 2016-01-13",
+        """\
+SELECT order_id, customer_id, order_date
+FROM orders
+WHERE order_date = '2016-01-13'
+""",
+    ),
+    (
+        "Bike Store",
+        "Find customers who placed more than 3 orders",
+        """\
+SELECT CONCAT(customers.first_name, ' ', customers.last_name) AS customer_name, COUNT(orders.order_id) AS order_count
+FROM customers
+JOIN orders ON customers.customer_id = orders.customer_id
+GROUP BY customers.customer_id, customers.first_name, customers.last_name
+HAVING COUNT(orders.order_id) > 3
+""",
+    ),
+    (
+        "AdventureWorks",
+        "List product sales",
+        """\
+SELECT product.Product, sales.Sales
+FROM product
+JOIN sales ON product.ProductKey = sales.ProductKey
+""",
+    ),
+    (
+        "AdventureWorks",
+        "Calculate the total sales for Rear Brakes and HL Crankset",
+        """\
+SELECT SUM(sales.Sales) AS TotalSales
+FROM product
+JOIN sales ON product.ProductKey = sales.ProductKey
+WHERE product.Product IN ('Rear Brakes', 'HL Crankset')
+""",
+    ),
+    (
+        "AdventureWorks",
+        "List resellers",
+        """\
+""
+""",
+    ),
+    (
+        "FIFA",
+        "List players who scored",
+        """\
+SELECT players.player_name, goals.minute
+FROM players
+JOIN goals ON players.player_id = goals.player_id
+""",
+    ),
+]
+
+MONGO_INSTRUCTIONS_HEAD = """
+🚫 STRICT CONSTRAINTS:
+- Use only the exact collection names provided in the schema. Do NOT pluralize, rename, guess, or hallucinate table names (e.g., use "orders" not "sales"; use "products" not "product").
+- Do NOT make assumptions about foreign keys or implicit relationships unless they are explicitly defined in the schema.
+- Always verify that every field used in the query exists in the corresponding collection schema.
+- If the field or collection is not found, return an empty string "".
+- Field names and collection names are **case-sensitive** and must match exactly.
+
+
+✅ MONGODB SYNTAX RULES:
+- Always use db.<collection> format.
+- Enclose all field names and string values in double quotes ("").
+- Return only plain MongoDB shell-style queries (no markdown, no comments, no explanations).
+- All output must have balanced braces and valid syntax.
+
+✅ SUPPORTED OPERATIONS:
+
+"""
+
+# Operation sections, in prompt order: (name, text). Numbered when rendered.
+MONGO_OPERATIONS = [
+    ("find", """\
+🔎 Basic Retrieval (find()):
+- Return all fields → db.collection.find({}, {})
+- Return specific fields → db.collection.find({}, { "field1": 1, "field2": 1, "_id": 0 })
+"""),
+    ("filter", """\
+🎯 Filtering (WHERE):
+- Equality: "field": "value"
+- Comparison: { "$gt": value }, { "$lt": value }, { "$gte": value }, { "$lte": value }
+"""),
+    ("dates", """\
+- Date filtering:
+  - Use full ISO 8601 datetime string format: "YYYY-MM-DDT00:00:00"
+  - "in 1954" → "date_field": { "$gte": "1954-01-01T00:00:00", "$lt": "1955-01-01T00:00:00" }
+  - "after Jan 1, 2019" → "date_field": { "$gt": "2019-01-01T00:00:00" }
+  - Do not use ISODate() unless schema explicitly defines it.
+"""),
+    ("aggregate", """\
+📊 Aggregation (aggregate):
+- Use stages: $match, $group, $sum, $count, $project, $sort, $limit, $skip
+- Always include _id in $group: e.g., { "_id": "$model_year" }
+- Example: db.collection.aggregate([{ "$group": { "_id": "$model_year", "total": { "$sum": "$list_price" } } }])
+"""),
+    ("lookup", """\
+🔁 Joins using $lookup:
+- Use $lookup **only** if fields from multiple collections are required to answer the query.
+- Before using $lookup, check if all requested fields are available in a single collection.
+- Do NOT use $lookup when all required fields are present in the current collection.
+- Use $unwind after $lookup if accessing nested fields.
+- Example:
+  {
+    "$lookup": {
+      "from": "orders",
+      "localField": "customer_id",
+      "foreignField": "customer_id",
+      "as": "orders"
+    }
+  }
+"""),
+    ("sort", """\
+🧾 Sorting and Pagination:
+- Sort by field → .sort({ "field": 1 }) for ascending, -1 for descending
+- Limit results → .limit(n)
+- Skip results → .skip(n)
+"""),
+    ("write", """\
+✍️ Data Modification:
+- Insert:
+  - db.collection.insertOne({ ... }) — required fields must exist in schema
+  - db.collection.insertMany([{ ... }, { ... }])
+- Update:
+  - db.collection.updateOne({ filter }, { "$set": { field: value } })
+  - db.collection.updateMany(...) for multiple documents
+- Delete:
+  - db.collection.deleteOne({ filter })
+  - db.collection.deleteMany(...) for multiple deletions
+- Return shell-like response (acknowledged, matchedCount, etc.)
+"""),
+    ("explore", """\
+✅ SCHEMA EXPLORATION:
+- If the user asks "What collections exist?" → return: db.getCollectionNames()
+- If the user asks for sample data, example records, or a preview from a collection:
+  → return: db.<collection>.find({}).limit(5)
+  - This should retrieve 5 sample rows (documents) from the collection.
+  - Do NOT add any filters or projections — just return the top 5 documents using limit(5).
+"""),
+]
+
+# Sections a sliced prompt only keeps when the question calls for them; None = when several collections are selected
+MONGO_SECTION_CUES = {
+    "dates": re.compile(
+        r"\b(\d{4}|date|year|month|day|when|before|after|since|between|during|born|birth|"
+        r"jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\w*", re.IGNORECASE,
+    ),
+    "aggregate": re.compile(
+        r"\b(how many|count|number of|total|sum|average|avg|mean|per|each|group|most|least|max|min|"
+        r"maximum|minimum|highest|lowest|top)\b", re.IGNORECASE,
+    ),
+    "lookup": None,
+    "sort": re.compile(
+        r"\b(sort|sorted|order by|ordered|top|first|last|highest|lowest|most|least|largest|smallest|"
+        r"cheapest|latest|earliest|oldest|newest|limit|skip|page)\b", re.IGNORECASE,
+    ),
+    "write": re.compile(r"\b(insert|add|create|update|change|set|delete|remove|drop)\b", re.IGNORECASE),
+    "explore": re.compile(r"\b(collections?|tables?|sample|example|preview)\b", re.IGNORECASE),
+}
+
+MONGO_SYNONYMS_HEAD = """
+✅ FIELD SYNONYMS (Use only if the field exists in the schema):
+
+"""
+
+MONGO_SYNONYMS = {
+    "Bike Store": """\
+- Bike Store:
+  - "price" → "list_price"
+  - "name" → "product_name"
+  - "customer name" → use "first_name" and "last_name" separately
+
+""",
+    "AdventureWorks": """\
+- AdventureWorks:
+  - "cost" → "StandardCost"
+  - "name" → "Product"
+  - "sales amount" → "Sales"
+  - "country-region" → "Country"
+
+""",
+    "FIFA": """\
+- FIFA:
+  - "name" → "player_name"
+  - "score" → "minute" (in goals collection)
+
+""",
+}
+
+MONGO_INSTRUCTIONS_TAIL = """\
+⚠️ Do not invent new fields from synonyms. Use them only to map user intent to existing fields in the current schema.
+"""
+
+# Few-shot examples: (database, question, expected query)
+MONGO_EXAMPLES = [
+    (
+        "Bike Store",
+        "List products priced over 1000",
+        'db.products.find({ "list_price": { "$gt": 1000 } }, { "product_name": 1, "list_price": 1, "_id": 0 })\n',
+    ),
+    (
+        "Bike Store",
+        "Count orders per customer",
+        'db.orders.aggregate([{ "$group": { "_id": "$customer_id", "order_count": { "$sum": 1 } } }])\n',
+    ),
+    (
+        "Bike Store",
+        "Find orders placed in 2016",
+        'db.orders.find({ "order_date": { "$gte": "2016-01-01T00:00:00", "$lt": "2017-01-01T00:00:00" } })\n',
+    ),
+    (
+        "Bike Store",
+        "List orders with their product names",
+        'db.orders.aggregate([{ "$lookup": { "from": "products", "localField": "product_id", '
+        '"foreignField": "product_id", "as": "product" } }, { "$unwind": "$product" }, '
+        '{ "$project": { "order_id": 1, "product.product_name": 1, "_id": 0 } }])\n',
+    ),
+    (
+        "Bike Store",
+        "Add a new customer named John Doe in California",
+        'db.customers.insertOne({ "first_name": "John", "last_name": "Doe", "state": "California" })\n',
+    ),
+    (
+        "AdventureWorks",
+        "Calculate the total sales per product",
+        'db.sales.aggregate([{ "$group": { "_id": "$ProductKey", "total_sales": { "$sum": "$Sales" } } }])\n',
+    ),
+    (
+        "AdventureWorks",
+        "List red products",
+        'db.product.find({ "Color": "Red" }, { "Product": 1, "_id": 0 })\n',
+    ),
+    (
+        "AdventureWorks",
+        "Show resellers in Canada",
+        'db.reseller.find({ "Country": "Canada" }, { "Reseller": 1, "City": 1, "_id": 0 })\n',
+    ),
+    (
+        "FIFA",
+        "Find players born before 1950",
+        'db.players.find({ "birth_date": { "$lt": "1950-01-01T00:00:00" } }, { "family_name": 1, "given_name": 1, "_id": 0 })\n',
+    ),
+    (
+        "FIFA",
+        "Top 5 goal scorers",
+        'db.goals.aggregate([{ "$group": { "_id": "$player_id", "goals": { "$sum": 1 } } }, '
+        '{ "$sort": { "goals": -1 } }, { "$limit": 5 }])\n',
+    ),
+    (
+        "FIFA",
+        "List goals of the match M-1930-01",
+        'db.goals.find({ "match_id": "M-1930-01" }, { "player_id": 1, "minute_label": 1, "_id": 0 })\n',
+    ),
+]
+
+
+def render_sql_instructions(databases, examples) -> str:
+    synonyms = "".join(SQL_SYNONYMS[db] + "\n" for db in databases)
+    shots = "".join(
+        f'    - {db}: "{question}" →\n' + textwrap.indent(query, "      ")
+        for db, question, query in examples
+    )
+    return SQL_INSTRUCTIONS_HEAD + synonyms + SQL_INSTRUCTIONS_MID + shots
+
+
+def render_mongo_instructions(databases, examples, sections=None) -> str:
+    """MongoDB rules; ``sections`` limits the optional sections of MONGO_SECTION_CUES (None = all)."""
+    operations, number = [], 0
+    for name, text in MONGO_OPERATIONS:
+        if sections is not None and name in MONGO_SECTION_CUES and name not in sections:
+            continue
+        if text.startswith("-"):  # continues the previous section
+            operations.append(text)
+        elif text.startswith("✅"):
+            operations.append("\n" + text)
+        else:
+            number += 1
+            operations.append(("\n" if number > 1 else "") + f"{number}. {text}")
+    synonyms = "".join(MONGO_SYNONYMS[db] for db in databases)
+    shots = "".join(f'- {db}: "{question}" →\n' + textwrap.indent(query, "  ") for db, question, query in examples)
+    return (
+        MONGO_INSTRUCTIONS_HEAD + "".join(operations) + MONGO_SYNONYMS_HEAD + synonyms + MONGO_INSTRUCTIONS_TAIL
+        + ("\n✅ EXAMPLES:\n" + shots if shots else "")
+    )
+
+
+def _render_prompt(user_query: str, query_type: str, schema_text: str, instructions: str) -> str:
+    query_instruction = (
+        "Generate a SQL query using unqualified table names (e.g., products)"
+        if query_type == "sql"
+        else "Generate a MongoDB query using db.<collection> (e.g., db.products)"
+    )
+    return f"""
+You are an expert database assistant converting natural language to {'SQL' if query_type == 'sql' else 'MongoDB'} queries. Follow these instructions:
+
+Schema: {schema_text}
+
+{instructions}
+
+- **Output**: Return only the query, no markers, comments, or formatting. For MongoDB, ensure balanced curly braces.
+
+{query_instruction}.
+
+Query: {user_query}
+
+Return exactly:
+"""
+
+
+class PromptTemplate:
+    """Prompt for one (database, query_type) pair, compiled once.
+
+    The prompt is stored as the text before and after the user question, so
+    rendering a request is a single concatenation. Sliced variants (a subset
+    of tables and examples) are compiled on first use and remembered.
+    """
+
+    def __init__(self, database: str, query_type: str, dataset: dict):
+        self.database = database
+        self.query_type = query_type
+        self.dataset = dataset
+        self.schema_text = f"{dataset[query_type]}"
+        self.examples = [
+            example for example in (SQL_EXAMPLES if query_type == "sql" else MONGO_EXAMPLES) if example[0] == database
+        ]
+        self.prefix, self.suffix = self._compile(self.schema_text, self.examples)
+        self.hash = hashlib.sha256((self.prefix + self.suffix).encode("utf-8")).hexdigest()[:16]
+        self.tokens = estimate_tokens(self.prefix + self.suffix)
+        self._slices = {}  # (tables, examples, sections) -> (prefix, suffix, tokens)
+        self._lock = threading.Lock()
+
+    def _compile(self, schema_text: str, examples: list, sections=None):
+        if self.query_type == "sql":
+            instructions = render_sql_instructions([self.database], examples)
+        else:
+            instructions = render_mongo_instructions([self.database], examples, sections)
+        text = _render_prompt(_QUESTION_MARKER, self.query_type, schema_text, instructions)
+        prefix, suffix = text.split(_QUESTION_MARKER)
+        return prefix, suffix
+
+    def render(self, user_query: str) -> str:
+        return self.prefix + user_query + self.suffix
+
+    def render_sliced(self, user_query: str) -> str:
+        tables = select_tables(user_query, self.dataset, self.query_type)
+        examples = select_examples(user_query, self.examples, self.database, tables)
+        sections = None
+        if self.query_type == "mongodb":
+            sections = frozenset(select_sections(user_query, MONGO_SECTION_CUES, tables))
+        key = (tuple(tables), tuple(e[1] for e in examples), sections)
+        with self._lock:
+            compiled = self._slices.get(key)
+        if compiled is None:
+            schema_text = slice_schema(self.schema_text, self.query_type, tables)
+            prefix, suffix = self._compile(schema_text, examples, sections)
+            compiled = (prefix, suffix, estimate_tokens(prefix + suffix))
+            with self._lock:
+                if len(self._slices) >= MAX_SLICES:
+                    self._slices.clear()
+                self._slices[key] = compiled
+
+        prefix, suffix, tokens = compiled
+        question_tokens = estimate_tokens(user_query)
+        record_prompt_tokens(self.tokens + question_tokens, tokens + question_tokens)
+        return prefix + user_query + suffix
+
+
+def build_registry(schemas: dict) -> dict:
+    return {
+        (database, query_type): PromptTemplate(database, query_type, schemas[schema_key])
+        for database, schema_key in db_map.items()
+        for query_type in ("sql", "mongodb")
+    }
+
+
+# Built once at import for every (database, query_type) pair
+TEMPLATES = build_registry(default_schemas)
+
+
+def get_template(database: str, query_type: str, schemas: dict = None) -> PromptTemplate:
+    template = TEMPLATES[(database, query_type)]
+    if schemas is None or schemas is default_schemas:
+        return template
+    # A caller-supplied schema dict only gets its own template if it differs
+    dataset = schemas[db_map[database]]
+    if f"{dataset[query_type]}" == template.schema_text:
+        return template
+    return PromptTemplate(database, query_type, dataset)
+
+
+def template_hash(database: str, query_type: str) -> str:
+    return TEMPLATES[(database, query_type)].hash
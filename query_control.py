@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+import pymysql
+from pymongo.errors import OperationFailure, PyMongoError
+
+from connections import MYSQL_CONFIG, get_mongo_client
+
+# Time budget of one statement in milliseconds (override with environment variables), 0 = no limit
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", "30000"))
+
+# Server error codes of an interrupted statement
+_MYSQL_TIMEOUT = 3024  # MAX_EXECUTION_TIME exceeded
+_MYSQL_INTERRUPTED = 1317  # KILL QUERY
+_MYSQL_LOST_CONNECTION = 2013  # client read timeout
+_MONGO_INTERRUPTED = 11601  # killOp
+
+_running_lock = threading.Lock()
+_running = {}  # token -> dict(backend, thread_id, reason, lock, done)
+
+
+def _register(token: str, entry: dict) -> dict:
+    # The entry's own lock is held while the statement is killed, so no
+    # network call runs under the registry lock
+    entry.update(lock=threading.Lock(), done=False)
+    with _running_lock:
+        _running[token] = entry
+    return entry
+
+
+def _unregister(token: str, entry: dict):
+    # Waits for a kill in progress, so the connection is never reused under it
+    with entry["lock"]:
+        entry["done"] = True
+    with _running_lock:
+        _running.pop(token, None)
+
+
+def new_query_token() -> str:
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def track_mysql(token: Optional[str], conn, timeout_ms: int = QUERY_TIMEOUT_MS):
+    """Make the statement running on ``conn`` cancellable through ``token``.
+
+    A watchdog kills the statement once ``timeout_ms`` is spent, which also
+    covers writes (MAX_EXECUTION_TIME only applies to SELECT). Yields the
+    registry entry, whose ``reason`` says why the statement was killed.
+    """
+    token = token or new_query_token()
+    entry = _register(token, {"backend": "mysql", "thread_id": conn.thread_id(), "reason": None})
+    watchdog = None
+    if timeout_ms:
+        watchdog = threading.Timer(timeout_ms / 1000, cancel_query, (token, "timeout"))
+        watchdog.daemon = True
+        watchdog.start()
+    try:
+        yield entry
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        _unregister(token, entry)
+
+
+@contextmanager
+def track_sqlite(token: Optional[str], conn, timeout_ms: int = QUERY_TIMEOUT_MS):
+    """Like track_mysql for an embedded SQLite connection, which is interrupted in process.
+
+    The time budget is a progress handler, so it also covers rows fetched
+    after the block; the pool clears it when the connection is returned.
+    """
+    token = token or new_query_token()
+    entry = _register(token, {"backend": "sqlite", "thread_id": None, "conn": conn, "reason": None})
+    if timeout_ms:
+        deadline = time.monotonic() + timeout_ms / 1000
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+    try:
+        yield entry
+    finally:
+        _unregister(token, entry)
+
+
+@contextmanager
+def track_mongodb(token: Optional[str]):
+    """Make MongoDB operations tagged with ``comment=token`` cancellable."""
+    entry = {"backend": "mongodb", "thread_id": None, "reason": None}
+    if token:
+        _register(token, entry)
+    try:
+        yield entry
+    finally:
+        if token:
+            _unregister(token, entry)
+
+
+def _kill_mysql(thread_id: int):
+    conn = pymysql.connect(connect_timeout=5, **MYSQL_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("KILL QUERY %s", (thread_id,))
+    finally:
+        conn.close()
+
+
+def _kill_mongodb(token: str) -> int:
+    admin = get_mongo_client().admin
+    ops = admin.aggregate([{"$currentOp": {}}, {"$match": {"command.comment": token}}])
+    killed = 0
+    for op in ops:
+        admin.command("killOp", op=op["opid"])
+        killed += 1
+    return killed
+
+
+def cancel_query(token: str, reason: str = "cancelled") -> bool:
+    """Kill the statement registered under ``token`` (KILL QUERY / killOp / interrupt)."""
+    with _running_lock:
+        entry = _running.get(token)
+        if entry is None:
+            return False
+        entry["reason"] = entry["reason"] or reason
+    with entry["lock"]:
+        if entry["done"]:
+            return False
+        try:
+            if entry["backend"] == "mysql":
+                _kill_mysql(entry["thread_id"])
+            elif entry["backend"] == "sqlite":
+                entry["conn"].interrupt()
+            else:
+                _kill_mongodb(token)
+        except Exception as e:
+            print(f"❌ Could not cancel query {token}: {e}")
+            return False
+    print(f"Killed query {token} ({reason})")
+    return True
+
+
+def interruption_status(error: Exception, entry: dict) -> Optional[str]:
+    """"Timeout: ..." / "Cancelled: ..." for an interrupted statement, None for other errors."""
+    code = None
+    if isinstance(error, pymysql.err.OperationalError) and error.args:
+        code = error.args[0]
+    elif isinstance(error, OperationFailure):
+        code = error.code
+
+    if code == _MYSQL_TIMEOUT or (isinstance(error, PyMongoError) and error.timeout):
+        return f"Timeout: query exceeded its {QUERY_TIMEOUT_MS / 1000:g}s time budget"
+    if code == _MYSQL_LOST_CONNECTION and "timed out" in str(error):
+        return "Timeout: no response from MySQL before the read timeout"
+    if isinstance(error, sqlite3.OperationalError) and str(error) == "interrupted" and not entry["reason"]:
+        # Only the progress handler interrupts without a reason
+        return f"Timeout: query exceeded its {QUERY_TIMEOUT_MS / 1000:g}s time budget"
+    if code in (_MYSQL_INTERRUPTED, _MONGO_INTERRUPTED) or entry["reason"]:
+        if entry["reason"] == "timeout":
+            return f"Timeout: query exceeded its {QUERY_TIMEOUT_MS / 1000:g}s time budget"
+        return "Cancelled: query was cancelled"
+    return None
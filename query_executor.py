@@ -1,10 +1,43 @@
-import pymysql
 import re
-import ast
-from pymongo import MongoClient
 import json
-import json5
-
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import NamedTuple, Optional
+import pyarrow as pa
+import pymongo
+import pymysql
+from pymongo.errors import PyMongoError
+from arrow_results import (
+    concat_batches,
+    description_types,
+    documents_to_record_batch,
+    rows_to_record_batch,
+)
+from columnar_mongo import MONGO_BACKEND, Unsupported, get_columnar_store
+from connections import get_mongo_client, get_mysql_pool
+from embedded_sql import SQL_BACKEND, get_embedded_pool, translate
+from mongo_parser import MongoSyntaxError, parse_mongo_query
+from sql_rewriter import RewrittenSQL, rewrite_sql
+from query_guard import GuardDecision, check_mongo, check_sql
+from result_cache import MISS, get_result_cache, result_size
+from tracing import span, traced
+from query_control import (
+    QUERY_TIMEOUT_MS,
+    interruption_status,
+    track_mongodb,
+    track_mysql,
+    track_sqlite,
+)
+
+# Streaming limits for stream_sql_query
+SQL_STREAM_BATCH_SIZE = int(os.getenv("SQL_STREAM_BATCH_SIZE", "500"))  # rows per batch
+SQL_STREAM_MAX_ROWS = int(os.getenv("SQL_STREAM_MAX_ROWS", "10000"))  # 0 = no cap
+
+# Streaming limits for execute_mongodb_query(stream=True)
+MONGO_STREAM_BATCH_SIZE = int(os.getenv("MONGO_STREAM_BATCH_SIZE", "100"))  # documents per batch
+MONGO_STREAM_DEFAULT_LIMIT = int(os.getenv("MONGO_STREAM_DEFAULT_LIMIT", "1000"))  # 0 = no limit
 
 
 def detect_database(query: str):
@@ -20,109 +53,781 @@ def detect_database(query: str):
     return None
 
 
-def execute_sql_query(query: str, database: str):
+# MySQL schema and tables of each dataset
+SQL_SCHEMAS = {
+    "Bike Store": "bike_store",
+    "AdventureWorks": "adventure_works",
+    "FIFA": "fifa",
+}
+SQL_TABLES = {
+    "Bike Store": ["customers", "orders", "products"],
+    "AdventureWorks": ["product", "reseller", "sales"],
+    "FIFA": ["players", "matches", "goals"],
+}
+
+
+# Statements that only change rows of the tables they name; other writes (DDL) may touch any table
+_SQL_ROW_WRITES = {"INSERT", "UPDATE", "DELETE", "REPLACE"}
+# Errors of an interrupted or failed statement, from MySQL or the embedded SQLite backend
+_SQL_OPERATIONAL_ERRORS = (pymysql.err.OperationalError, sqlite3.OperationalError)
+
+
+def _sql_pool(schema_name: str, backend: str):
+    """Pool of the SQL backend ("mysql" or the embedded "sqlite") for a schema."""
+    return get_embedded_pool(schema_name) if backend == "sqlite" else get_mysql_pool(schema_name)
+
+
+def _check_sql(backend: str, conn, statement: RewrittenSQL) -> GuardDecision:
+    # The embedded backend only holds the bundled datasets and has its own time budget
+    if backend == "sqlite":
+        return GuardDecision("allow", None, None, "embedded backend")
+    with conn.cursor() as cursor:
+        return check_sql(cursor, statement)
+
+
+def _track_sql(backend: str, token: Optional[str], conn, timeout_ms: int = QUERY_TIMEOUT_MS):
+    if backend == "sqlite":
+        return track_sqlite(token, conn, timeout_ms)
+    return track_mysql(token, conn, timeout_ms)
+
+
+def _sql_cache_ticket(backend: str, schema_name: str, statement: RewrittenSQL, variant: str):
+    """Result cache ticket of a read, or None for writes, reads calling NOW() / RAND() / ... and when caching is off."""
+    cache = get_result_cache()
+    if not statement.returns_rows or statement.volatile or not cache.enabled:
+        return None
+    return cache.ticket(f"{backend}:{schema_name}", f"{variant}:{statement.sql}", statement.tables or None)
+
+
+def _cached_result(ticket):
+    """Result cache lookup for ``ticket``; MISS when there is nothing cached."""
+    with span("result_cache") as stage:
+        cached = get_result_cache().get(ticket)
+        stage.set(hit=cached is not MISS)
+    if cached is not MISS:
+        print("Result cache hit")
+    return cached
+
+
+def _invalidate(cache_database: str, tables: Optional[frozenset]):
+    dropped = get_result_cache().invalidate(cache_database, tables)
+    if dropped:
+        print(f"Result cache: dropped {dropped} results of {', '.join(sorted(tables or ['all tables']))}")
+
+
+def _invalidate_sql(backend: str, schema_name: str, statement: RewrittenSQL):
+    tables = statement.tables if statement.kind in _SQL_ROW_WRITES and statement.tables else None
+    _invalidate(f"{backend}:{schema_name}", tables)
+
+
+def sanitize_sql_query(query: str, database: str = None, limit: int = None) -> RewrittenSQL:
+    """Rewrite generated SQL into the MySQL statement to run (see sql_rewriter)."""
+    with span("sanitize") as stage:
+        rewritten = rewrite_sql(
+            query,
+            SQL_SCHEMAS.get(database),
+            SQL_TABLES.get(database, ()),
+            limit,
+            timeout_ms=QUERY_TIMEOUT_MS or None,
+        )
+        stage.set(rewrites=list(rewritten.rewrites), sql=rewritten.sql)
+    if rewritten.rewrites:
+        print(f"Rewrote query for MySQL ({', '.join(rewritten.rewrites)})")
+    print(f"Final query: {rewritten.sql}")
+    return rewritten
+
+
+@traced("execute_sql")
+def execute_sql_query(
+    query: str, database: str, token: str = None, arrow: bool = False, backend: str = None
+):
+    """Run a generated SQL statement.
+
+    Returns ``(rows, columns)`` for reads (a pyarrow Table with ``arrow=True``),
+    the affected row count for writes, or a string starting with "Error",
+    "Timeout" or "Cancelled". Passing a ``token`` lets
+    query_control.cancel_query kill the statement. ``backend`` overrides
+    SQL_BACKEND ("mysql" or the read-only embedded "sqlite").
+    """
     try:
-        schema_map = {
-            "Bike Store": "bike_store",
-            "AdventureWorks": "adventure_works",
-            "FIFA": "fifa",
-        }
-        schema_name = schema_map.get(database, "")
-        print(schema_name)
+        backend = backend or SQL_BACKEND
+        schema_name = SQL_SCHEMAS.get(database, "")
         if not schema_name:
             return "Error: Invalid database"
 
-        table_map = {
-            "Bike Store": ["customers", "orders", "products"],
-            "AdventureWorks": ["product", "sales"],
-            "FIFA": ["players", "matches", "goals"],
-        }
-        tables = table_map.get(database, [])
-
-        # Sanitize the query
-        sanitized_query = re.sub(r"```(?:sql|javascript)?\s*|\s*```", "", query).strip()
-        sanitized_query = re.sub(r"\s+", " ", sanitized_query).strip()
-        print(sanitized_query)
-
-        if "||" in sanitized_query:
-           
-            select_part = sanitized_query.lower().split("from")[0]
-            if "||" in select_part:
-              
-                def replace_concat(match):
-                    # Split the matched expression into the concatenation part and the alias (if any)
-                    full_expression = match.group(0)
-                    
-                    alias_match = re.search(
-                        r"\s+AS\s+\w+\b", full_expression, re.IGNORECASE
-                    )
-                    if alias_match:
-                        # Extract the alias and the expression before it
-                        alias = alias_match.group(0)  # e.g., " AS customer_name"
-                        concat_expression = full_expression[
-                            : alias_match.start()
-                        ]  
+        final_query = sanitize_sql_query(query, database)
+        if backend == "sqlite" and not final_query.returns_rows:
+            return "Error: The embedded SQL backend is read-only"
+        ticket = _sql_cache_ticket(backend, schema_name, final_query, "arrow" if arrow else "rows")
+        if ticket is not None:
+            cached = _cached_result(ticket)
+            if cached is not MISS:
+                return cached
+
+        # Borrow a pooled connection for this schema
+        with _sql_pool(schema_name, backend).connection() as conn:
+            with span("guard") as stage:
+                decision = _check_sql(backend, conn, final_query)
+                stage.set(action=decision.action)
+            if decision.action == "refuse":
+                return f"Error: Query refused by cost guard: {decision.reason}"
+            if decision.action == "limit":
+                final_query = rewrite_sql(final_query.sql, limit=decision.limit)
+            sql = translate(final_query.sql, schema_name) if backend == "sqlite" else final_query.sql
+            cursor = conn.cursor()
+            try:
+                with span("execute"), _track_sql(backend, token, conn) as running:
+                    try:
+                        cursor.execute(sql)
+                    except _SQL_OPERATIONAL_ERRORS as e:
+                        status = interruption_status(e, running)
+                        if status is None:
+                            raise
+                        return status
+
+                with span("fetch" if final_query.returns_rows else "commit") as stage:
+                    if final_query.returns_rows and arrow:
+                        results = _fetch_arrow(cursor)
+                        stage.set(rows=results.num_rows)
+                    elif final_query.returns_rows:
+                        data = cursor.fetchall()
+                        columns = (
+                            [desc[0] for desc in cursor.description] if cursor.description else []
+                        )
+                        results = (data, columns)
+                        stage.set(rows=len(data))
                     else:
-                        # No alias present
-                        alias = ""
-                        concat_expression = full_expression
-
-             
-                    parts = [part.strip() for part in concat_expression.split("||")]
-                    # Wrap in CONCAT and reattach the alias
-                    return f"CONCAT({', '.join(parts)}){alias}"
-
-                updated_select = re.sub(
-                    r"\b\w+\s*\|\|.*?(?=\s*(?:AS\s+\w+|,|FROM|WHERE|GROUP|HAVING|ORDER|\Z))",
-                    replace_concat,
-                    select_part,
-                    flags=re.IGNORECASE,
-                )
-             
-                sanitized_query = (
-                    updated_select + " FROM" + sanitized_query.split("FROM", 1)[1]
-                )
-                print(
-                    f"Modified query for MySQL (replaced || with CONCAT): {sanitized_query}"
-                )
-
-        final_query = sanitized_query
-        print(f"Final query: {final_query}")
-
-        # Connect to MySQL
-        conn = pymysql.connect(
-            host="localhost", user="sql_user", password="SafePass@123", database=schema_name
-        )
-        cursor = conn.cursor()
-        cursor.execute(final_query)
-
-    
-        if final_query.upper().startswith("SELECT"):
-            data = cursor.fetchall()
-            columns = (
-                [desc[0] for desc in cursor.description] if cursor.description else []
-            )
-            results = (data, columns)
-        else:
-            conn.commit()
-            results = cursor.rowcount
-
-        conn.close()
+                        conn.commit()
+                        _invalidate_sql(backend, schema_name, final_query)
+                        results = cursor.rowcount
+                        stage.set(rows=results)
+            finally:
+                cursor.close()
+
+        if ticket is not None:
+            get_result_cache().set(ticket, results)
         return results
     except Exception as e:
         return f"Error executing SQL query: {e}"
 
 
 
-def parse_mongo_js_object(js_str: str):
+def _fetch_arrow(cursor, batch_size: int = SQL_STREAM_BATCH_SIZE):
+    """Read a result into a pyarrow Table, one RecordBatch per ``fetchmany``."""
+    columns = [desc[0] for desc in cursor.description] if cursor.description else []
+    types = description_types(cursor.description)
+    batches = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        batches.append(rows_to_record_batch(rows, columns, types))
+    return concat_batches(batches or [rows_to_record_batch([], columns, types)])
+
+
+class SQLStream:
+    """Rows of a SELECT read in batches through a server-side cursor.
+
+    Iterating yields lists of at most ``batch_size`` rows and stops after
+    ``max_rows`` rows, setting ``truncated`` if more were available. The pooled
+    connection goes back to the pool when the stream is exhausted or closed.
+    Fetches stay cancellable through ``token`` and are killed once
+    ``deadline`` (a time.monotonic() value) passes.
+    """
+
+    def __init__(
+        self, pool, conn, cursor, batch_size: int, max_rows: int, cache_ticket=None,
+        backend: str = "mysql", token: str = None, deadline: float = None,
+    ):
+        self._pool = pool
+        self._conn = conn
+        self._cursor = cursor
+        self._backend = backend
+        self._token = token
+        self._deadline = deadline
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        self.rows_fetched = 0
+        self.fetch_seconds = 0.0  # time spent waiting on the server for rows
+        self.truncated = False
+        self.interrupted = None  # "Timeout: ..." / "Cancelled: ..." if the server stopped the query
+        self._exhausted = False
+        self._closed = False
+        self._cache_ticket = cache_ticket
+
+    def __iter__(self):
+        # What is left of the statement's time budget covers the fetches too
+        timeout_ms = 0
+        if self._deadline is not None:
+            timeout_ms = max(1, int((self._deadline - time.monotonic()) * 1000))
+        try:
+            with _track_sql(self._backend, self._token, self._conn, timeout_ms) as running:
+                while True:
+                    remaining = self.max_rows - self.rows_fetched if self.max_rows else self.batch_size
+                    started = time.perf_counter()
+                    try:
+                        if remaining <= 0:
+                            # Peek one row to tell "exactly max_rows" from "truncated"
+                            self.truncated = self._cursor.fetchone() is not None
+                            self._exhausted = not self.truncated
+                            break
+                        rows = self._cursor.fetchmany(min(self.batch_size, remaining))
+                    except _SQL_OPERATIONAL_ERRORS as e:
+                        self.interrupted = interruption_status(e, running)
+                        if self.interrupted is None:
+                            raise
+                        break
+                    finally:
+                        self.fetch_seconds += time.perf_counter() - started
+                    if not rows:
+                        self._exhausted = True
+                        break
+                    self.rows_fetched += len(rows)
+                    yield list(rows)
+        finally:
+            self.close()
+
+    def record_batches(self):
+        """Iterate the result as pyarrow RecordBatches typed from the cursor description.
+
+        A result read to the end this way is put in the result cache.
+        """
+        cache = get_result_cache()
+        types = description_types(self._cursor.description)
+        batches = [] if self._cache_ticket is not None else None
+        size = 0
+        for rows in self:
+            batch = rows_to_record_batch(rows, self.columns, types)
+            # Later batches keep the types inferred for the first one
+            types = batch.schema.types
+            if batches is not None:
+                size += batch.nbytes
+                batches = batches if size <= cache.max_entry_bytes else None
+                if batches is not None:
+                    batches.append(batch)
+            yield batch
+        if batches is not None and self.interrupted is None:
+            cache.set(self._cache_ticket, (self.columns, batches, self.truncated), size)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._exhausted:
+            self._cursor.close()
+            self._pool.release(self._conn)
+        else:
+            # Closing an unread server-side cursor would read the rest of the
+            # result, so drop the connection instead
+            self._pool.release(self._conn, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CachedSQLStream(SQLStream):
+    """An SQLStream replaying the record batches of an earlier read from the result cache."""
+
+    def __init__(self, columns: list, batches: list, truncated: bool):
+        self.columns = columns
+        self.batch_size = max((batch.num_rows for batch in batches), default=0)
+        self.max_rows = 0
+        self.rows_fetched = 0
+        self.fetch_seconds = 0.0
+        self.truncated = False
+        self.interrupted = None
+        self._batches = batches
+        self._truncated = truncated
+        self._closed = False
+
+    def __iter__(self):
+        for batch in self.record_batches():
+            yield [tuple(row.values()) for row in batch.to_pylist()]
+
+    def record_batches(self):
+        for batch in self._batches:
+            self.rows_fetched += batch.num_rows
+            yield batch
+        self.truncated = self._truncated
+
+    def close(self):
+        self._closed = True
+
+
+@traced("execute_sql")
+def stream_sql_query(
+    query: str,
+    database: str,
+    batch_size: int = SQL_STREAM_BATCH_SIZE,
+    max_rows: int = SQL_STREAM_MAX_ROWS,
+    token: str = None,
+    backend: str = None,
+):
+    """Like execute_sql_query, but SELECTs return an SQLStream instead of all rows."""
     try:
-        return json5.loads(js_str)
+        backend = backend or SQL_BACKEND
+        schema_name = SQL_SCHEMAS.get(database, "")
+        if not schema_name:
+            return "Error: Invalid database"
+
+        # One row past the cap is enough for SQLStream to detect truncation
+        final_query = sanitize_sql_query(query, database, max_rows + 1 if max_rows else None)
+        if backend == "sqlite" and not final_query.returns_rows:
+            return "Error: The embedded SQL backend is read-only"
+        ticket = _sql_cache_ticket(backend, schema_name, final_query, f"stream:{max_rows}")
+        if ticket is not None:
+            cached = _cached_result(ticket)
+            if cached is not MISS:
+                return CachedSQLStream(*cached)
+
+        pool = _sql_pool(schema_name, backend)
+        with span("pool_acquire"):
+            conn = pool.acquire()
+        running = None
+        try:
+            with span("guard") as stage:
+                decision = _check_sql(backend, conn, final_query)
+                stage.set(action=decision.action)
+            if decision.action == "refuse":
+                pool.release(conn)
+                return f"Error: Query refused by cost guard: {decision.reason}"
+            if decision.action == "limit":
+                max_rows = min(max_rows, decision.limit) if max_rows else decision.limit
+                final_query = rewrite_sql(final_query.sql, limit=max_rows + 1)
+            if backend == "sqlite":
+                # SQLite cursors already step through the result as it is fetched
+                cursor, sql = conn.cursor(), translate(final_query.sql, schema_name)
+            else:
+                cursor, sql = conn.cursor(pymysql.cursors.SSCursor), final_query.sql
+            deadline = time.monotonic() + QUERY_TIMEOUT_MS / 1000 if QUERY_TIMEOUT_MS else None
+            with span("execute"), _track_sql(backend, token, conn) as running:
+                cursor.execute(sql)
+        except Exception as e:
+            broken = isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError, sqlite3.Error))
+            pool.release(conn, discard=broken)
+            status = interruption_status(e, running) if running else None
+            if status is None:
+                raise
+            return status
+
+        if final_query.returns_rows:
+            return SQLStream(
+                pool, conn, cursor, batch_size, max_rows, ticket, backend=backend, token=token, deadline=deadline
+            )
+
+        try:
+            conn.commit()
+            _invalidate_sql(backend, schema_name, final_query)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            pool.release(conn)
     except Exception as e:
-        raise ValueError(f"Error parsing JS-like object: {e}")
+        return f"Error executing SQL query: {e}"
+
+
+class MongoStream:
+    """Documents of a find/aggregate cursor, read one batch at a time.
+
+    ``limit`` is the limit added to the query (the default limit or the cost
+    guard's cap), in which case reaching it means more documents may exist.
+    """
+
+    def __init__(self, cursor, batch_size: int, limit: int = 0):
+        self._cursor = cursor
+        self.batch_size = batch_size
+        self.limit = limit
+        self.docs_fetched = 0
+        self.fetch_seconds = 0.0  # time spent waiting on the server for documents
+        self.exhausted = False
+        self.schema = None  # Arrow schema of the last record batch
+        self.cache_ticket = None  # set to put the documents in the result cache once all are read
+        self._cached = []
+        self._cached_bytes = 0
+
+    def next_batch(self, size: int = None) -> list:
+        if self.exhausted:
+            return []
+        size = size or self.batch_size
+        started = time.perf_counter()
+        batch = list(islice(self._cursor, size))
+        self.fetch_seconds += time.perf_counter() - started
+        self.docs_fetched += len(batch)
+        if self.cache_ticket is not None:
+            self._remember(batch, finished=len(batch) < size)
+        if len(batch) < size:
+            self.close()
+        return batch
+
+    def _remember(self, batch: list, finished: bool):
+        cache = get_result_cache()
+        self._cached.extend(batch)
+        self._cached_bytes += result_size(batch) if batch else 0
+        if self._cached_bytes > cache.max_entry_bytes:
+            self.cache_ticket = None
+            self._cached = []
+        elif finished:
+            cache.set(self.cache_ticket, CachedDocuments(self._cached, self.limit), self._cached_bytes)
+
+    def next_record_batch(self, size: int = None):
+        """The next batch as a pyarrow RecordBatch, or None once the cursor is exhausted."""
+        documents = self.next_batch(size)
+        if not documents:
+            return None
+        batch = documents_to_record_batch(documents, self.schema)
+        self.schema = batch.schema
+        return batch
+
+    def __iter__(self):
+        while not self.exhausted:
+            batch = self.next_batch()
+            if batch:
+                yield batch
+
+    def record_batches(self):
+        while not self.exhausted:
+            batch = self.next_record_batch()
+            if batch is not None:
+                yield batch
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.limit) and self.exhausted and self.docs_fetched >= self.limit
+
+    def close(self):
+        if not self.exhausted:
+            self.exhausted = True
+            self._cursor.close()
+
+
+class CachedDocuments(NamedTuple):
+    """A MongoStream's documents as kept in the result cache."""
+
+    documents: list
+    limit: int
+
+
+class _CachedCursor:
+    """Cursor-like iterator over cached documents."""
+
+    def __init__(self, documents: list):
+        self._documents = iter(documents)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._documents)
+
+    def close(self):
+        pass
+
+
+def _find(db, command, stream, options):
+    filter_dict = command.args[0] if len(command.args) > 0 else {}
+    projection_dict = command.args[1] if len(command.args) > 1 else None
+    cursor = db[command.collection].find(filter_dict, projection_dict, **options)
+    if QUERY_TIMEOUT_MS:
+        # find runs lazily, outside the pymongo.timeout() block
+        cursor = cursor.max_time_ms(QUERY_TIMEOUT_MS)
+
+    user_limit = None
+    sort_spec = None
+    for call in command.chain:
+        if call.name in ("count", "size"):
+            return {"count": db[command.collection].count_documents(filter_dict, **options)}
+        handler = _CURSOR_METHODS.get(call.name)
+        if handler is None:
+            return f"Error: Unsupported cursor method .{call.name}()"
+        cursor = handler(cursor, *call.args)
+        if call.name == "limit":
+            user_limit = int(call.args[0])
+        elif call.name == "sort" and call.args and isinstance(call.args[0], dict):
+            sort_spec = call.args[0]
+
+    plan = {"find": command.collection, "filter": filter_dict}
+    if sort_spec:
+        plan["sort"] = sort_spec
+    decision = check_mongo(db, command.collection, plan, user_limit or None)
+    if decision.action == "refuse":
+        return f"Error: Query refused by cost guard: {decision.reason}"
+
+    limit = 0
+    if decision.action == "limit":
+        limit = decision.limit
+    elif stream and not user_limit:
+        limit = MONGO_STREAM_DEFAULT_LIMIT
+    if limit:
+        cursor = cursor.limit(limit)
+    if stream:
+        cursor = cursor.batch_size(MONGO_STREAM_BATCH_SIZE)
+        return MongoStream(cursor, MONGO_STREAM_BATCH_SIZE, limit)
+    return list(cursor)
+
+
+def _sort(cursor, spec):
+    if isinstance(spec, dict):
+        return cursor.sort(list(spec.items()))
+    return cursor
+
+
+# Chained cursor methods after .find(...)
+_CURSOR_METHODS = {
+    "sort": _sort,
+    "skip": lambda cursor, n: cursor.skip(int(n)),
+    "limit": lambda cursor, n: cursor.limit(int(n)),
+    "min": lambda cursor, spec: cursor.min(list(spec.items())),
+    "max": lambda cursor, spec: cursor.max(list(spec.items())),
+    "pretty": lambda cursor: cursor,
+    "toArray": lambda cursor: cursor,
+}
+
+
+def _aggregate(db, command, stream, options):
+    if not command.args or not isinstance(command.args[0], list):
+        return "Error: Could not parse aggregate pipeline"
+    pipeline = command.args[0]
+    user_limits = [stage["$limit"] for stage in pipeline if isinstance(stage, dict) and "$limit" in stage]
+
+    plan = {"aggregate": command.collection, "pipeline": pipeline, "cursor": {}}
+    decision = check_mongo(db, command.collection, plan, min(user_limits) if user_limits else None)
+    if decision.action == "refuse":
+        return f"Error: Query refused by cost guard: {decision.reason}"
+
+    limit = 0
+    if decision.action == "limit":
+        limit = decision.limit
+    elif stream and not user_limits:
+        limit = MONGO_STREAM_DEFAULT_LIMIT
+    if limit:
+        pipeline = pipeline + [{"$limit": limit}]
+    if stream:
+        if QUERY_TIMEOUT_MS:
+            # The getMores run outside the pymongo.timeout() block; the
+            # server counts maxTimeMS across the whole cursor
+            options = {**options, "maxTimeMS": QUERY_TIMEOUT_MS}
+        cursor = db[command.collection].aggregate(
+            pipeline, batchSize=MONGO_STREAM_BATCH_SIZE, **options
+        )
+        return MongoStream(cursor, MONGO_STREAM_BATCH_SIZE, limit)
+    return list(db[command.collection].aggregate(pipeline, **options))
+
+
+def _find_one(db, command, stream, options):
+    filter_dict = command.args[0] if len(command.args) > 0 else {}
+    projection_dict = command.args[1] if len(command.args) > 1 else None
+    return db[command.collection].find_one(filter_dict, projection_dict, **options)
+
+
+def _insert_one(db, command, stream, options):
+    result = db[command.collection].insert_one(command.args[0], **options)
+    return {
+        "acknowledged": result.acknowledged,
+        "insertedId": str(result.inserted_id),
+    }
+
+
+def _insert_many(db, command, stream, options):
+    result = db[command.collection].insert_many(command.args[0], **options)
+    return {
+        "acknowledged": result.acknowledged,
+        "insertedIds": [str(_id) for _id in result.inserted_ids],
+    }
+
+
+def _update(many):
+    def handler(db, command, stream, options):
+        if len(command.args) < 2:
+            return f"Error: Invalid {command.method} syntax"
+        filter_dict, update_dict = command.args[0], command.args[1]
+        update_options = command.args[2] if len(command.args) > 2 else {}
+        collection = db[command.collection]
+        update = collection.update_many if many else collection.update_one
+        result = update(
+            filter_dict, update_dict, upsert=bool(update_options.get("upsert", False)), **options
+        )
+        return {
+            "acknowledged": result.acknowledged,
+            "matchedCount": result.matched_count,
+            "modifiedCount": result.modified_count,
+        }
+
+    return handler
 
 
-def execute_mongodb_query(query: str, database: str):
+def _delete(many):
+    def handler(db, command, stream, options):
+        filter_dict = command.args[0] if command.args else {}
+        collection = db[command.collection]
+        delete = collection.delete_many if many else collection.delete_one
+        result = delete(filter_dict, **options)
+        return {
+            "acknowledged": result.acknowledged,
+            "deletedCount": result.deleted_count,
+        }
+
+    return handler
+
+
+def _count(db, command, stream, options):
+    filter_dict = command.args[0] if command.args else {}
+    return {"count": db[command.collection].count_documents(filter_dict, **options)}
+
+
+def _distinct(db, command, stream, options):
+    if not command.args:
+        return "Error: distinct() needs a field name"
+    filter_dict = command.args[1] if len(command.args) > 1 else {}
+    return db[command.collection].distinct(command.args[0], filter_dict, **options)
+
+
+def _drop(db, command, stream, options):
+    db[command.collection].drop()
+    return {"dropped": True}
+
+
+# Collection methods: db.<collection>.<method>(...)
+MONGO_HANDLERS = {
+    "find": _find,
+    "findOne": _find_one,
+    "aggregate": _aggregate,
+    "insertOne": _insert_one,
+    "insertMany": _insert_many,
+    "updateOne": _update(many=False),
+    "updateMany": _update(many=True),
+    "deleteOne": _delete(many=False),
+    "deleteMany": _delete(many=True),
+    "countDocuments": _count,
+    "count": _count,
+    "distinct": _distinct,
+    "drop": _drop,
+}
+
+# Database methods: db.<method>(...)
+MONGO_DB_HANDLERS = {
+    "getCollectionNames": lambda db, command, stream, options: db.list_collection_names(),
+}
+
+
+# Methods whose results are cached; writes drop the cached results of their collection
+_MONGO_READS = {"find", "findOne", "aggregate", "countDocuments", "count", "distinct", "getCollectionNames"}
+_MONGO_WRITES = {"insertOne", "insertMany", "updateOne", "updateMany", "deleteOne", "deleteMany", "drop"}
+
+
+def _pipeline_collections(value, found: set, key: str) -> set:
+    """Collections named by ``$lookup``/``$graphLookup``/``$unionWith`` (key "from") or ``$out``/``$merge`` (key "to")."""
+    if isinstance(value, dict):
+        for name, item in value.items():
+            if key == "from" and name in ("$lookup", "$graphLookup") and isinstance(item, dict):
+                found.add(item.get("from"))
+            elif key == "from" and name == "$unionWith":
+                found.add(item.get("coll") if isinstance(item, dict) else item)
+            elif key == "to" and name in ("$out", "$merge"):
+                target = item.get("into", item.get("coll")) if isinstance(item, dict) else item
+                found.add(target if isinstance(target, str) else json.dumps(target, default=str))
+            _pipeline_collections(item, found, key)
+    elif isinstance(value, list):
+        for item in value:
+            _pipeline_collections(item, found, key)
+    found.discard(None)
+    return found
+
+
+def _mongo_writes(command) -> Optional[frozenset]:
+    """Collections a command writes, or None if it only reads."""
+    if command.method in _MONGO_WRITES:
+        return frozenset([command.collection])
+    if command.method == "aggregate":
+        targets = _pipeline_collections(command.args, set(), "to")
+        return frozenset(targets) if targets else None
+    return None
+
+
+def _mongo_cache_ticket(db_name: str, command, stream: bool, arrow: bool):
+    cache = get_result_cache()
+    if command.method not in _MONGO_READS or not cache.enabled:
+        return None
+    tables = None
+    if command.collection is not None:
+        tables = frozenset(_pipeline_collections(command.args, {command.collection}, "from"))
+    text = json.dumps(
+        [command.collection, command.method, command.args, command.chain, stream, arrow], default=str
+    )
+    return cache.ticket(f"mongodb:{db_name}", text, tables)
+
+
+def _user_limit(command) -> Optional[int]:
+    """The smallest limit a find chain or aggregate pipeline sets itself, if any."""
+    if command.method == "find":
+        limits = [int(call.args[0]) for call in command.chain if call.name == "limit" and call.args]
+    elif command.method == "aggregate" and command.args and isinstance(command.args[0], list):
+        limits = [stage["$limit"] for stage in command.args[0] if isinstance(stage, dict) and "$limit" in stage]
+    else:
+        limits = []
+    limits = [limit for limit in limits if limit]
+    return min(limits) if limits else None
+
+
+def _run_columnar(db_name: str, command, stream: bool, arrow: bool):
+    """Answer a read from the in-memory copy of the bundled JSON, or MISS to run it on the server."""
+    with span("columnar") as stage:
+        try:
+            result = get_columnar_store().run(db_name, command)
+        except Unsupported as e:
+            stage.set(supported=False, reason=str(e))
+            print(f"⚠️ Columnar engine: {e}, running on the server")
+            return MISS
+        stage.set(supported=True)
+    print("Answered by the columnar engine")
+    if not (isinstance(result, list) and command.method in ("find", "aggregate")):
+        return result
+    if stream:
+        limit = 0 if _user_limit(command) else MONGO_STREAM_DEFAULT_LIMIT
+        documents = result[:limit] if limit else result
+        return MongoStream(_CachedCursor(documents), MONGO_STREAM_BATCH_SIZE, limit)
+    if arrow:
+        return pa.Table.from_batches([documents_to_record_batch(result)])
+    return result
+
+
+def is_write_query(query: str, query_type: str) -> bool:
+    """Whether a generated SQL or MongoDB query changes data; unparsable queries count as reads."""
+    if query_type == "sql":
+        return not rewrite_sql(query).returns_rows
     try:
+        command = parse_mongo_query(query.strip())
+    except MongoSyntaxError:
+        return False
+    return _mongo_writes(command) is not None
+
+
+@traced("execute_mongodb")
+def execute_mongodb_query(
+    query: str,
+    database: str,
+    stream: bool = False,
+    token: str = None,
+    arrow: bool = False,
+    backend: str = None,
+):
+    """Run a MongoDB shell-style query.
+
+    With ``stream=True``, ``.find(`` and ``.aggregate(`` return a MongoStream
+    that reads documents lazily instead of a list; with ``arrow=True`` they
+    return a pyarrow Table (see arrow_results). Operations get a
+    QUERY_TIMEOUT_MS budget; passing a ``token`` tags them with it as comment
+    so query_control.cancel_query can kill them. Interrupted operations
+    return a string starting with "Timeout" or "Cancelled". ``backend``
+    overrides MONGO_BACKEND: with "columnar" the reads columnar_mongo
+    supports are answered in memory from the bundled JSON and the rest go
+    to the server.
+    """
+    try:
+        backend = backend or MONGO_BACKEND
         db_map = {
             "Bike Store": "bike_store",
             "AdventureWorks": "adventure_works",
@@ -133,211 +838,54 @@ def execute_mongodb_query(query: str, database: str):
         if not db_name:
             return "Error: Invalid database"
 
-        client = MongoClient("mongodb://localhost:27017/")
-        db = client[db_name]
-        query = query.strip().replace("\n", " ")
-
-        if query == "db.getCollectionNames()":
-            return db.list_collection_names()
-
-        if not query.startswith("db."):
-            return "Error: Invalid MongoDB query syntax"
-
-        collection_name = query.split(".")[1]
-
-        if ".insertOne(" in query:
-            doc_str = query.split(".insertOne(", 1)[1].rsplit(")", 1)[0]
-            cleaned = doc_str.replace("null", "None")
-            doc = ast.literal_eval(cleaned)
-            result = db[collection_name].insert_one(doc)
-            return {
-                "acknowledged": result.acknowledged,
-                "insertedId": str(result.inserted_id),
-            }
-
-        if ".insertMany(" in query:
-            docs_str = query.split(".insertMany(", 1)[1].rsplit(")", 1)[0]
-            cleaned = docs_str.replace("null", "None")
-            docs = ast.literal_eval(cleaned)
-            result = db[collection_name].insert_many(docs)
-            return {
-                "acknowledged": result.acknowledged,
-                "insertedIds": [str(_id) for _id in result.inserted_ids],
-            }
-
-        if ".updateOne(" in query:
-            args_str = (
-                query.split(".updateOne(", 1)[1]
-                .rsplit(")", 1)[0]
-                .replace("null", "None")
-            )
-            parts = args_str.split("},", 1)
-            if len(parts) != 2:
-                return "Error: Invalid updateOne syntax"
-            filter_dict = ast.literal_eval(parts[0] + "}")
-            update_dict = ast.literal_eval(parts[1].strip())
-            result = db[collection_name].update_one(filter_dict, update_dict)
-            return {
-                "acknowledged": result.acknowledged,
-                "matchedCount": result.matched_count,
-                "modifiedCount": result.modified_count,
-            }
-
-        if ".updateMany(" in query:
-            args_str = (
-                query.split(".updateMany(", 1)[1]
-                .rsplit(")", 1)[0]
-                .replace("null", "None")
-            )
-            parts = args_str.split("},", 1)
-            if len(parts) != 2:
-                return "Error: Invalid updateMany syntax"
-            filter_dict = ast.literal_eval(parts[0] + "}")
-            update_dict = ast.literal_eval(parts[1].strip())
-            result = db[collection_name].update_many(filter_dict, update_dict)
-            return {
-                "acknowledged": result.acknowledged,
-                "matchedCount": result.matched_count,
-                "modifiedCount": result.modified_count,
-            }
-
-        if ".deleteOne(" in query:
-            filter_dict = ast.literal_eval(
-                query.split(".deleteOne(", 1)[1]
-                .rsplit(")", 1)[0]
-                .replace("null", "None")
-            )
-            result = db[collection_name].delete_one(filter_dict)
-            return {
-                "acknowledged": result.acknowledged,
-                "deletedCount": result.deleted_count,
-            }
-
-        if ".deleteMany(" in query:
-            filter_dict = ast.literal_eval(
-                query.split(".deleteMany(", 1)[1]
-                .rsplit(")", 1)[0]
-                .replace("null", "None")
-            )
-            result = db[collection_name].delete_many(filter_dict)
-            return {
-                "acknowledged": result.acknowledged,
-                "deletedCount": result.deleted_count,
-            }
-
-        if ".countDocuments(" in query:
-            args_str = (
-                query.split(".countDocuments(", 1)[1]
-                .rsplit(")", 1)[0]
-                .replace("null", "None")
-            )
-            filter_dict = ast.literal_eval(args_str)
-            result = db[collection_name].count_documents(filter_dict)
-            return {"count": result}
-
-        if ".count(" in query:
-            args_str = (
-                query.split(".count(", 1)[1].rsplit(")", 1)[0].replace("null", "None")
-            )
-            filter_dict = ast.literal_eval(args_str)
-            result = db[collection_name].count_documents(filter_dict)
-            return {"count": result}
-
-        if ".drop(" in query:
-            db[collection_name].drop()
-            return {"dropped": True}
-
-        if ".distinct(" in query:
-            args_str = (
-                query.split(".distinct(", 1)[1]
-                .rsplit(")", 1)[0]
-                .replace("null", "None")
-            )
-            parts = args_str.split(",", 1)
-            field = ast.literal_eval(parts[0].strip())
-            filter_dict = ast.literal_eval(parts[1].strip()) if len(parts) > 1 else {}
-            result = db[collection_name].distinct(field, filter_dict)
-            return result
-
-        
-        if ".find(" in query:
+        try:
+            with span("parse"):
+                command = parse_mongo_query(query.strip())
+        except MongoSyntaxError as e:
+            return f"Error: Invalid MongoDB query syntax: {e}"
+
+        handlers = MONGO_HANDLERS if command.collection else MONGO_DB_HANDLERS
+        handler = handlers.get(command.method)
+        if handler is None:
+            return "Error: Unsupported MongoDB operation"
+
+        written = _mongo_writes(command)
+        if backend == "columnar" and not written:
+            result = _run_columnar(db_name, command, stream, arrow)
+            if result is not MISS:
+                return result
+
+        ticket = None if written else _mongo_cache_ticket(db_name, command, stream, arrow)
+        if ticket is not None:
+            cached = _cached_result(ticket)
+            if isinstance(cached, CachedDocuments):
+                return MongoStream(_CachedCursor(cached.documents), MONGO_STREAM_BATCH_SIZE, cached.limit)
+            if cached is not MISS:
+                return cached
+
+        db = get_mongo_client()[db_name]
+        options = {"comment": token} if token else {}
+        with span("execute", method=command.method), track_mongodb(token) as running:
             try:
-                segments = query.split(".")
-                collection_name = segments[1]
-                find_call = segments[2]
-
-                if not find_call.startswith("find("):
-                    return "Error: Invalid find syntax"
-
-                # Parse filter and projection
-                find_args = find_call[len("find(") : -1]
-                args_list = eval(f"[{find_args}]") if find_args else []
-                filter_dict = args_list[0] if len(args_list) > 0 else {}
-                projection_dict = args_list[1] if len(args_list) > 1 else {}
-
-                cursor = db[collection_name].find(filter_dict, projection_dict)
-
-                result_is_count = False  # track if count() is requested
-
-                # Process chained operations
-                for part in segments[3:]:
-                    if part.startswith("sort("):
-                        sort_dict = eval(part[len("sort(") : -1])
-                        if isinstance(sort_dict, dict):
-                            cursor = cursor.sort([(k, v) for k, v in sort_dict.items()])
-                    elif part.startswith("skip("):
-                        cursor = cursor.skip(int(part[len("skip(") : -1]))
-                    elif part.startswith("limit("):
-                        cursor = cursor.limit(int(part[len("limit(") : -1]))
-                    elif part.startswith("min("):
-                        min_dict = eval(part[len("min(") : -1])
-                        cursor = cursor.min(min_dict)
-                    elif part.startswith("max("):
-                        max_dict = eval(part[len("max(") : -1])
-                        cursor = cursor.max(max_dict)
-                    elif part.startswith("project("):
-                        proj_dict = eval(part[len("project(") : -1])
-                        cursor = cursor.project(proj_dict)
-                    elif part.startswith("count()"):
-                        result_is_count = True
-
-                return cursor.count() if result_is_count else list(cursor)
-
-            except Exception as e:
-                return f"Error executing MongoDB .find(): {e}"
-
-        if ".aggregate(" in query:
-            try:
-                import re
-
-                # Extract collection name
-                collection_match = re.match(r"db\.(\w+)\.aggregate", query)
-                if not collection_match:
-                    return "Error: Could not determine collection name"
-                collection_name = collection_match.group(1)
-
-                # Extract content inside aggregate([...])
-                agg_match = re.search(r"\.aggregate\(\s*(\[[\s\S]*\])\s*\)", query)
-                if not agg_match:
-                    return "Error: Could not parse aggregate pipeline"
-
-                pipeline_str = agg_match.group(1).strip()
-                # parse_mongo_js_object(): Custom function using json5.loads() to safely convert JavaScript-like syntax into Python dictionaries/lists.
-                pipeline = parse_mongo_js_object(pipeline_str)
-
-                return list(db[collection_name].aggregate(pipeline))
-
-            except Exception as e:
-                return f"Error executing MongoDB .aggregate(): {e}"
-
-        if ".findOne(" in query:
-            filter_dict = ast.literal_eval(
-                query.split(".findOne(", 1)[1].rsplit(")", 1)[0].replace("null", "None")
-            )
-            return db[collection_name].find_one(filter_dict)
-
-        return "Error: Unsupported MongoDB operation"
+                with pymongo.timeout(QUERY_TIMEOUT_MS / 1000 if QUERY_TIMEOUT_MS else None):
+                    result = handler(db, command, stream, options)
+                    if arrow and isinstance(result, list) and command.method in ("find", "aggregate"):
+                        result = pa.Table.from_batches([documents_to_record_batch(result)])
+            except PyMongoError as e:
+                status = interruption_status(e, running)
+                if status is None:
+                    raise
+                return status
+            finally:
+                if written:
+                    _invalidate(f"mongodb:{db_name}", written)
+                    get_columnar_store().mark_stale(db_name, written)
+
+        if isinstance(result, MongoStream):
+            result.cache_ticket = ticket
+        elif ticket is not None and not isinstance(result, str):
+            get_result_cache().set(ticket, result)
+        return result
 
     except Exception as e:
         return f"Error executing MongoDB query: {e}"
-
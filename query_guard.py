@@ -0,0 +1,118 @@
+import os
+import threading
+from typing import NamedTuple, Optional
+
+# Cost guard thresholds, in estimated rows / documents scanned (override with environment variables)
+QUERY_GUARD = os.getenv("QUERY_GUARD", "1") != "0"
+GUARD_REFUSE_ROWS = int(os.getenv("GUARD_REFUSE_ROWS", "10000000"))  # refuse above this
+GUARD_LIMIT_ROWS = int(os.getenv("GUARD_LIMIT_ROWS", "100000"))  # cap the result above this
+GUARD_ROW_LIMIT = int(os.getenv("GUARD_ROW_LIMIT", "1000"))  # rows returned by a capped query
+
+
+class GuardDecision(NamedTuple):
+    action: str  # "allow", "limit" or "refuse"
+    estimated_rows: Optional[int]
+    limit: Optional[int]  # row cap to apply when action is "limit"
+    reason: str
+
+
+_stats_lock = threading.Lock()
+_stats = {"checked": 0, "allowed": 0, "limited": 0, "refused": 0, "explain_errors": 0}
+
+
+def _record(decision: GuardDecision, label: str) -> GuardDecision:
+    with _stats_lock:
+        _stats["checked"] += 1
+        _stats[{"allow": "allowed", "limit": "limited", "refuse": "refused"}[decision.action]] += 1
+    print(f"Query guard ({label}): {decision.action} - {decision.reason}")
+    return decision
+
+
+def _decide(estimated: int, current_limit: Optional[int], unit: str) -> GuardDecision:
+    if estimated > GUARD_REFUSE_ROWS:
+        reason = f"~{estimated:,} {unit} scanned, over the {GUARD_REFUSE_ROWS:,} refusal threshold"
+        return GuardDecision("refuse", estimated, None, reason)
+    if estimated > GUARD_LIMIT_ROWS and (current_limit is None or current_limit > GUARD_ROW_LIMIT):
+        reason = f"~{estimated:,} {unit} scanned, result capped at {GUARD_ROW_LIMIT:,}"
+        return GuardDecision("limit", estimated, GUARD_ROW_LIMIT, reason)
+    return GuardDecision("allow", estimated, None, f"~{estimated:,} {unit} scanned")
+
+
+def _explain_error(label: str, error: Exception) -> GuardDecision:
+    with _stats_lock:
+        _stats["explain_errors"] += 1
+    return _record(GuardDecision("allow", None, None, f"no estimate ({error})"), label)
+
+
+def estimate_sql_rows(explain_rows: list, columns: list) -> int:
+    """Rows examined according to tabular EXPLAIN output.
+
+    Within one SELECT id tables are joined as nested loops, so each table is
+    read once per row surviving the tables before it (``rows * filtered``).
+    """
+    id_col, rows_col = columns.index("id"), columns.index("rows")
+    filtered_col = columns.index("filtered") if "filtered" in columns else None
+    examined = 0.0
+    prefixes = {}
+    for row in explain_rows:
+        rows = float(row[rows_col] or 1)
+        filtered = float(row[filtered_col] or 100) if filtered_col is not None else 100.0
+        prefix = prefixes.get(row[id_col], 1.0)
+        examined += prefix * rows
+        prefixes[row[id_col]] = prefix * rows * filtered / 100.0
+    return int(examined)
+
+
+def check_sql(cursor, statement) -> GuardDecision:
+    """Run EXPLAIN for a rewritten SELECT and decide whether to run, cap or refuse it.
+
+    ``statement`` is a sql_rewriter.RewrittenSQL; other statement kinds are allowed.
+    """
+    if not QUERY_GUARD or statement.kind not in ("SELECT", "WITH"):
+        return GuardDecision("allow", None, None, "not checked")
+    try:
+        cursor.execute(f"EXPLAIN {statement.sql}")
+        explain_rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+        estimated = estimate_sql_rows(explain_rows, columns)
+    except Exception as e:
+        return _explain_error("sql", e)
+    return _record(_decide(estimated, statement.limit, "rows"), "sql")
+
+
+def _has_collection_scan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collection_scan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collection_scan(value) for value in plan)
+    return False
+
+
+def check_mongo(db, collection: str, command: dict, current_limit: Optional[int] = None) -> GuardDecision:
+    """Explain a find/aggregate ``command`` document and decide whether to run, cap or refuse it.
+
+    The query planner only says whether the collection is scanned, so a
+    collection scan is estimated at the collection's document count.
+    """
+    if not QUERY_GUARD:
+        return GuardDecision("allow", None, None, "not checked")
+    try:
+        plan = db.command("explain", command, verbosity="queryPlanner")
+        if not _has_collection_scan(plan):
+            return _record(GuardDecision("allow", None, None, "index scan"), "mongodb")
+        estimated = db[collection].estimated_document_count()
+    except Exception as e:
+        return _explain_error("mongodb", e)
+    return _record(_decide(estimated, current_limit, "documents"), "mongodb")
+
+
+def guard_stats() -> dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "refuse_rows": GUARD_REFUSE_ROWS,
+            "limit_rows": GUARD_LIMIT_ROWS,
+            "row_limit": GUARD_ROW_LIMIT,
+        }
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+# Result cache limits (override with environment variables)
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES", str(64 << 20)))  # total size, 0 = no caching
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(8 << 20)))  # larger results are not kept
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))  # seconds, 0 = until invalidated
+
+# Returned by ResultCache.get on a miss (None is a valid result, e.g. findOne)
+MISS = object()
+
+
+class CacheTicket(NamedTuple):
+    """Key of a read plus the write versions it was looked up at."""
+
+    key: str
+    database: str
+    tables: Optional[frozenset]  # None = depends on the whole database
+    versions: tuple
+
+
+def result_size(value) -> int:
+    """Approximate size of a cached result in bytes."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+class ResultCache:
+    """LRU of query results bounded in bytes, invalidated per table/collection on writes.
+
+    A write bumps the version of its tables, and a result is only stored if
+    the versions it was looked up at are still current, so a read that
+    overlaps a write never caches what it saw before the write.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_BYTES,
+        max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES,
+        ttl: float = RESULT_CACHE_TTL,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, tables, database, stored_at)
+        self._bytes = 0
+        self._versions = {}  # (database, table) -> writes seen; "*" counts every write to the database
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0, "skipped": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _snapshot(self, database: str, tables: Optional[frozenset]) -> tuple:
+        names = ("*",) if tables is None else ("**",) + tuple(sorted(tables))
+        return tuple(self._versions.get((database, name), 0) for name in names)
+
+    def ticket(self, database: str, text: str, tables: Optional[frozenset]) -> CacheTicket:
+        """Ticket for a read of ``tables`` (None = the whole database) identified by normalized ``text``."""
+        key = hashlib.sha256(json.dumps([database, text]).encode("utf-8")).hexdigest()
+        with self._lock:
+            return CacheTicket(key, database, tables, self._snapshot(database, tables))
+
+    def _drop(self, key: str):
+        value, size, *_ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, ticket: CacheTicket):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(ticket.key)
+            if entry is not None:
+                if not (self.ttl > 0 and now - entry[4] > self.ttl):
+                    self._entries.move_to_end(ticket.key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                self._drop(ticket.key)
+            self._stats["misses"] += 1
+            return MISS
+
+    def set(self, ticket: CacheTicket, value, size: Optional[int] = None) -> bool:
+        if not self.enabled:
+            return False
+        size = result_size(value) if size is None else size
+        with self._lock:
+            if size > self.max_entry_bytes or self._snapshot(ticket.database, ticket.tables) != ticket.versions:
+                self._stats["skipped"] += 1
+                return False
+            if ticket.key in self._entries:
+                self._drop(ticket.key)
+            self._entries[ticket.key] = (value, size, ticket.tables, ticket.database, time.time())
+            self._bytes += size
+            self._stats["stores"] += 1
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+            return True
+
+    def invalidate(self, database: str, tables: Optional[frozenset] = None) -> int:
+        """Forget results that read ``tables`` (None = every table) of ``database``; returns how many."""
+        with self._lock:
+            names = ["*"] + (["**"] if tables is None else list(tables))
+            for name in names:
+                self._versions[(database, name)] = self._versions.get((database, name), 0) + 1
+            stale = [
+                key
+                for key, (_, _, entry_tables, entry_database, _) in self._entries.items()
+                if entry_database == database
+                and (tables is None or entry_tables is None or entry_tables & tables)
+            ]
+            for key in stale:
+                self._drop(key)
+            self._stats["invalidations"] += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+_result_cache = ResultCache()
+
+
+def get_result_cache() -> ResultCache:
+    return _result_cache
+
+
+def result_cache_stats() -> dict:
+    return _result_cache.stats()
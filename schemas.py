@@ -1,7 +1,7 @@
 schemas = {
     "adventure_works": {
         "sql": """
-Table: Product
+Table: product
 Fields:
 - ProductKey (PK)
 - Product
@@ -58,6 +58,12 @@ Foreign Keys:
 - sales.ProductKey → product.ProductKey
 - sales.ResellerKey → reseller.ResellerKey
 """,
+        # Words in a question that point at each table / collection
+        "keywords": {
+            "product": ["cost", "color", "colour", "subcategory", "category", "item"],
+            "reseller": ["business", "shop", "store", "country", "region", "city", "state"],
+            "sales": ["sale", "sold", "revenue", "amount", "quantity", "order", "price", "territory", "employee", "date"],
+        },
     },
     "bike_store": {
         "sql": """
@@ -119,6 +125,12 @@ Foreign Keys:
 - orders.customer_id → customers.customer_id
 - products.product_id → orders.product_id
 """,
+        # Words in a question that point at each table / collection
+        "keywords": {
+            "customers": ["client", "buyer", "email", "phone", "street", "address", "city", "state", "zip"],
+            "orders": ["placed", "purchase", "bought", "status", "shipped", "shipping", "required", "staff", "date"],
+            "products": ["price", "cost", "brand", "category", "model", "item"],
+        },
     },
     "fifa": {
         "sql": """
@@ -173,5 +185,11 @@ Foreign Keys:
 
 Note: home_team_id, away_team_id reference external team data (no teams collection).
 """,
+        # Words in a question that point at each table / collection
+        "keywords": {
+            "players": ["born", "birth", "birthday", "family", "given", "name", "tournaments"],
+            "matches": ["game", "played", "tournament", "home", "away", "date", "team"],
+            "goals": ["scored", "score", "scorer", "minute", "team"],
+        },
     },
 }
@@ -0,0 +1,222 @@
+import math
+import os
+import re
+import threading
+from collections import deque
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from generation_cache import normalize_question
+
+# Minimum cosine similarity for a past question to be reused (override with environment variables)
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.85"))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "5000"))  # per database and query type
+NGRAM_RANGE = (3, 5)
+
+# Candidate thresholds reported in stats() so the configured one can be tuned
+_TUNING_THRESHOLDS = (0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+
+# Words that do not change which query answers a question
+_FILLER_WORDS = {
+    "a", "all", "an", "and", "any", "are", "can", "display", "do", "every",
+    "fetch", "find", "for", "from", "get", "give", "i", "is", "list", "me",
+    "of", "please", "retrieve", "return", "see", "show", "tell", "the",
+    "to", "view", "want", "what", "which", "with", "you",
+}
+_LITERAL_PATTERN = re.compile(r"\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"")
+
+
+class SimilarMatch(NamedTuple):
+    query: str
+    score: float
+    question: str
+
+
+def _ngrams(text: str) -> dict:
+    padded = f" {text} "
+    counts = {}
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i : i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def _content_text(normalized: str) -> str:
+    words = []
+    for word in normalized.split():
+        if word in _FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+class _Bucket:
+    """Past questions for one (database, query_type) pair and their TF-IDF matrix."""
+
+    def __init__(self):
+        self.entries = []  # dicts with question, normalized, literals, query, grams
+        self.positions = {}  # normalized question -> index in entries
+        self.vocabulary = {}
+        self.idf = None
+        self.matrix = None
+        self.dirty = True
+
+    def rebuild(self):
+        vocabulary = {}
+        doc_freq = []
+        for entry in self.entries:
+            for gram in entry["grams"]:
+                col = vocabulary.get(gram)
+                if col is None:
+                    vocabulary[gram] = len(doc_freq)
+                    doc_freq.append(1)
+                else:
+                    doc_freq[col] += 1
+
+        n_docs = len(self.entries)
+        idf = np.log((1 + n_docs) / (1 + np.asarray(doc_freq, dtype=np.float64))) + 1.0
+        matrix = np.zeros((n_docs, len(vocabulary)), dtype=np.float64)
+        for row, entry in enumerate(self.entries):
+            cols = [vocabulary[gram] for gram in entry["grams"]]
+            matrix[row, cols] = list(entry["grams"].values())
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.matrix = matrix
+        self.dirty = False
+
+    def vectorize(self, grams: dict) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary), dtype=np.float64)
+        unseen_idf = math.log(1 + len(self.entries)) + 1.0
+        unseen_norm = 0.0
+        for gram, count in grams.items():
+            col = self.vocabulary.get(gram)
+            if col is None:
+                unseen_norm += (count * unseen_idf) ** 2
+            else:
+                vector[col] = count * self.idf[col]
+        # n-grams never seen before still count towards the length of the vector
+        norm = math.sqrt(float(vector @ vector) + unseen_norm)
+        return vector / norm if norm else vector
+
+
+class QuestionIndex:
+    """Local character n-gram TF-IDF index over questions with validated queries.
+
+    Questions are compared on their content words only (filler such as
+    "list", "show" or "from" is dropped), and a past query is only reused when
+    it scores above the threshold and mentions the same literals (numbers,
+    quoted strings).
+    """
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_entries: int = SIMILARITY_MAX_ENTRIES,
+        score_history: int = 1000,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._scores = deque(maxlen=score_history)  # best score of recent lookups
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "rejected": 0}
+
+    def add(self, question: str, database: str, query_type: str, query: str):
+        normalized = normalize_question(question)
+        if not normalized or not query:
+            return
+        entry = {
+            "question": question,
+            "normalized": normalized,
+            "literals": sorted(_LITERAL_PATTERN.findall(question.lower())),
+            "query": query,
+            "grams": _ngrams(_content_text(normalized)),
+        }
+        with self._lock:
+            bucket = self._buckets.setdefault((database, query_type), _Bucket())
+            position = bucket.positions.get(normalized)
+            if position is not None:
+                bucket.entries[position] = entry
+                bucket.dirty = True
+                return
+            if len(bucket.entries) >= self.max_entries:
+                bucket.entries.pop(0)
+                bucket.positions = {
+                    e["normalized"]: i for i, e in enumerate(bucket.entries)
+                }
+            bucket.positions[normalized] = len(bucket.entries)
+            bucket.entries.append(entry)
+            bucket.dirty = True
+
+    def lookup(
+        self, question: str, database: str, query_type: str, threshold: Optional[float] = None
+    ) -> Optional[SimilarMatch]:
+        threshold = self.threshold if threshold is None else threshold
+        normalized = normalize_question(question)
+        with self._lock:
+            self._stats["lookups"] += 1
+            bucket = self._buckets.get((database, query_type))
+            if bucket is None or not bucket.entries or not normalized:
+                self._scores.append(0.0)
+                self._stats["misses"] += 1
+                return None
+            if bucket.dirty:
+                bucket.rebuild()
+
+            scores = bucket.matrix @ bucket.vectorize(_ngrams(_content_text(normalized)))
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            entry = bucket.entries[best]
+            self._scores.append(score)
+
+            if score < threshold:
+                self._stats["misses"] += 1
+                return None
+            literals = sorted(_LITERAL_PATTERN.findall(question.lower()))
+            if entry["literals"] != literals:
+                self._stats["rejected"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["hits"] += 1
+            return SimilarMatch(entry["query"], score, entry["question"])
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            scores = np.asarray(self._scores, dtype=np.float64)
+            return {
+                **self._stats,
+                "entries": sum(len(b.entries) for b in self._buckets.values()),
+                "threshold": self.threshold,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                # share of recent lookups whose best score clears each threshold
+                "score_rate_at": {
+                    t: float((scores >= t).mean()) if scores.size else 0.0
+                    for t in _TUNING_THRESHOLDS
+                },
+            }
+
+
+_question_index = None
+_question_index_lock = threading.Lock()
+
+
+def get_question_index() -> QuestionIndex:
+    global _question_index
+    with _question_index_lock:
+        if _question_index is None:
+            _question_index = QuestionIndex()
+        return _question_index
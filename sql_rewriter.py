@@ -0,0 +1,562 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+# Rewritten statements kept in memory (override with environment variables)
+SQL_REWRITE_CACHE_SIZE = int(os.getenv("SQL_REWRITE_CACHE_SIZE", "1024"))
+
+_FENCE_PATTERN = re.compile(r"```(?:sql|javascript)?\s*|\s*```")
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    |(?P<quoted>`(?:[^`]|``)*`)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<word>[A-Za-z_@$][A-Za-z0-9_@$]*)
+    |(?P<op>\|\||<=>|<=|>=|<>|!=|:=|<<|>>|&&|[-+*/%=<>!~^&|.,;()?:])
+    |(?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Text only the full tokenizer handles: double quotes, backticks, escapes, comments, ||, separators
+_NEEDS_PARSE_PATTERN = re.compile(r"[\"`#;\\]|--|/\*|\|\|")
+_FLAT_TOKEN_PATTERN = re.compile(
+    r"'[^']*'|[A-Za-z_@$][A-Za-z0-9_@$]*|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|[(),.]"
+)
+_SPACE_PATTERN = re.compile(r"\s+")
+_QUALIFIED_TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO|TABLE)\s+[A-Za-z_@$][A-Za-z0-9_@$]*\s*\.", re.IGNORECASE)
+
+# Words that can never be an operand of ||
+_KEYWORDS = {
+    "ALL", "AND", "AS", "ASC", "BETWEEN", "BY", "CASE", "DESC", "DISTINCT",
+    "ELSE", "END", "EXISTS", "FOR", "FROM", "GROUP", "HAVING", "IN", "INTO",
+    "IS", "JOIN", "LIKE", "LIMIT", "NOT", "OFFSET", "ON", "OR", "ORDER",
+    "REGEXP", "SELECT", "SET", "THEN", "UNION", "UPDATE", "USING", "VALUES",
+    "WHEN", "WHERE", "WITH",
+}
+# Keywords followed by a table reference
+_TABLE_KEYWORDS = {"FROM", "JOIN", "UPDATE", "INTO", "TABLE"}
+# Clauses that end a SELECT list or FROM list
+_CLAUSE_KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION",
+    "ON", "USING", "SET", "VALUES", "FOR",
+}
+# Statements whose result is a set of rows
+_ROW_STATEMENTS = {"SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"}
+# Functions whose value changes between two runs of the same statement
+_VOLATILE_FUNCTIONS = {
+    "NOW", "CURDATE", "CURTIME", "SYSDATE", "UNIX_TIMESTAMP", "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP",
+    "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP",
+    "RAND", "RANDOM", "UUID", "UUID_SHORT", "CONNECTION_ID", "LAST_INSERT_ID", "ROW_COUNT", "FOUND_ROWS",
+    "SLEEP", "BENCHMARK",
+}
+# Volatile functions that may be written without parentheses
+_VOLATILE_WORDS = {
+    "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP",
+    "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP",
+}
+
+
+class Token(NamedTuple):
+    kind: str
+    value: str
+
+    @property
+    def keyword(self) -> str:
+        return self.value.upper() if self.kind == "word" else ""
+
+
+class RewrittenSQL(NamedTuple):
+    sql: str
+    kind: str  # first keyword of the statement, upper-cased
+    rewrites: tuple  # names of the rewrites that changed the statement
+    limit: Optional[int]  # row count of the top-level LIMIT, if any
+    tables: frozenset = frozenset()  # lower-cased names of the tables the statement reads or writes
+    volatile: bool = False  # calls NOW(), RAND(), UUID() or another function whose value changes per run
+
+    @property
+    def returns_rows(self) -> bool:
+        return self.kind in _ROW_STATEMENTS
+
+
+class RewriteContext(NamedTuple):
+    schema: Optional[str]
+    tables: frozenset  # lower-cased table names of ``schema``
+    limit: Optional[int]
+    timeout_ms: Optional[int]
+
+
+def tokenize(sql: str) -> list:
+    """Split SQL into tokens; whitespace and line comments are dropped."""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "space":
+            continue
+        if kind == "comment" and not value.startswith(("/*!", "/*+")):
+            # Only optimizer hints and version comments reach MySQL
+            continue
+        tokens.append(Token(kind, value))
+    return tokens
+
+
+def parse(sql: str) -> list:
+    """Tokenize SQL into a tree: parenthesised groups become nested lists."""
+    root = []
+    stack = [root]
+    for token in tokenize(sql):
+        if token.value == "(":
+            group = []
+            stack[-1].append(group)
+            stack.append(group)
+        elif token.value == ")" and len(stack) > 1:
+            stack.pop()
+        else:
+            stack[-1].append(token)
+    return root
+
+
+def emit(nodes: list) -> str:
+    """Turn a parse tree back into a single-line MySQL statement."""
+    parts = []
+    previous = None
+    unary = False  # previous token is a sign, e.g. the "-" of "-1"
+    for node in nodes:
+        if isinstance(node, list):
+            text = "(" + emit(node) + ")"
+            glue = previous is not None and not (
+                unary or previous.value == "." or (previous.kind == "word" and previous.keyword not in _KEYWORDS)
+            )
+            previous, unary = Token("op", ")"), False
+        else:
+            text = node.value
+            glue = (
+                previous is not None
+                and not unary
+                and node.value not in (",", ".", ";")
+                and previous.value != "."
+            )
+            unary = node.value in ("-", "+") and (
+                previous is None or (previous.kind == "op" and previous.value != ")") or previous.keyword in _KEYWORDS
+            )
+            previous = node
+        if glue:
+            parts.append(" ")
+        parts.append(text)
+    return "".join(parts)
+
+
+def _statement_kind(nodes: list) -> str:
+    for node in nodes:
+        if isinstance(node, list):
+            return _statement_kind(node)
+        if node.kind == "word":
+            return node.keyword
+    return ""
+
+
+def _primary_end(nodes: list, start: int) -> Optional[int]:
+    """End index of the operand starting at ``start``: a literal, a (qualified)
+    name, a function call or a parenthesised expression."""
+    if start >= len(nodes):
+        return None
+    node = nodes[start]
+    if isinstance(node, list):
+        return start + 1
+    if node.kind in ("string", "number"):
+        return start + 1
+    if node.kind not in ("word", "quoted") or node.keyword in _KEYWORDS:
+        return None
+    end = start + 1
+    while (
+        end + 1 < len(nodes)
+        and isinstance(nodes[end], Token)
+        and nodes[end].value == "."
+        and isinstance(nodes[end + 1], Token)
+        and nodes[end + 1].kind in ("word", "quoted")
+    ):
+        end += 2
+    if end < len(nodes) and isinstance(nodes[end], list):
+        end += 1  # function call
+    return end
+
+
+def _is_concat(node) -> bool:
+    return isinstance(node, Token) and node.value == "||"
+
+
+def _join_operands(operands: list) -> list:
+    arguments = []
+    for operand in operands:
+        if arguments:
+            arguments.append(Token("op", ","))
+        arguments.extend(operand)
+    return arguments
+
+
+def rewrite_concat(nodes: list, context: RewriteContext) -> list:
+    """Turn ``a || ' ' || b`` into ``CONCAT(a, ' ', b)``.
+
+    MySQL reads || as a logical OR, so a chain is only rewritten inside a
+    SELECT list or when one of its operands is a string literal.
+    """
+    rewritten = []
+    clause = ""
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        if isinstance(node, list):
+            node = rewrite_concat(node, context)
+        elif node.keyword in _CLAUSE_KEYWORDS:
+            clause = node.keyword
+
+        end = _primary_end(nodes, i)
+        if end is None or end >= len(nodes) or not _is_concat(nodes[end]):
+            rewritten.append(node)
+            i += 1
+            continue
+
+        operands = [nodes[i:end]]
+        while end < len(nodes) and _is_concat(nodes[end]):
+            next_end = _primary_end(nodes, end + 1)
+            if next_end is None:
+                break
+            operands.append(nodes[end + 1 : next_end])
+            end = next_end
+        has_string = any(len(op) == 1 and isinstance(op[0], Token) and op[0].kind == "string" for op in operands)
+        if len(operands) < 2 or not (clause == "SELECT" or has_string):
+            rewritten.append(node)
+            i += 1
+            continue
+
+        operands = [[rewrite_concat(n, context) if isinstance(n, list) else n for n in op] for op in operands]
+        rewritten.append(Token("word", "CONCAT"))
+        rewritten.append(_join_operands(operands))
+        i = end
+    return rewritten
+
+
+def _unquote(node) -> str:
+    return node.value.strip("`").lower()
+
+
+def qualify_tables(nodes: list, context: RewriteContext) -> list:
+    """Point ``OtherName.table`` references at the connection's schema.
+
+    Models often qualify tables with the dataset name ("BikeStore.customers")
+    instead of the MySQL schema; unqualified tables are left alone.
+    """
+    if not context.schema or not context.tables:
+        return nodes
+    rewritten = []
+    expect_table = False
+    in_from = False
+    for i, node in enumerate(nodes):
+        if isinstance(node, list):
+            rewritten.append(qualify_tables(node, context))
+            expect_table = False
+            continue
+        if (
+            expect_table
+            and node.kind in ("word", "quoted")
+            and i + 2 < len(nodes)
+            and isinstance(nodes[i + 1], Token)
+            and nodes[i + 1].value == "."
+            and isinstance(nodes[i + 2], Token)
+            and _unquote(nodes[i + 2]) in context.tables
+            and _unquote(node) != context.schema.lower()
+        ):
+            node = Token("word", context.schema)
+        keyword = node.keyword
+        if keyword in _CLAUSE_KEYWORDS:
+            in_from = keyword == "FROM"
+        expect_table = keyword in _TABLE_KEYWORDS or (in_from and node.value == ",")
+        rewritten.append(node)
+    return rewritten
+
+
+def _table_names(nodes: list, found: set) -> set:
+    """Collect the tables referenced after FROM/JOIN/UPDATE/INTO/TABLE, without schema qualifiers."""
+    expect_table = False
+    in_from = False
+    for i, node in enumerate(nodes):
+        if isinstance(node, list):
+            _table_names(node, found)
+            expect_table = False
+            continue
+        if expect_table and node.kind in ("word", "quoted") and node.keyword not in _KEYWORDS:
+            name = node
+            if (
+                i + 2 < len(nodes)
+                and isinstance(nodes[i + 1], Token)
+                and nodes[i + 1].value == "."
+                and isinstance(nodes[i + 2], Token)
+            ):
+                name = nodes[i + 2]
+            found.add(_unquote(name))
+        keyword = node.keyword
+        if keyword in _CLAUSE_KEYWORDS:
+            in_from = keyword == "FROM"
+        expect_table = keyword in _TABLE_KEYWORDS or (in_from and node.value == ",")
+    return found
+
+
+def _is_volatile(nodes: list) -> bool:
+    """Whether the statement calls a function like NOW() or RAND() anywhere."""
+    for i, node in enumerate(nodes):
+        if isinstance(node, list):
+            if _is_volatile(node):
+                return True
+        elif node.keyword in _VOLATILE_WORDS or (
+            node.keyword in _VOLATILE_FUNCTIONS and i + 1 < len(nodes) and isinstance(nodes[i + 1], list)
+        ):
+            return True
+    return False
+
+
+def _limit_position(nodes: list) -> Optional[int]:
+    """Index of the row count of the top-level LIMIT (``LIMIT n``,
+    ``LIMIT offset, n`` or ``LIMIT n OFFSET m``), or None."""
+    for i, node in enumerate(nodes):
+        if isinstance(node, Token) and node.keyword == "LIMIT":
+            position = i + 3 if i + 2 < len(nodes) and nodes[i + 2] == Token("op", ",") else i + 1
+            if position < len(nodes) and isinstance(nodes[position], Token) and nodes[position].kind == "number":
+                return position
+            return None
+    return None
+
+
+def _top_level_limit(nodes: list) -> Optional[int]:
+    position = _limit_position(nodes)
+    return int(float(nodes[position].value)) if position is not None else None
+
+
+def inject_limit(nodes: list, context: RewriteContext) -> list:
+    """Add ``LIMIT n`` to a SELECT without a top-level LIMIT, or lower a larger one."""
+    if context.limit is None or _statement_kind(nodes) not in ("SELECT", "WITH"):
+        return nodes
+    if any(isinstance(node, Token) and node.keyword == "LIMIT" for node in nodes):
+        position = _limit_position(nodes)
+        if position is None or int(float(nodes[position].value)) <= context.limit:
+            return nodes
+        return nodes[:position] + [Token("number", str(context.limit))] + nodes[position + 1 :]
+    limit = [Token("word", "LIMIT"), Token("number", str(context.limit))]
+    for i, node in enumerate(nodes):
+        if isinstance(node, Token) and node.keyword == "FOR":
+            return nodes[:i] + limit + nodes[i:]
+    return nodes + limit
+
+
+def add_max_execution_time(nodes: list, context: RewriteContext) -> list:
+    """Add a ``MAX_EXECUTION_TIME`` optimizer hint to the top-level SELECT."""
+    if not context.timeout_ms:
+        return nodes
+    if any(isinstance(node, Token) and "MAX_EXECUTION_TIME" in node.value.upper() for node in nodes):
+        return nodes
+    for i, node in enumerate(nodes):
+        if isinstance(node, Token) and node.keyword == "SELECT":
+            hint = Token("comment", f"/*+ MAX_EXECUTION_TIME({int(context.timeout_ms)}) */")
+            return nodes[: i + 1] + [hint] + nodes[i + 1 :]
+    return nodes
+
+
+# Applied in order; each takes and returns a parse tree. A rewrite is skipped
+# when its marker text does not occur in the query.
+SQL_REWRITES = [
+    ("concat", rewrite_concat, "||"),
+    ("qualify_tables", qualify_tables, "."),
+    ("limit", inject_limit, None),
+    ("max_execution_time", add_max_execution_time, None),
+]
+
+
+def _flat_rewrite(text: str, context: RewriteContext) -> Optional[RewrittenSQL]:
+    """Rewrite a statement without building a parse tree, or None if it needs one.
+
+    Covers statements no tree rewrite changes (no ``||``, no table to
+    qualify) made of words, numbers and plain single-quoted strings; the
+    LIMIT and MAX_EXECUTION_TIME rewrites are spliced into the text.
+    Whitespace outside strings is collapsed, other spacing is kept.
+    """
+    text = text.strip()
+    while text.endswith(";"):
+        text = text[:-1].rstrip()
+    if not text[:1].isalpha() or text.count("'") % 2 or _NEEDS_PARSE_PATTERN.search(text):
+        return None
+    qualify = bool(context.schema and context.tables)
+    if qualify and _QUALIFIED_TABLE_PATTERN.search(text):
+        return None
+    parts = text.split("'")  # even parts are outside strings
+    parts[::2] = [_SPACE_PATTERN.sub(" ", part) for part in parts[::2]]
+    text = "'".join(parts)
+    tokens = _FLAT_TOKEN_PATTERN.findall(text)
+    kind = tokens[0].upper()
+    tables = set()
+    volatile = hinted = False
+    limit_at = for_at = select_at = None  # token indexes
+    in_from = [False]  # per nesting level, as _table_names recurses
+    expect_table = False
+    for i, value in enumerate(tokens):
+        if value == "(":
+            volatile = volatile or (i > 0 and tokens[i - 1].upper() in _VOLATILE_FUNCTIONS)
+            in_from.append(False)
+            expect_table = False
+            continue
+        if value == ")":
+            if len(in_from) > 1:
+                in_from.pop()
+            expect_table = False
+            continue
+        keyword = value.upper() if value[0].isalpha() or value[0] in "_@$" else ""
+        if expect_table and keyword and keyword not in _KEYWORDS:
+            if i + 1 < len(tokens) and tokens[i + 1] == ".":
+                if qualify:
+                    return None  # qualify_tables may apply
+                if i + 2 < len(tokens) and tokens[i + 2] not in "()":
+                    value = tokens[i + 2]
+            tables.add(value.strip("`").lower())
+        volatile = volatile or keyword in _VOLATILE_WORDS
+        if len(in_from) == 1:
+            if keyword == "LIMIT" and limit_at is None:
+                limit_at = i + 3 if i + 2 < len(tokens) and tokens[i + 2] == "," else i + 1
+                if limit_at >= len(tokens) or tokens[limit_at][0] not in "0123456789.":
+                    return None
+            elif keyword == "FOR" and for_at is None:
+                for_at = i
+            elif keyword == "SELECT" and select_at is None:
+                select_at = i
+            hinted = hinted or "MAX_EXECUTION_TIME" in keyword
+        if keyword in _CLAUSE_KEYWORDS:
+            in_from[-1] = keyword == "FROM"
+        expect_table = keyword in _TABLE_KEYWORDS or (in_from[-1] and value == ",")
+
+    applied = []
+    limit = int(float(tokens[limit_at])) if limit_at is not None else None
+    add_limit = context.limit is not None and kind in ("SELECT", "WITH") and (limit is None or limit > context.limit)
+    add_hint = bool(context.timeout_ms) and select_at is not None and not hinted
+    spans = []
+    if (add_limit and (limit_at is not None or for_at is not None)) or (add_hint and select_at > 0):
+        spans = [match.span() for match in _FLAT_TOKEN_PATTERN.finditer(text)]
+    if add_limit:
+        if limit_at is not None:
+            start, end = spans[limit_at]
+            text = text[:start] + str(context.limit) + text[end:]
+        elif for_at is not None:
+            start = spans[for_at][0]
+            text = f"{text[:start]}LIMIT {context.limit} {text[start:]}"
+        else:
+            text = f"{text} LIMIT {context.limit}"
+        limit = context.limit
+        applied.append("limit")
+    if add_hint:
+        # The limit splice comes after SELECT, so its offsets still hold
+        end = spans[select_at][1] if select_at > 0 else len(tokens[0])
+        text = f"{text[:end]} /*+ MAX_EXECUTION_TIME({int(context.timeout_ms)}) */{text[end:]}"
+        applied.append("max_execution_time")
+    return RewrittenSQL(text, kind, tuple(applied), limit, frozenset(tables), volatile)
+
+
+def _rewrite(query: str, context: RewriteContext) -> RewrittenSQL:
+    text = _FENCE_PATTERN.sub("", query)
+    flat = _flat_rewrite(text, context)
+    if flat is not None:
+        return flat
+    nodes = parse(text)
+    while nodes and isinstance(nodes[-1], Token) and nodes[-1].value == ";":
+        nodes.pop()
+    applied = []
+    for name, rewrite, marker in SQL_REWRITES:
+        if marker is not None and marker not in text:
+            continue
+        rewritten = rewrite(nodes, context)
+        if rewritten != nodes:
+            applied.append(name)
+        nodes = rewritten
+    return RewrittenSQL(
+        emit(nodes),
+        _statement_kind(nodes),
+        tuple(applied),
+        _top_level_limit(nodes),
+        frozenset(_table_names(nodes, set())),
+        _is_volatile(nodes),
+    )
+
+
+class _RewriteCache:
+    """LRU of rewritten statements keyed by a hash of the input."""
+
+    def __init__(self, max_entries: int = SQL_REWRITE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> Optional[RewrittenSQL]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return result
+
+    def set(self, key: str, result: RewrittenSQL):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+
+_rewrite_cache = _RewriteCache()
+
+
+def rewrite_sql(
+    query: str,
+    schema: Optional[str] = None,
+    tables=(),
+    limit: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+    use_cache: bool = True,
+) -> RewrittenSQL:
+    """Parse generated SQL once and apply SQL_REWRITES to produce a MySQL statement.
+
+    ``schema`` and ``tables`` enable qualify_tables, ``limit`` enables
+    inject_limit (which adds a LIMIT or lowers a larger one) and
+    ``timeout_ms`` enables add_max_execution_time. Results are cached by a
+    hash of the input.
+    """
+    context = RewriteContext(schema, frozenset(t.lower() for t in tables), limit, timeout_ms)
+    if not use_cache:
+        return _rewrite(query, context)
+    raw = json.dumps([query, schema, sorted(context.tables), limit, timeout_ms])
+    key = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    result = _rewrite_cache.get(key)
+    if result is None:
+        result = _rewrite(query, context)
+        _rewrite_cache.set(key, result)
+    return result
+
+
+def rewrite_cache_stats() -> dict:
+    return _rewrite_cache.stats()
+
+
+def clear_rewrite_cache():
+    _rewrite_cache.clear()
@@ -0,0 +1,134 @@
+"""The columnar engine must answer like MongoDB (mongomock) on the bundled data/*_json collections."""
+import json
+import os
+
+import pytest
+
+from columnar_mongo import ColumnarStore, Unsupported
+from mongo_parser import parse_mongo_query
+
+mongomock = pytest.importorskip("mongomock")
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# (database, query, fields whose order the query fixes); results are otherwise compared as multisets
+QUERIES = [
+    ("bike_store", 'db.products.find({ "list_price": { "$gt": 500 } })', None),
+    ("bike_store", 'db.products.find({}, { "product_name": 1, "list_price": 1, "_id": 0 })', None),
+    ("bike_store", 'db.products.find({ "list_price": { "$gt": 500 } }).sort({ "list_price": -1 }).limit(10)', ["list_price"]),
+    ("bike_store", 'db.products.find({ "model_year": { "$in": [2016, 2017] } }).sort({ "product_id": 1 }).skip(5).limit(5)', ["product_id"]),
+    ("bike_store", 'db.customers.find({ "state": "New York", "city": "Buffalo" }, { "first_name": 1, "last_name": 1, "_id": 0 })', None),
+    ("bike_store", 'db.customers.find({ "$or": [{ "state": "Texas" }, { "zip_code": { "$lt": 11000 } }] })', None),
+    ("bike_store", 'db.customers.find({ "email": { "$regex": "yahoo", "$options": "i" } }).count()', None),
+    ("bike_store", 'db.products.findOne({ "product_id": 7 })', None),
+    ("bike_store", 'db.orders.countDocuments({ "order_status": 4 })', None),
+    ("bike_store", 'db.products.distinct("model_year", { "list_price": { "$lt": 1000 } })', None),
+    ("bike_store", 'db.orders.aggregate([{ "$match": { "order_date": { "$gte": "2016-03-01" } } }, '
+                   '{ "$group": { "_id": "$customer_id", "orders": { "$sum": 1 } } }, { "$sort": { "orders": -1 } }, { "$limit": 5 }])',
+     ["orders"]),
+    ("bike_store", 'db.products.aggregate([{ "$group": { "_id": "$brand_id", "avg_price": { "$avg": "$list_price" }, '
+                   '"max_price": { "$max": "$list_price" }, "min_price": { "$min": "$list_price" } } }])', None),
+    ("adventure_works", 'db.sales.aggregate([{ "$group": { "_id": "$ProductKey", "total": { "$sum": "$Sales" } } }, '
+                        '{ "$sort": { "total": -1 } }, { "$limit": 3 }, { "$project": { "total": 1 } }])', ["total"]),
+    ("adventure_works", 'db.sales.aggregate([{ "$match": { "Quantity": { "$gte": 2 } } }, { "$count": "lines" }])', None),
+    ("adventure_works", 'db.sales.countDocuments({ "Sales": { "$gt": 1000 }, "Cost": { "$lte": 2000 } })', None),
+    ("fifa", 'db.players.find({ "count_tournaments": { "$gte": 3 } }, { "family_name": 1, "given_name": 1, "_id": 0 })', None),
+    ("fifa", 'db.goals.aggregate([{ "$group": { "_id": "$player_id", "goals": { "$sum": 1 } } }, '
+             '{ "$sort": { "goals": -1 } }, { "$limit": 10 }])', ["goals"]),
+    ("fifa", 'db.goals.distinct("team_id")', None),
+    ("fifa", 'db.players.find({ "family_name": { "$ne": "Messi" }, "birth_date": { "$lt": "1950-01-01" } }).size()', None),
+]
+
+
+@pytest.fixture(scope="module")
+def columnar():
+    return ColumnarStore(DATA_PATH)
+
+
+@pytest.fixture(scope="module")
+def server():
+    client = mongomock.MongoClient()
+    for folder in sorted(os.listdir(DATA_PATH)):
+        if not folder.endswith("_json"):
+            continue
+        for file_name in sorted(os.listdir(os.path.join(DATA_PATH, folder))):
+            with open(os.path.join(DATA_PATH, folder, file_name), "r", encoding="utf-8") as f:
+                client[folder[: -len("_json")]][os.path.splitext(file_name)[0]].insert_many(json.load(f))
+    return client
+
+
+def run_on_server(db, command):
+    """The server-side answer of a parsed read, shaped like ColumnarStore.run."""
+    collection = db[command.collection]
+    args = command.args
+    if command.method == "find":
+        cursor = collection.find(*args)
+        for call in command.chain:
+            if call.name in ("count", "size"):
+                return {"count": collection.count_documents(args[0] if args else {})}
+            cursor = getattr(cursor, call.name)(*call.args)
+        return list(cursor)
+    if command.method == "findOne":
+        return collection.find_one(*args)
+    if command.method == "aggregate":
+        return list(collection.aggregate(*args))
+    if command.method == "countDocuments":
+        return {"count": collection.count_documents(*args)}
+    if command.method == "distinct":
+        return sorted(collection.distinct(*args))
+    raise AssertionError(f"no server call for {command.method}")
+
+
+def normalize(value):
+    """Drop server-generated _ids (ObjectIds) and round floats, so both sides compare equal."""
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items() if not (key == "_id" and type(item).__name__ == "ObjectId")}
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def multiset(documents):
+    return sorted(json.dumps(document, sort_keys=True) for document in documents)
+
+
+@pytest.mark.parametrize("database, query, ordered_by", QUERIES)
+def test_columnar_matches_server(columnar, server, database, query, ordered_by):
+    command = parse_mongo_query(query)
+    expected = normalize(run_on_server(server[database], command))
+    actual = normalize(columnar.run(database, command))
+    if not isinstance(expected, list) or command.method == "distinct":
+        assert actual == expected
+        return
+    assert len(actual) == len(expected)
+    if ordered_by:
+        # Ties may come back in any order, and a limit may keep different ones
+        assert [[doc.get(field) for field in ordered_by] for doc in actual] == [
+            [doc.get(field) for field in ordered_by] for doc in expected
+        ]
+    else:
+        assert multiset(actual) == multiset(expected)
+
+
+def test_collection_names(columnar):
+    assert columnar.run("fifa", parse_mongo_query("db.getCollectionNames()")) == ["goals", "matches", "players"]
+
+
+@pytest.mark.parametrize("query", [
+    'db.products.find({ "$where": "this.list_price > 5" })',
+    'db.products.aggregate([{ "$lookup": { "from": "brands", "localField": "brand_id", "foreignField": "brand_id", "as": "b" } }])',
+    'db.products.find().explain()',
+])
+def test_unsupported_reads_are_refused(columnar, query):
+    with pytest.raises(Unsupported):
+        columnar.run("bike_store", parse_mongo_query(query))
+
+
+def test_stale_collections_go_to_the_server(columnar):
+    store = ColumnarStore(DATA_PATH)
+    store.mark_stale("fifa", ["goals"])
+    with pytest.raises(Unsupported):
+        store.run("fifa", parse_mongo_query("db.goals.find()"))
+    assert store.run("fifa", parse_mongo_query("db.players.countDocuments({})"))["count"] > 0
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+from csv_loading import table_name
+from query_executor import SQL_SCHEMAS, SQL_TABLES
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.mark.parametrize("database", sorted(SQL_TABLES))
+def test_loaded_tables_match_sql_tables(database):
+    folder = os.path.join(DATA_PATH, f"{SQL_SCHEMAS[database]}_csv")
+    loaded = {table_name(file_name) for file_name in os.listdir(folder) if file_name.endswith(".csv")}
+    assert loaded == set(SQL_TABLES[database])
+
+
+def test_cleaning_plan_names_loaded_tables():
+    from create_clean_database.data_cleaning import CLEANING_PLAN, DATABASE
+
+    database = next(name for name, schema in SQL_SCHEMAS.items() if schema == DATABASE)
+    assert set(CLEANING_PLAN) <= set(SQL_TABLES[database])
@@ -0,0 +1,59 @@
+import csv
+import os
+import time
+
+import pytest
+
+import query_executor
+from query_executor import SQLStream, execute_sql_query, stream_sql_query
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def csv_numbers(dataset: str, file_name: str, column: str) -> list:
+    """A numeric column as write_sql.py loads it into MySQL: "$" and "," stripped."""
+    with open(os.path.join(DATA_PATH, f"{dataset}_csv", file_name), newline="", encoding="utf-8") as f:
+        return [float(row[column].replace("$", "").replace(",", "").strip()) for row in csv.DictReader(f)]
+
+
+def run(query: str, database: str):
+    result = execute_sql_query(query, database, backend="sqlite")
+    assert not isinstance(result, str), result
+    return result[0]
+
+
+def test_numbers_with_thousands_separators_are_numeric():
+    sales = csv_numbers("adventure_works", "Sales.csv", "Sales")
+    assert any(value >= 1000 for value in sales)
+    [(total, kind)] = run("SELECT SUM(Sales), typeof(Sales) FROM sales", "AdventureWorks")
+    assert kind == "real"
+    assert total == pytest.approx(sum(sales))
+
+
+def test_numeric_columns_sort_as_numbers():
+    expected = sorted(csv_numbers("adventure_works", "Sales.csv", "UnitPrice"), reverse=True)[:5]
+    rows = run("SELECT UnitPrice FROM sales ORDER BY UnitPrice DESC LIMIT 5", "AdventureWorks")
+    assert [price for (price,) in rows] == pytest.approx(expected)
+
+
+def test_plain_dates_compare_like_mysql():
+    [(count,)] = run("SELECT COUNT(*) FROM orders WHERE order_date = '2016-01-01'", "Bike Store")
+    assert count > 0
+
+
+def test_interval_arithmetic():
+    [(date,)] = run("SELECT DATE_ADD('2020-01-31', INTERVAL 1 MONTH)", "Bike Store")
+    assert date == "2020-02-29"
+    assert execute_sql_query("SELECT INTERVAL 1 DAY", "Bike Store", backend="sqlite").startswith("Error")
+
+
+def test_stream_fetches_keep_the_time_budget(monkeypatch):
+    monkeypatch.setattr(query_executor, "QUERY_TIMEOUT_MS", 200)
+    stream = stream_sql_query(
+        "SELECT a.Sales FROM sales a, sales b", "AdventureWorks", batch_size=100000, max_rows=0, backend="sqlite"
+    )
+    assert isinstance(stream, SQLStream)
+    time.sleep(0.3)
+    rows = sum(len(batch) for batch in stream)
+    assert stream.interrupted and stream.interrupted.startswith("Timeout")
+    assert rows < 100000
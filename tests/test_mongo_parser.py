@@ -0,0 +1,70 @@
+import re
+
+import pytest
+from bson import ObjectId
+from bson.regex import Regex
+
+from mongo_parser import MongoCall, MongoSyntaxError, parse_mongo_query
+
+
+def test_database_call():
+    command = parse_mongo_query("db.getCollectionNames()")
+    assert (command.collection, command.method, command.args, command.chain) == (None, "getCollectionNames", [], [])
+
+
+def test_find_with_chain():
+    command = parse_mongo_query('db.products.find({ "list_price": { "$gt": 500 } }).sort({ "list_price": -1 }).limit(10)')
+    assert command.collection == "products"
+    assert command.method == "find"
+    assert command.args == [{"list_price": {"$gt": 500}}]
+    assert command.chain == [MongoCall("sort", [{"list_price": -1}]), MongoCall("limit", [10])]
+
+
+def test_shell_values():
+    command = parse_mongo_query(
+        "db.customers.find({first_name: 'Debra', x: /^a.b/i, n: -1.5e2, t: true, z: null, arr: [1, 'two', {a: 1},], "
+        "d: ISODate('2016-01-01'), id: ObjectId('5f1d7f3e9b1e8a3d4c5b6a7f'), k: NumberInt('3')})"
+    )
+    assert command.args == [{
+        "first_name": "Debra",
+        "x": Regex("^a.b", re.IGNORECASE),
+        "n": -150.0,
+        "t": True,
+        "z": None,
+        "arr": [1, "two", {"a": 1}],
+        "d": "2016-01-01",
+        "id": ObjectId("5f1d7f3e9b1e8a3d4c5b6a7f"),
+        "k": 3,
+    }]
+
+
+def test_json_and_shell_forms_agree():
+    json_form = parse_mongo_query('db.x.find({"a": [1, 2.5, -3e2, "s", true, null, {"b": {}}]})')
+    shell_form = parse_mongo_query("db.x.find({a: [1, 2.5, -3e2, 's', true, null, {b: {},},]})")
+    assert json_form == shell_form
+
+
+def test_string_escapes():
+    assert parse_mongo_query('db.x.find({"s": "a\\"b\\n\\u00e9"})').args == [{"s": 'a"b\né'}]
+
+
+def test_whitespace_and_trailing_semicolon():
+    assert parse_mongo_query('db.x.insertOne({ "a": 1 });').args == [{"a": 1}]
+    command = parse_mongo_query("  db.x\n  .find()\n  .pretty()")
+    assert (command.collection, command.method, command.chain) == ("x", "find", [MongoCall("pretty", [])])
+
+
+@pytest.mark.parametrize("query, message", [
+    ("db.x.find({a: 1", "Expected ',' or '}'"),
+    ("db.x.find({a: foo()})", "Unsupported constructor 'foo'"),
+    ("db.x.find() junk", "Unexpected trailing text"),
+    ("x.find()", "Query must start with 'db.'"),
+    ("db.x.find({a: NumberInt()})", "NumberInt() takes a number"),
+    ("db.x.find({a: NumberLong('12abc')})", "NumberLong() takes a number"),
+    ("db.x.find({a: NumberDecimal({})})", "NumberDecimal() takes a number"),
+    ("db.x.find({a: ObjectId('bad')})", "Invalid ObjectId 'bad'"),
+    ("db.x.find({a: ObjectId(1)})", "ObjectId() takes a hex string"),
+])
+def test_syntax_errors(query, message):
+    with pytest.raises(MongoSyntaxError, match=re.escape(message)):
+        parse_mongo_query(query)
@@ -0,0 +1,30 @@
+from prompt_selector import select_tables
+from prompt_templates import MONGO_OPERATIONS, MONGO_SECTION_CUES, TEMPLATES
+from schemas import schemas
+
+
+def test_unrelated_tables_are_not_pulled_in():
+    assert select_tables("List products", schemas["bike_store"], "sql") == ["products"]
+
+
+def test_join_wording_adds_related_tables():
+    tables = select_tables("List customers with their orders", schemas["bike_store"], "sql")
+    assert set(tables) == {"customers", "orders"}
+
+
+def test_mongo_prompt_keeps_only_cued_sections():
+    template = TEMPLATES[("Bike Store", "mongodb")]
+    sliced = template.render_sliced("Show Bike Store customers in New York")
+    assert "$lookup" not in sliced and "Data Modification" not in sliced
+    assert "Aggregation" in template.render_sliced("Count Bike Store orders per customer")
+    assert set(MONGO_SECTION_CUES) <= {name for name, _ in MONGO_OPERATIONS}
+
+
+def test_mongo_examples_come_from_the_selected_database():
+    sliced = TEMPLATES[("FIFA", "mongodb")].render_sliced("Top 5 FIFA goal scorers")
+    assert 'db.goals.aggregate' in sliced
+    assert "Bike Store:" not in sliced and "AdventureWorks:" not in sliced
+
+
+def test_join_on_a_single_table_adds_its_neighbours():
+    assert "orders" in select_tables("Show Bike Store customers along with their purchases", schemas["bike_store"], "sql")
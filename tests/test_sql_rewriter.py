@@ -0,0 +1,107 @@
+import pytest
+
+import sql_rewriter
+from sql_rewriter import rewrite_sql
+
+
+def test_concat_chain_in_select_list():
+    result = rewrite_sql("SELECT first_name || ' ' || last_name AS name FROM customers", use_cache=False)
+    assert result.sql == "SELECT CONCAT(first_name, ' ', last_name) AS name FROM customers"
+    assert result.rewrites == ("concat",)
+
+
+def test_logical_or_is_left_alone():
+    result = rewrite_sql("SELECT * FROM customers WHERE a = 1 || b = 2", use_cache=False)
+    assert result.sql == "SELECT * FROM customers WHERE a = 1 || b = 2"
+    assert result.rewrites == ()
+
+
+def test_strings_and_comments_are_not_rewritten():
+    assert rewrite_sql("```sql\nSELECT 'a || b' FROM t;\n```", use_cache=False).sql == "SELECT 'a || b' FROM t"
+    assert rewrite_sql("SELECT name FROM t -- x || y\nWHERE x = 'it''s'", use_cache=False).sql == (
+        "SELECT name FROM t WHERE x = 'it''s'"
+    )
+
+
+def test_qualify_tables_uses_the_connection_schema():
+    result = rewrite_sql(
+        "SELECT * FROM BikeStore.customers c JOIN BikeStore.orders o ON c.customer_id = o.customer_id",
+        schema="bike_store",
+        tables=["customers", "orders"],
+        use_cache=False,
+    )
+    assert result.sql == "SELECT * FROM bike_store.customers c JOIN bike_store.orders o ON c.customer_id = o.customer_id"
+    assert result.tables == frozenset({"customers", "orders"})
+
+
+def test_qualify_tables_ignores_unknown_tables():
+    result = rewrite_sql("SELECT * FROM other.thing", schema="bike_store", tables=["customers"], use_cache=False)
+    assert result.sql == "SELECT * FROM other.thing"
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM customers", "SELECT * FROM customers LIMIT 100"),
+    ("SELECT * FROM customers LIMIT 500", "SELECT * FROM customers LIMIT 100"),
+    ("SELECT * FROM customers LIMIT 5, 500", "SELECT * FROM customers LIMIT 5, 100"),
+    ("SELECT * FROM customers LIMIT 10", "SELECT * FROM customers LIMIT 10"),
+    ("SELECT * FROM customers FOR UPDATE", "SELECT * FROM customers LIMIT 100 FOR UPDATE"),
+    ("SELECT * FROM (SELECT * FROM customers) AS s", "SELECT * FROM (SELECT * FROM customers) AS s LIMIT 100"),
+    ("UPDATE customers SET city = 'X' WHERE customer_id = 1", "UPDATE customers SET city = 'X' WHERE customer_id = 1"),
+])
+def test_inject_limit(query, expected):
+    assert rewrite_sql(query, limit=100, use_cache=False).sql == expected
+
+
+def test_max_execution_time_hint_on_selects_only():
+    assert rewrite_sql("SELECT COUNT(*) FROM orders", timeout_ms=5000, use_cache=False).sql == (
+        "SELECT /*+ MAX_EXECUTION_TIME(5000) */ COUNT(*) FROM orders"
+    )
+    assert rewrite_sql("DELETE FROM orders WHERE order_id = 1", timeout_ms=5000, use_cache=False).rewrites == ()
+
+
+def test_statement_kind_and_tables():
+    read = rewrite_sql("SELECT * FROM customers c JOIN orders o ON c.customer_id = o.customer_id", use_cache=False)
+    write = rewrite_sql("INSERT INTO orders (a) VALUES (1)", use_cache=False)
+    assert (read.kind, read.returns_rows, read.tables) == ("SELECT", True, frozenset({"customers", "orders"}))
+    assert (write.kind, write.returns_rows, write.tables) == ("INSERT", False, frozenset({"orders"}))
+
+
+@pytest.mark.parametrize("query, volatile", [
+    ("SELECT NOW()", True),
+    ("SELECT * FROM orders WHERE order_date > DATE_SUB(CURDATE(), INTERVAL 30 DAY)", True),
+    ("SELECT * FROM orders WHERE order_date > CURRENT_DATE", True),
+    ("SELECT * FROM products ORDER BY RAND() LIMIT 1", True),
+    ("SELECT uuid FROM t", False),
+    ("SELECT COUNT(*) FROM orders", False),
+])
+def test_volatile_functions(query, volatile):
+    assert rewrite_sql(query, use_cache=False).volatile is volatile
+
+
+def test_results_are_cached_by_input():
+    first = rewrite_sql("SELECT * FROM customers", limit=7)
+    assert rewrite_sql("SELECT * FROM customers", limit=7) is first
+    assert rewrite_sql("SELECT * FROM customers", limit=8) is not first
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT product_name FROM products WHERE list_price > 500 ORDER BY list_price DESC",
+    "select  a, b from customers c , orders o where c.state = 'it''s  NY';",
+    "SELECT * FROM customers LIMIT 5, 500",
+    "SELECT * FROM customers FOR UPDATE",
+    "WITH t AS (SELECT * FROM orders LIMIT 3) SELECT * FROM t",
+    "DELETE FROM orders WHERE order_id IN (SELECT order_id FROM customers WHERE order_date < NOW())",
+    "UPDATE products SET list_price = list_price * 1.1 WHERE model_year = 2018",
+])
+def test_flat_path_matches_the_parse_tree(query, monkeypatch):
+    arguments = dict(schema="bike_store", tables=["customers", "orders", "products"], limit=100, timeout_ms=5000, use_cache=False)
+    flat = rewrite_sql(query, **arguments)
+    monkeypatch.setattr(sql_rewriter, "_flat_rewrite", lambda text, context: None)
+    tree = rewrite_sql(query, **arguments)
+    assert flat._replace(sql=flat.sql.replace(" ", "")) == tree._replace(sql=tree.sql.replace(" ", ""))
+
+
+def test_qualified_tables_take_the_parse_tree():
+    context = sql_rewriter.RewriteContext("bike_store", frozenset({"customers"}), None, None)
+    assert sql_rewriter._flat_rewrite("SELECT * FROM BikeStore.customers", context) is None
+    assert sql_rewriter._flat_rewrite("SELECT * FROM orders o, BikeStore.customers c", context) is None
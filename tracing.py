@@ -0,0 +1,231 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Tracing settings (override with environment variables)
+TRACING = os.getenv("TRACING", "1") != "0"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")  # JSONL file of finished spans, empty = none
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "")  # "otel" also sends spans to the OpenTelemetry SDK
+TRACE_DEBUG = os.getenv("TRACE_DEBUG", "0") != "0"  # initial state of the UI timings toggle
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+if TRACE_EXPORTER == "otel" and otel_trace is None:
+    print("⚠️ TRACE_EXPORTER=otel but opentelemetry is not installed; spans go to TRACE_LOG_PATH only.")
+_otel_tracer = otel_trace.get_tracer("chatdb") if TRACE_EXPORTER == "otel" and otel_trace else None
+
+
+class Span:
+    """One timed stage of a request. Times are Unix nanoseconds, as in OpenTelemetry."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "status", "_perf_ns", "_otel")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: dict, elapsed_ns: int = 0):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns() - elapsed_ns
+        self.end_ns = None
+        self.status = "ok"
+        self._perf_ns = time.perf_counter_ns() - elapsed_ns
+        self._otel = None
+        if _otel_tracer is not None:
+            context = otel_trace.set_span_in_context(parent._otel) if parent is not None and parent._otel else None
+            self._otel = _otel_tracer.start_span(name, context=context, start_time=self.start_ns)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: Exception = None):
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._perf_ns
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+        if self._otel is not None:
+            for key, value in self.attributes.items():
+                self._otel.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+            if error is not None:
+                self._otel.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, str(error)))
+            self._otel.end(end_time=self.end_ns)
+        _export(self)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """The spans of one request, in the order they started."""
+
+    def __init__(self, name: str, attributes: dict):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.root = self._add(name, None, attributes)
+
+    def _add(self, name: str, parent: Optional[Span], attributes: dict, elapsed_ns: int = 0) -> Span:
+        span = Span(self, name, parent, attributes, elapsed_ns)
+        self.spans.append(span)
+        return span
+
+    def record(self, name: str, seconds: float, **attributes) -> Span:
+        """Add a stage that was timed before the trace started (e.g. database detection)."""
+        span = self._add(name, self.root, attributes, int(seconds * 1e9))
+        span.end()
+        return span
+
+    def timings(self) -> list:
+        """Finished spans as rows of stage name (indented by depth), milliseconds and attributes."""
+        depths = {None: -1}
+        rows = []
+        for span in self.spans:
+            depth = depths.get(span.parent_id, 0) + 1
+            depths[span.span_id] = depth
+            if span.end_ns is not None:
+                rows.append({
+                    "stage": "  " * depth + span.name,
+                    "ms": round(span.duration_ms, 2),
+                    "status": span.status,
+                    "attributes": json.dumps(span.attributes, default=str),
+                })
+        return rows
+
+
+class _NoSpan:
+    """Stand-in for span() outside a trace, so callers can always call .set()."""
+
+    status = "ok"
+
+    def set(self, **attributes):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+_current_span = contextvars.ContextVar("current_span", default=None)
+_log_lock = threading.Lock()
+_log_file = None  # TRACE_LOG_PATH, opened for appending on the first finished span
+
+
+def _export(span: Span):
+    global _log_file
+    if not TRACE_LOG_PATH:
+        return
+    line = json.dumps(span.to_dict(), default=str)
+    with _log_lock:
+        if _log_file is None:
+            _log_file = open(TRACE_LOG_PATH, "a", encoding="utf-8")
+        _log_file.write(line + "\n")
+        _log_file.flush()
+
+
+def close_trace_log():
+    global _log_file
+    with _log_lock:
+        if _log_file is not None:
+            _log_file.close()
+            _log_file = None
+
+
+atexit.register(close_trace_log)
+
+
+def current_trace() -> Optional[Trace]:
+    span = _current_span.get()
+    return span.trace if span is not None else None
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """Trace one request; spans opened inside it (also on threads started with the
+    context copied, and in asyncio tasks) become its children. Yields the Trace,
+    or None when tracing is off."""
+    if not TRACING:
+        yield None
+        return
+    trace = Trace(name, attributes)
+    token = _current_span.set(trace.root)
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.root.end(error)
+
+
+@contextmanager
+def resume_trace(trace: Optional[Trace]):
+    """Add later spans (e.g. rendering on the next part of the script) to ``trace``."""
+    if trace is None:
+        yield
+        return
+    token = _current_span.set(trace.root)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a stage of the current request; does nothing outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield _NO_SPAN
+        return
+    child = parent.trace._add(name, parent, attributes)
+    token = _current_span.set(child)
+    error = None
+    try:
+        yield child
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end(error)
+
+
+def traced(name: str):
+    """Decorator running a ``(query, database, ...)`` function in a span named ``name``.
+
+    String results (the executors' "Error ..." / "Timeout ..." messages) are
+    recorded on the span, and "Error ..." marks it as failed.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(query, database, *args, **kwargs):
+            with span(name, database=database) as stage:
+                result = function(query, database, *args, **kwargs)
+                stage.set(result=result[:200] if isinstance(result, str) else type(result).__name__)
+                if isinstance(result, str) and result.startswith("Error"):
+                    stage.status = "error"
+                return result
+        return wrapper
+    return decorate
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from columnar_mongo import MONGO_BACKEND, get_columnar_store
+from connections import get_mongo_client, get_mysql_pool
+from embedded_sql import SQL_BACKEND, get_embedded_pool
+from generation_cache import get_generation_cache
+from prompt_templates import get_template
+from query_executor import SQL_SCHEMAS, detect_database
+from query_generator import generate_queries
+from schemas import schemas
+
+# Startup warm-up settings (override with environment variables)
+WARMUP = os.getenv("WARMUP", "1") != "0"
+WARMUP_QUESTIONS_PATH = os.getenv("WARMUP_QUESTIONS_PATH", "")  # one common question per line, empty = no replay
+WARMUP_QUERY_TYPES = [t for t in os.getenv("WARMUP_QUERY_TYPES", "sql,mongodb").split(",") if t]  # replayed for each question
+
+
+def warm_sql() -> str:
+    """Open one pooled connection per schema and return it to the pool.
+
+    With SQL_BACKEND=sqlite this loads the bundled CSVs (or opens the cached database files).
+    """
+    get_pool = get_embedded_pool if SQL_BACKEND == "sqlite" else get_mysql_pool
+
+    def open_one(schema_name):
+        with get_pool(schema_name).connection():
+            pass
+
+    with ThreadPoolExecutor(max_workers=len(SQL_SCHEMAS)) as pool:
+        for future in [pool.submit(open_one, name) for name in SQL_SCHEMAS.values()]:
+            future.result()
+    return f"{len(SQL_SCHEMAS)} {SQL_BACKEND} schemas"
+
+
+def warm_mongodb() -> str:
+    """Ping the server, or with MONGO_BACKEND=columnar load the bundled collections into memory."""
+    if MONGO_BACKEND == "columnar":
+        loaded = get_columnar_store().preload(SQL_SCHEMAS.values())
+        return f"{loaded} collections in memory"
+    get_mongo_client().admin.command("ping")
+    return "ping ok"
+
+
+def warm_templates() -> str:
+    """Check that every compiled template matches the app's schemas."""
+    count = 0
+    for database in SQL_SCHEMAS:
+        for query_type in ("sql", "mongodb"):
+            get_template(database, query_type, schemas)
+            count += 1
+    return f"{count} templates"
+
+
+def warm_generation_cache() -> str:
+    loaded = get_generation_cache().preload()
+    return f"{loaded} queries loaded"
+
+
+def read_questions(path: str) -> list:
+    """(question, query_type, database) items for the questions in ``path`` that name a dataset."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            question = line.strip()
+            if not question or question.startswith("#"):
+                continue
+            database = detect_database(question)
+            if database is None:
+                print(f"⚠️ Warm-up: no dataset named in '{question}', skipped.")
+                continue
+            items.extend((question, query_type, database) for query_type in WARMUP_QUERY_TYPES)
+    return items
+
+
+def replay_questions(path: str = None) -> str:
+    """Generate queries for the common questions, filling the generation cache."""
+    items = read_questions(path or WARMUP_QUESTIONS_PATH)
+    queries = asyncio.run(generate_queries(items, schemas))
+    return f"{sum(1 for q in queries if q)}/{len(items)} queries"
+
+
+# Independent stages run side by side; the replay runs once they are done
+STAGES = {
+    "sql": warm_sql,
+    "mongodb": warm_mongodb,
+    "templates": warm_templates,
+    "generation_cache": warm_generation_cache,
+}
+
+
+def _timed(stage):
+    started = time.perf_counter()
+    try:
+        result, ok = stage(), True
+    except Exception as e:
+        result, ok = f"{type(e).__name__}: {e}", False
+    return {"seconds": round(time.perf_counter() - started, 3), "ok": ok, "result": result}
+
+
+def _report(name: str, timing: dict):
+    if timing["ok"]:
+        print(f"✅ Warm-up {name}: {timing['result']} in {timing['seconds']:.2f}s")
+    else:
+        print(f"⚠️ Warm-up {name} failed after {timing['seconds']:.2f}s: {timing['result']}")
+
+
+def run_warmup(imports: float = None) -> dict:
+    """Run the warm-up stages and return their timings.
+
+    ``imports`` is the time the caller spent importing the app modules. A
+    failed stage is reported and does not stop the others.
+    """
+    if not WARMUP:
+        return {}
+    started = time.perf_counter()
+    timings = {}
+    if imports is not None:
+        timings["imports"] = {"seconds": round(imports, 3), "ok": True, "result": "app modules"}
+        _report("imports", timings["imports"])
+
+    with ThreadPoolExecutor(max_workers=len(STAGES)) as pool:
+        futures = {name: pool.submit(_timed, stage) for name, stage in STAGES.items()}
+    for name, future in futures.items():
+        timings[name] = future.result()
+        _report(name, timings[name])
+
+    if WARMUP_QUESTIONS_PATH:
+        timings["replay"] = _timed(replay_questions)
+        _report("replay", timings["replay"])
+
+    timings["total"] = {"seconds": round(time.perf_counter() - started, 3), "ok": True, "result": "warm-up"}
+    print(f"Warm-up finished in {timings['total']['seconds']:.2f}s")
+    return timings